@@ -5,16 +5,18 @@ Phase 6: Enhanced with rate limiting and safety features
 
 import json
 import logging
+from datetime import datetime
 from typing import Optional
-from uuid import UUID, uuid4
+from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import get_config
 from app.db.database import get_db_session
 from app.db.models import Session as SessionModel
+from app.db.models import uuid7
 from app.models.story import (
     ContinueStoryRequest,
     GenerateThemesRequest,
@@ -23,11 +25,11 @@ from app.models.story import (
     StoryResponse,
     ThemeOption,
 )
-from app.services.llm_factory import create_llm_provider
+from app.services.llm_factory import get_llm_provider
 from app.services.prompts import StoryPrompts
 from app.services.safety_filter import SafetyFilter
 from app.services.safety_filter_enhanced import EnhancedSafetyFilter
-from app.services.story_engine import StoryEngine, compute_max_turns
+from app.services.story_engine import StoryEngine, compute_max_turns, load_session_with_summary
 from app.services.rate_limiter import get_rate_limiter, RateLimitExceeded
 
 logger = logging.getLogger(__name__)
@@ -44,7 +46,7 @@ def get_story_engine() -> StoryEngine:
         StoryEngine instance
     """
     config = get_config()
-    llm_provider = create_llm_provider(config)
+    llm_provider = get_llm_provider()
 
     # Use enhanced safety filter if enabled in config
     if config.safety.use_enhanced_filter:
@@ -80,7 +82,7 @@ async def start_story(
     http_request: Request,
     request: StartStoryRequest,
     engine: StoryEngine = Depends(get_story_engine),
-    db: Session = Depends(get_db_session)
+    db: AsyncSession = Depends(get_db_session)
 ) -> StoryResponse:
     """
     Start a new story session.
@@ -102,18 +104,11 @@ async def start_story(
         rate_limiter = get_rate_limiter()
         client_ip = rate_limiter.get_client_ip(http_request)
 
-        # Check start story rate limit
-        is_allowed, retry_after = rate_limiter.check_start_story_rate_limit(client_ip)
+        is_allowed, retry_after = await rate_limiter.check_all(None, client_ip, "start_story")
         if not is_allowed:
             logger.warning(f"Rate limit exceeded for IP {client_ip} on start_story")
             raise RateLimitExceeded(retry_after)
 
-        # Check general IP rate limit
-        is_allowed, retry_after = rate_limiter.check_ip_rate_limit(client_ip, "start_story")
-        if not is_allowed:
-            logger.warning(f"IP rate limit exceeded for {client_ip}")
-            raise RateLimitExceeded(retry_after)
-
     try:
         logger.info(f"Starting story for player: {request.player_name}, theme: {request.theme}")
         response = await engine.start_story(
@@ -142,7 +137,7 @@ async def continue_story(
     http_request: Request,
     request: ContinueStoryRequest,
     engine: StoryEngine = Depends(get_story_engine),
-    db: Session = Depends(get_db_session)
+    db: AsyncSession = Depends(get_db_session)
 ) -> StoryResponse:
     """
     Continue an existing story with a player's choice.
@@ -165,23 +160,14 @@ async def continue_story(
         client_ip = rate_limiter.get_client_ip(http_request)
         session_id_str = str(request.session_id)
 
-        # Check session rate limit
-        is_allowed, retry_after = rate_limiter.check_session_rate_limit(session_id_str, "continue")
-        if not is_allowed:
-            logger.warning(f"Session rate limit exceeded for session {session_id_str}")
-            raise RateLimitExceeded(retry_after)
-
-        # If custom input, check stricter rate limit
-        if request.custom_input:
-            is_allowed, retry_after = rate_limiter.check_custom_input_rate_limit(session_id_str)
-            if not is_allowed:
-                logger.warning(f"Custom input rate limit exceeded for session {session_id_str}")
-                raise RateLimitExceeded(retry_after)
-
-        # Check general IP rate limit
-        is_allowed, retry_after = rate_limiter.check_ip_rate_limit(client_ip, "continue")
+        is_allowed, retry_after = await rate_limiter.check_all(
+            session_id_str,
+            client_ip,
+            "continue",
+            custom_input=bool(request.custom_input)
+        )
         if not is_allowed:
-            logger.warning(f"IP rate limit exceeded for {client_ip}")
+            logger.warning(f"Rate limit exceeded for session {session_id_str} (IP {client_ip})")
             raise RateLimitExceeded(retry_after)
 
     try:
@@ -213,7 +199,7 @@ async def continue_story(
 async def start_story_stream(
     http_request: Request,
     request: StartStoryRequest,
-    db: Session = Depends(get_db_session)
+    db: AsyncSession = Depends(get_db_session)
 ):
     """
     Start a new story session with streaming response.
@@ -229,36 +215,20 @@ async def start_story_stream(
         rate_limiter = get_rate_limiter()
         client_ip = rate_limiter.get_client_ip(http_request)
 
-        is_allowed, retry_after = rate_limiter.check_start_story_rate_limit(client_ip)
+        is_allowed, retry_after = await rate_limiter.check_all(None, client_ip, "start_story")
         if not is_allowed:
             logger.warning(f"Rate limit exceeded for IP {client_ip} on start_story_stream")
             raise RateLimitExceeded(retry_after)
 
-        is_allowed, retry_after = rate_limiter.check_ip_rate_limit(client_ip, "start_story")
-        if not is_allowed:
-            logger.warning(f"IP rate limit exceeded for {client_ip}")
-            raise RateLimitExceeded(retry_after)
-
     async def generate_stream():
         """Generate SSE stream for story start."""
         try:
             # Create LLM provider and prompts
-            llm_provider = create_llm_provider(config)
+            llm_provider = get_llm_provider()
             prompts = StoryPrompts()
 
-            # Create session in database
-            session_id = uuid4()
+            session_id = uuid7()
             max_turns = compute_max_turns(session_id)
-            db_session_model = SessionModel(
-                id=session_id,
-                player_name=request.player_name,
-                age_range=request.age_range,
-                theme=request.theme,
-                turns=0,
-                is_active=True
-            )
-            db.add(db_session_model)
-            db.flush()
 
             # Generate prompts
             prompt = prompts.get_story_start_prompt(
@@ -304,22 +274,33 @@ async def start_story_stream(
                 # Generate a scene id consistent with StoryEngine
                 scene_id = f"scene_{session_id}_0"
 
-                # Save to database
+                # Save the session and its first turn in one transaction,
+                # only once the stream is done
                 from app.db.models import StoryTurn
+                now = datetime.utcnow()
+                db_session_model = SessionModel(
+                    id=session_id,
+                    player_name=request.player_name,
+                    age_range=request.age_range,
+                    theme=request.theme,
+                    created_at=now,
+                    last_activity=now,
+                    turns=0,
+                    is_active=True
+                )
                 turn = StoryTurn(
-                    id=uuid4(),
+                    id=uuid7(),
                     session_id=session_id,
                     turn_number=0,
                     scene_text=llm_response.scene_text,
                     scene_id=scene_id,
                     player_choice=None,
                     custom_input=None,
-                    story_summary=story_summary
+                    story_summary=story_summary,
+                    created_at=now
                 )
-                db.add(turn)
-                db_session_model.turns = 0
-                db_session_model.updated_at = turn.created_at
-                db.commit()
+                db.add_all([db_session_model, turn])
+                await db.commit()
 
                 # Send final event with metadata
                 yield f"data: {json.dumps({'type': 'complete', 'choices': choices, 'metadata': {'theme': request.theme, 'age_range': request.age_range, 'turns': 0, 'session_id': str(session_id), 'max_turns': max_turns, 'is_finished': False}, 'scene_text': llm_response.scene_text, 'story_summary': story_summary})}\n\n"
@@ -346,7 +327,7 @@ async def start_story_stream(
 async def continue_story_stream(
     http_request: Request,
     request: ContinueStoryRequest,
-    db: Session = Depends(get_db_session)
+    db: AsyncSession = Depends(get_db_session)
 ):
     """
     Continue an existing story with streaming response.
@@ -363,34 +344,26 @@ async def continue_story_stream(
         client_ip = rate_limiter.get_client_ip(http_request)
         session_id_str = str(request.session_id)
 
-        is_allowed, retry_after = rate_limiter.check_session_rate_limit(session_id_str, "continue")
-        if not is_allowed:
-            logger.warning(f"Session rate limit exceeded for session {session_id_str}")
-            raise RateLimitExceeded(retry_after)
-
-        if request.custom_input:
-            is_allowed, retry_after = rate_limiter.check_custom_input_rate_limit(session_id_str)
-            if not is_allowed:
-                logger.warning(f"Custom input rate limit exceeded for session {session_id_str}")
-                raise RateLimitExceeded(retry_after)
-
-        is_allowed, retry_after = rate_limiter.check_ip_rate_limit(client_ip, "continue")
+        is_allowed, retry_after = await rate_limiter.check_all(
+            session_id_str,
+            client_ip,
+            "continue",
+            custom_input=bool(request.custom_input)
+        )
         if not is_allowed:
-            logger.warning(f"IP rate limit exceeded for {client_ip}")
+            logger.warning(f"Rate limit exceeded for session {session_id_str} (IP {client_ip})")
             raise RateLimitExceeded(retry_after)
 
     async def generate_stream():
         """Generate SSE stream for story continuation."""
         try:
             # Create LLM provider and prompts
-            llm_provider = create_llm_provider(config)
+            llm_provider = get_llm_provider()
             prompts = StoryPrompts()
 
-            # Load session from database
-            from sqlalchemy import select
-            stmt = select(SessionModel).where(SessionModel.id == request.session_id)
-            result = db.execute(stmt)
-            db_session_model = result.scalar_one_or_none()
+            # Load session and its stored summary from database
+            db_session_model, stored_summary = await load_session_with_summary(db, request.session_id, for_update=True)
+            story_summary = request.story_summary or stored_summary or ""
 
             if not db_session_model:
                 yield f"data: {json.dumps({'type': 'error', 'message': 'Session not found'})}\n\n"
@@ -414,7 +387,7 @@ async def continue_story_stream(
             # Generate continuation prompt
             prompt = prompts.get_story_continuation_prompt(
                 age_range=db_session_model.age_range,
-                story_summary=request.story_summary or "",
+                story_summary=story_summary,
                 player_choice=choice_text or "",
                 player_name=db_session_model.player_name,
                 turns_remaining=turns_remaining
@@ -450,26 +423,28 @@ async def continue_story_stream(
 
                 new_turn_number = next_turn_number
                 scene_id = f"scene_{request.session_id}_{new_turn_number}"
-                updated_summary = llm_response.story_summary_update or request.story_summary or ""
+                updated_summary = llm_response.story_summary_update or story_summary
                 is_finished = new_turn_number >= max_turns
 
                 # Save to database
                 from app.db.models import StoryTurn
+                now = datetime.utcnow()
                 turn = StoryTurn(
-                    id=uuid4(),
+                    id=uuid7(),
                     session_id=request.session_id,
                     turn_number=new_turn_number,
                     scene_text=llm_response.scene_text,
                     scene_id=scene_id,
                     player_choice=request.choice_id,
                     custom_input=request.custom_input,
-                    story_summary=updated_summary
+                    story_summary=updated_summary,
+                    created_at=now
                 )
                 db.add(turn)
                 db_session_model.turns = new_turn_number
-                db_session_model.updated_at = turn.created_at
+                db_session_model.last_activity = now
                 db_session_model.is_active = not is_finished
-                db.commit()
+                await db.commit()
 
                 # Send final event
                 yield f"data: {json.dumps({'type': 'complete', 'choices': choices, 'metadata': {'theme': db_session_model.theme, 'age_range': db_session_model.age_range, 'turns': new_turn_number, 'session_id': str(request.session_id), 'max_turns': max_turns, 'is_finished': is_finished}, 'scene_text': llm_response.scene_text, 'story_summary': updated_summary})}\n\n"
@@ -496,7 +471,7 @@ async def continue_story_stream(
 async def get_session(
     session_id: UUID,
     engine: StoryEngine = Depends(get_story_engine),
-    db: Session = Depends(get_db_session)
+    db: AsyncSession = Depends(get_db_session)
 ) -> dict:
     """
     Retrieve full story history for a session.
@@ -545,8 +520,7 @@ async def generate_themes(
     """
     try:
         logger.info(f"Generating themes for age range: {request.age_range}")
-        config = get_config()
-        llm_provider = create_llm_provider(config)
+        llm_provider = get_llm_provider()
 
         # Define color options for the themes
         color_options = [
@@ -804,7 +778,7 @@ You respond ONLY with valid JSON - no other text."""
 async def reset_session(
     session_id: UUID,
     engine: StoryEngine = Depends(get_story_engine),
-    db: Session = Depends(get_db_session)
+    db: AsyncSession = Depends(get_db_session)
 ) -> None:
     """
     Reset/abandon a story session.
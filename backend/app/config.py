@@ -94,6 +94,26 @@ class DatabaseConfig(BaseModel):
         description="Database URL (SQLite or PostgreSQL)"
     )
     echo: bool = Field(default=False, description="Echo SQL queries (for debugging)")
+    min_pool_size: int = Field(
+        default=5,
+        description="Connections kept open in the pool (PostgreSQL only)"
+    )
+    max_pool_size: int = Field(
+        default=20,
+        description="Upper bound on pooled plus overflow connections (PostgreSQL only)"
+    )
+    pool_timeout: float = Field(
+        default=5.0,
+        description="Seconds to wait for a free connection before failing"
+    )
+    pool_recycle: int = Field(
+        default=1800,
+        description="Seconds after which idle connections are replaced"
+    )
+    prepared_statement_cache_size: int = Field(
+        default=500,
+        description="Prepared statements cached per connection (PostgreSQL only)"
+    )
 
 
 class SafetyConfig(BaseModel):
@@ -122,6 +142,14 @@ class SafetyConfig(BaseModel):
         default=5,
         description="Maximum custom inputs per 10 minutes"
     )
+    rate_limit_redis_url: Optional[str] = Field(
+        default=None,
+        description="Redis URL for rate limiting shared across workers (in-memory if unset)"
+    )
+    max_request_bytes: int = Field(
+        default=16384,
+        description="Largest request body accepted; bigger bodies get 413 before parsing"
+    )
 
 
 class AppConfig(BaseModel):
@@ -159,6 +187,7 @@ class Settings(BaseSettings):
     # Other settings
     DATABASE_URL: Optional[str] = None
     LLM_PROVIDER: Optional[str] = None
+    RATE_LIMIT_REDIS_URL: Optional[str] = None
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -263,6 +292,10 @@ def load_config(config_path: Optional[Path] = None) -> AppConfig:
         config_dict.setdefault("database", {})
         config_dict["database"]["url"] = settings.DATABASE_URL
 
+    if settings.RATE_LIMIT_REDIS_URL:
+        config_dict.setdefault("safety", {})
+        config_dict["safety"]["rate_limit_redis_url"] = settings.RATE_LIMIT_REDIS_URL
+
     # Create and return config
     return AppConfig(**config_dict)
 
@@ -7,9 +7,9 @@ import logging
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
-from sqlalchemy import create_engine, event
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import Session, sessionmaker
 
 from app.config import DatabaseConfig
 from app.db.models import Base
@@ -41,136 +41,96 @@ class Database:
         """
         Initialize database with configuration.
 
+        Both SQLite (via aiosqlite) and PostgreSQL (via asyncpg) use an async
+        engine so database I/O never blocks the event loop.
+
         Args:
             config: Database configuration
         """
         self.config = config
-        self.engine = None
-        self.session_factory = None
-        self.is_async = False
 
-        # Determine if we're using async or sync engine
         if config.url.startswith("sqlite"):
-            # SQLite uses synchronous engine
-            self.is_async = False
-            self.engine = create_engine(
-                config.url,
+            async_url = config.url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+            self.engine = create_async_engine(
+                async_url,
                 echo=config.echo,
                 connect_args={"check_same_thread": False}  # Required for SQLite
             )
             # Enable SQLite performance pragmas (WAL mode, etc.)
-            event.listen(self.engine, "connect", _set_sqlite_pragmas)
+            event.listen(self.engine.sync_engine, "connect", _set_sqlite_pragmas)
             logger.info("SQLite WAL mode and performance pragmas enabled")
-
-            self.session_factory = sessionmaker(
-                bind=self.engine,
-                autocommit=False,
-                autoflush=False
-            )
         else:
-            # PostgreSQL uses async engine
-            self.is_async = True
-            async_url = config.url.replace("postgresql://", "postgresql+asyncpg://")
+            async_url = make_url(config.url.replace("postgresql://", "postgresql+asyncpg://", 1))
+            # Reuse server-side prepared statements so repeated queries skip
+            # parse/plan; an explicit value in the URL takes precedence
+            if "prepared_statement_cache_size" not in async_url.query:
+                async_url = async_url.update_query_dict({
+                    "prepared_statement_cache_size": str(config.prepared_statement_cache_size)
+                })
+            # Keep a warm base pool and let bursts borrow overflow connections
+            # that are released again once idle; pre-ping drops connections
+            # the server closed, and a short pool timeout fails fast instead
+            # of queueing requests behind a slow database.
             self.engine = create_async_engine(
                 async_url,
-                echo=config.echo
-            )
-            self.session_factory = async_sessionmaker(
-                bind=self.engine,
-                class_=AsyncSession,
-                autocommit=False,
-                autoflush=False,
-                expire_on_commit=False
+                echo=config.echo,
+                pool_size=config.min_pool_size,
+                max_overflow=max(config.max_pool_size - config.min_pool_size, 0),
+                pool_timeout=config.pool_timeout,
+                pool_recycle=config.pool_recycle,
+                pool_pre_ping=True
             )
 
-    def create_tables(self):
-        """Create all database tables."""
-        if self.is_async:
-            raise RuntimeError("Cannot use create_tables() with async engine. Use init_db() instead.")
-        Base.metadata.create_all(bind=self.engine)
-        logger.info("Database tables created successfully")
+        self.session_factory = async_sessionmaker(
+            bind=self.engine,
+            class_=AsyncSession,
+            autocommit=False,
+            autoflush=False,
+            expire_on_commit=False
+        )
 
     async def init_db(self):
-        """Initialize database (async version)."""
-        if not self.is_async:
-            # For sync engines, just create tables directly
-            self.create_tables()
-            return
-
-        # For async engines
+        """Create all database tables."""
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
-        logger.info("Database initialized successfully (async)")
-
-    def get_session(self) -> Session:
-        """
-        Get a database session (synchronous).
-
-        Returns:
-            SQLAlchemy Session instance
+        logger.info("Database initialized successfully")
 
-        Raises:
-            RuntimeError: If using async engine
+    def get_session(self) -> AsyncSession:
         """
-        if self.is_async:
-            raise RuntimeError("Cannot use get_session() with async engine. Use get_async_session() instead.")
-        return self.session_factory()
-
-    async def get_async_session(self) -> AsyncSession:
-        """
-        Get an async database session.
+        Get a new async database session.
 
         Returns:
             SQLAlchemy AsyncSession instance
-
-        Raises:
-            RuntimeError: If using sync engine
         """
-        if not self.is_async:
-            raise RuntimeError("Cannot use get_async_session() with sync engine. Use get_session() instead.")
         return self.session_factory()
 
     @asynccontextmanager
-    async def session_scope(self) -> AsyncGenerator[Session, None]:
+    async def session_scope(self) -> AsyncGenerator[AsyncSession, None]:
         """
         Provide a transactional scope for database operations.
 
         Yields:
-            Database session
+            Async database session
 
         Example:
             async with db.session_scope() as session:
                 session.add(my_object)
                 # Session will be committed automatically
         """
-        if self.is_async:
-            session = self.session_factory()
-            try:
-                yield session
-                await session.commit()
-            except Exception:
-                await session.rollback()
-                raise
-            finally:
-                await session.close()
-        else:
-            session = self.session_factory()
-            try:
-                yield session
-                session.commit()
-            except Exception:
-                session.rollback()
-                raise
-            finally:
-                session.close()
+        session = self.session_factory()
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
 
     async def close(self):
         """Close database connections."""
         if self.engine:
-            if self.is_async:
-                await self.engine.dispose()
-            else:
-                self.engine.dispose()
+            await self.engine.dispose()
             logger.info("Database connections closed")
 
 
@@ -209,38 +169,12 @@ def get_database() -> Database:
 
 
 # Dependency for FastAPI
-def get_db_session():
-    """
-    FastAPI dependency for getting database session.
-
-    Yields:
-        Database session
+async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
     """
-    db = get_database()
-    if db.is_async:
-        raise RuntimeError("Use get_async_db_session() for async databases")
-
-    session = db.get_session()
-    try:
-        yield session
-        session.commit()
-    except Exception:
-        session.rollback()
-        raise
-    finally:
-        session.close()
-
-
-async def get_async_db_session():
-    """
-    FastAPI dependency for getting async database session.
+    FastAPI dependency for getting an async database session.
 
     Yields:
         Async database session
     """
-    db = get_database()
-    if not db.is_async:
-        raise RuntimeError("Use get_db_session() for sync databases")
-
-    async with db.session_scope() as session:
+    async with get_database().session_scope() as session:
         yield session
@@ -3,8 +3,10 @@ SQLAlchemy database models for StoryQuest.
 Phase 3: Core Story Engine Backend
 """
 
+import os
+import time
 from datetime import datetime
-from uuid import uuid4
+from uuid import UUID, uuid4
 
 from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, TypeDecorator
 from sqlalchemy.dialects.postgresql import UUID as PGUUID
@@ -14,6 +16,23 @@ from sqlalchemy.orm import relationship
 Base = declarative_base()
 
 
+def uuid7() -> UUID:
+    """
+    Generate a time-ordered UUID (RFC 9562 version 7).
+
+    The leading 48 bits are the Unix time in milliseconds, so new rows land
+    at the end of primary key and session_id indexes instead of at random
+    B-tree pages like uuid4.
+
+    Returns:
+        UUID whose sort order follows creation time (to the millisecond)
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | 0x7 << 76  # version 7
+    value = value & ~(0x3 << 62) | 0x2 << 62  # RFC 4122 variant
+    return UUID(int=value)
+
+
 class GUID(TypeDecorator):
     """Platform-independent GUID type.
 
@@ -45,7 +64,6 @@ class GUID(TypeDecorator):
             return value
         else:
             if not isinstance(value, uuid4.__class__):
-                from uuid import UUID
                 return UUID(value)
             else:
                 return value
@@ -58,7 +76,7 @@ class Session(Base):
     id = Column(
         GUID,
         primary_key=True,
-        default=uuid4,
+        default=uuid7,
         nullable=False
     )
     player_name = Column(String(100), nullable=False)
@@ -89,7 +107,7 @@ class StoryTurn(Base):
     id = Column(
         GUID,
         primary_key=True,
-        default=uuid4,
+        default=uuid7,
         nullable=False
     )
     session_id = Column(
@@ -3,16 +3,21 @@ StoryQuest Backend - Main FastAPI Application
 Phase 3: Core Story Engine Backend
 """
 
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.story import router as story_router
 from app.api.v1.admin import router as admin_router
 from app.config import get_config
 from app.db.database import get_database, init_database
+from app.services.llm_factory import close_llm_provider
+from app.services.rate_limiter import RedisRateLimiter, get_rate_limiter, run_rate_limiter_sweeper
+from app.services.safety_filter_enhanced import close_moderation_batchers
 
 # Configure logging
 logging.basicConfig(
@@ -42,24 +47,88 @@ async def lifespan(app: FastAPI):
 
     # Create tables
     try:
-        if db.is_async:
-            await db.init_db()
-        else:
-            db.create_tables()
+        await db.init_db()
         logger.info("Database tables created/verified")
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
         raise
 
+    # Preload the rate limit script when using the shared Redis backend
+    rate_limiter = get_rate_limiter()
+    if isinstance(rate_limiter, RedisRateLimiter):
+        try:
+            await rate_limiter.load_scripts()
+            logger.info("Redis rate limiter ready")
+        except Exception as e:
+            logger.error(f"Could not load rate limit script into Redis: {e}")
+
+    # Keep in-memory rate limit tracking bounded to recently active clients
+    sweeper_task = asyncio.create_task(run_rate_limiter_sweeper())
+
     logger.info("StoryQuest Backend started successfully")
 
     yield
 
     # Shutdown
     logger.info("Shutting down StoryQuest Backend...")
+    sweeper_task.cancel()
     await db.close()
     logger.info("Database connections closed")
 
+    await close_llm_provider()
+    await close_moderation_batchers()
+
+    rate_limiter = get_rate_limiter()
+    if isinstance(rate_limiter, RedisRateLimiter):
+        await rate_limiter.close()
+
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies over safety.max_request_bytes with 413.
+
+    A declared Content-Length is checked before the app runs; bodies without
+    one are counted as they arrive, so oversized input is never buffered in
+    full just to be rejected by the safety filter.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = get_config().safety.max_request_bytes
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > max_bytes:
+                    response = ORJSONResponse(
+                        {"detail": "Request body too large"},
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    )
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="Request body too large",
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
 
 # Create FastAPI app
 app = FastAPI(
@@ -68,10 +137,13 @@ app = FastAPI(
     version="0.6.0",  # Phase 6
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,  # orjson encodes responses in C
     lifespan=lifespan
 )
 
-# Configure CORS
+app.add_middleware(BodySizeLimitMiddleware)
+
+# Configure CORS (added last so it wraps every response, including 413s)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # TODO: Configure properly for production
@@ -107,13 +179,8 @@ async def health_check():
     # Check database connection
     db_healthy = True
     try:
-        if db.is_async:
-            # For async, we just check if the engine exists
-            db_healthy = db.engine is not None
-        else:
-            # For sync, we can try to connect
-            with db.engine.connect() as conn:
-                db_healthy = True
+        # The async engine connects lazily; just check that it exists
+        db_healthy = db.engine is not None
     except Exception as e:
         logger.error(f"Database health check failed: {e}")
         db_healthy = False
@@ -54,7 +54,7 @@ class ContinueStoryRequest(BaseModel):
     choice_id: Optional[str] = Field(None, description="ID of the selected choice (if using suggested choice)")
     choice_text: Optional[str] = Field(None, description="Text of the selected choice (if using suggested choice)")
     custom_input: Optional[str] = Field(None, max_length=200, description="Custom player input (if not using suggested choice)")
-    story_summary: str = Field(..., description="Current story summary (sent by client for stateless backend)")
+    story_summary: str = Field("", description="Current story summary (the stored summary is used if omitted)")
 
     model_config = ConfigDict(
         json_schema_extra={
@@ -78,7 +78,9 @@ class StoryResponse(BaseModel):
 
 
 class LLMStoryResponse(BaseModel):
-    """The expected response format from the LLM."""
+    """The expected response format from the LLM. Immutable once parsed."""
+    model_config = ConfigDict(frozen=True)
+
     scene_text: str = Field(..., description="The narrative text for the next scene")
     choices: Optional[List[str]] = Field(default=None, description="List of 3 choice options (optional for final turn)")
     story_summary_update: str = Field(..., description="Updated story summary")
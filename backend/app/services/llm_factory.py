@@ -4,7 +4,7 @@ Phase 2: LLM abstraction layer
 """
 
 import logging
-from typing import Optional
+from typing import Callable, Dict, Optional
 
 from app.config import AppConfig, get_config
 from app.services.llm_provider import (
@@ -20,94 +20,117 @@ from app.services.llm_provider import (
 logger = logging.getLogger(__name__)
 
 
-def create_llm_provider(config: Optional[AppConfig] = None) -> LLMProvider:
+def _require_api_key(api_key: str, name: str, env_var: str) -> str:
     """
-    Create an LLM provider based on configuration.
+    Return the configured API key, raising if it is missing.
 
     Args:
-        config: Application configuration (uses global config if not provided)
+        api_key: Configured key (may be empty)
+        name: Provider display name for the error message
+        env_var: Environment variable that supplies the key
 
     Returns:
-        LLMProvider instance (Ollama, OpenAI, or Anthropic)
+        The API key
 
     Raises:
-        ValueError: If provider type is unknown or configuration is invalid
+        ValueError: If the key is empty
     """
-    if config is None:
-        config = get_config()
+    if not api_key:
+        raise ValueError(
+            f"{name} API key not configured. "
+            f"Set {env_var} environment variable or add to config.yaml"
+        )
+    return api_key
 
-    provider_type = config.llm.provider.lower()
 
-    logger.info(f"Creating LLM provider: {provider_type}")
+def _make_ollama(config: AppConfig) -> LLMProvider:
+    """Build the Ollama provider from config."""
+    return OllamaProvider(
+        model=config.llm.ollama.model,
+        base_url=config.llm.ollama.base_url
+    )
 
-    if provider_type == "ollama":
-        return OllamaProvider(
-            model=config.llm.ollama.model,
-            base_url=config.llm.ollama.base_url
-        )
 
-    elif provider_type == "openai":
-        api_key = config.llm.openai.api_key
-        if not api_key:
-            raise ValueError(
-                "OpenAI API key not configured. "
-                "Set OPENAI_API_KEY environment variable or add to config.yaml"
-            )
-        return OpenAIProvider(
-            api_key=api_key,
-            model=config.llm.openai.model
-        )
+def _make_openai(config: AppConfig) -> LLMProvider:
+    """Build the OpenAI provider from config."""
+    return OpenAIProvider(
+        api_key=_require_api_key(config.llm.openai.api_key, "OpenAI", "OPENAI_API_KEY"),
+        model=config.llm.openai.model
+    )
 
-    elif provider_type == "anthropic":
-        api_key = config.llm.anthropic.api_key
-        if not api_key:
-            raise ValueError(
-                "Anthropic API key not configured. "
-                "Set ANTHROPIC_API_KEY environment variable or add to config.yaml"
-            )
-        return AnthropicProvider(
-            api_key=api_key,
-            model=config.llm.anthropic.model
-        )
 
-    elif provider_type == "gemini":
-        api_key = config.llm.gemini.api_key
-        if not api_key:
-            raise ValueError(
-                "Gemini API key not configured. "
-                "Set GEMINI_API_KEY environment variable or add to config.yaml"
-            )
-        return GeminiProvider(
-            api_key=api_key,
-            model=config.llm.gemini.model
-        )
+def _make_anthropic(config: AppConfig) -> LLMProvider:
+    """Build the Anthropic provider from config."""
+    return AnthropicProvider(
+        api_key=_require_api_key(config.llm.anthropic.api_key, "Anthropic", "ANTHROPIC_API_KEY"),
+        model=config.llm.anthropic.model
+    )
 
-    elif provider_type == "openrouter":
-        api_key = config.llm.openrouter.api_key
-        if not api_key:
-            raise ValueError(
-                "OpenRouter API key not configured. "
-                "Set OPENROUTER_API_KEY environment variable or add to config.yaml"
-            )
-        return OpenRouterProvider(
-            api_key=api_key,
-            model=config.llm.openrouter.model,
-            site_url=config.llm.openrouter.site_url,
-            app_name=config.llm.openrouter.app_name,
-        )
 
-    elif provider_type == "lmstudio":
-        return LMStudioProvider(
-            model=config.llm.lmstudio.model,
-            base_url=config.llm.lmstudio.base_url
-        )
+def _make_gemini(config: AppConfig) -> LLMProvider:
+    """Build the Gemini provider from config."""
+    return GeminiProvider(
+        api_key=_require_api_key(config.llm.gemini.api_key, "Gemini", "GEMINI_API_KEY"),
+        model=config.llm.gemini.model
+    )
+
+
+def _make_openrouter(config: AppConfig) -> LLMProvider:
+    """Build the OpenRouter provider from config."""
+    return OpenRouterProvider(
+        api_key=_require_api_key(config.llm.openrouter.api_key, "OpenRouter", "OPENROUTER_API_KEY"),
+        model=config.llm.openrouter.model,
+        site_url=config.llm.openrouter.site_url,
+        app_name=config.llm.openrouter.app_name,
+    )
 
-    else:
+
+def _make_lmstudio(config: AppConfig) -> LLMProvider:
+    """Build the LM Studio provider from config."""
+    return LMStudioProvider(
+        model=config.llm.lmstudio.model,
+        base_url=config.llm.lmstudio.base_url
+    )
+
+
+# Provider name (lowercase) -> builder taking the app config
+_FACTORIES: Dict[str, Callable[[AppConfig], LLMProvider]] = {
+    "ollama": _make_ollama,
+    "openai": _make_openai,
+    "anthropic": _make_anthropic,
+    "gemini": _make_gemini,
+    "openrouter": _make_openrouter,
+    "lmstudio": _make_lmstudio,
+}
+
+
+def create_llm_provider(config: Optional[AppConfig] = None) -> LLMProvider:
+    """
+    Create an LLM provider based on configuration.
+
+    Args:
+        config: Application configuration (uses global config if not provided)
+
+    Returns:
+        LLMProvider instance (Ollama, OpenAI, or Anthropic)
+
+    Raises:
+        ValueError: If provider type is unknown or configuration is invalid
+    """
+    if config is None:
+        config = get_config()
+
+    provider_type = config.llm.provider.lower()
+    factory = _FACTORIES.get(provider_type)
+    if factory is None:
         raise ValueError(
             f"Unknown LLM provider: {provider_type}. "
-            f"Must be one of: ollama, openai, anthropic, gemini, openrouter, lmstudio"
+            f"Must be one of: {', '.join(_FACTORIES)}"
         )
 
+    logger.info(f"Creating LLM provider: {provider_type}")
+    return factory(config)
+
 
 # Global LLM provider instance
 _llm_provider: Optional[LLMProvider] = None
@@ -157,3 +180,15 @@ def reset_llm_provider() -> None:
             except Exception as e:
                 logger.warning(f"Error closing LLM provider: {e}")
     _llm_provider = None
+
+
+async def close_llm_provider() -> None:
+    """
+    Close the global LLM provider's HTTP client and clear the instance.
+
+    Called on application shutdown.
+    """
+    global _llm_provider
+    provider, _llm_provider = _llm_provider, None
+    if provider is not None and hasattr(provider, 'close'):
+        await provider.close()
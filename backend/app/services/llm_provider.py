@@ -13,8 +13,41 @@ from pydantic import ValidationError
 
 from app.models.story import LLMStoryResponse
 
+try:
+    import orjson
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers
+    # handle either parser's errors the same way
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+# Sent with request bodies serialized by _json_dumps
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+try:
+    import h2  # noqa: F401 - lets httpx speak HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Connection pool for each provider's client; the provider is shared by all
+# requests, so connections (and their TLS sessions) are reused across turns,
+# retries and hedged calls
+LLM_HTTP_LIMITS = httpx.Limits(max_connections=128, max_keepalive_connections=64)
+
+# Generation can take a while, but an unreachable host should fail fast so
+# retries and hedged calls get a chance to run
+LLM_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# How long Ollama keeps a model loaded after a request
+OLLAMA_KEEP_ALIVE = "30m"
+
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
@@ -133,7 +166,7 @@ class LLMProvider(ABC):
             cleaned_text = cleaned_text.strip()
 
             # Parse JSON
-            data = json.loads(cleaned_text)
+            data = _json_loads(cleaned_text)
 
             # Validate with Pydantic
             return LLMStoryResponse(**data)
@@ -165,7 +198,8 @@ class OllamaProvider(LLMProvider):
         """
         self.model = model
         self.base_url = base_url.rstrip("/")
-        self.client = httpx.AsyncClient(timeout=60.0)
+        self.generate_url = f"{self.base_url}/api/generate"
+        self.client = httpx.AsyncClient(timeout=LLM_HTTP_TIMEOUT, http2=HTTP2_AVAILABLE, limits=LLM_HTTP_LIMITS)
 
     async def generate_story_continuation(
         self,
@@ -181,6 +215,9 @@ class OllamaProvider(LLMProvider):
                 "model": self.model,
                 "prompt": prompt,
                 "stream": False,
+                # Keep the model loaded between turns so the shared prompt
+                # prefix stays in its KV cache
+                "keep_alive": OLLAMA_KEEP_ALIVE,
                 "options": {
                     "temperature": temperature,
                     "num_predict": max_tokens,
@@ -193,8 +230,9 @@ class OllamaProvider(LLMProvider):
 
             # Call Ollama API
             response = await self.client.post(
-                f"{self.base_url}/api/generate",
-                json=payload
+                self.generate_url,
+                content=_json_dumps(payload),
+                headers=JSON_HEADERS,
             )
             response.raise_for_status()
 
@@ -244,8 +282,9 @@ class OllamaProvider(LLMProvider):
                 payload["system"] = system_message
 
             response = await self.client.post(
-                f"{self.base_url}/api/generate",
-                json=payload
+                self.generate_url,
+                content=_json_dumps(payload),
+                headers=JSON_HEADERS,
             )
             response.raise_for_status()
 
@@ -261,6 +300,64 @@ class OllamaProvider(LLMProvider):
             logger.error(f"Unexpected error in Ollama raw JSON generation: {e}")
             raise
 
+    async def generate_story_continuation_stream(
+        self,
+        prompt: str,
+        system_message: Optional[str] = None,
+        max_tokens: int = 500,
+        temperature: float = 0.8
+    ) -> AsyncGenerator[str, None]:
+        """Generate story continuation using Ollama with streaming."""
+        try:
+            payload = {
+                "model": self.model,
+                "prompt": prompt,
+                "stream": True,  # Enable streaming
+                "keep_alive": OLLAMA_KEEP_ALIVE,
+                "options": {
+                    "temperature": temperature,
+                    "num_predict": max_tokens,
+                }
+            }
+
+            if system_message:
+                payload["system"] = system_message
+
+            # Call Ollama API with streaming
+            async with self.client.stream(
+                "POST",
+                self.generate_url,
+                content=_json_dumps(payload),
+                headers=JSON_HEADERS,
+            ) as response:
+                response.raise_for_status()
+
+                # Ollama streams newline-delimited JSON objects
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+
+                    try:
+                        chunk_data = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Skip malformed chunks
+                        logger.warning(f"Failed to parse streaming chunk: {line}")
+                        continue
+
+                    content = chunk_data.get("response", "")
+                    if content:
+                        yield content
+
+                    if chunk_data.get("done"):
+                        break
+
+        except httpx.HTTPError as e:
+            logger.error(f"Ollama streaming API error: {e}")
+            raise Exception(f"Failed to stream story with Ollama: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error in Ollama streaming: {e}")
+            raise
+
     async def close(self):
         """Close the HTTP client."""
         await self.client.aclose()
@@ -284,7 +381,9 @@ class OpenAIProvider(LLMProvider):
         self.api_key = api_key
         self.model = model
         self.client = httpx.AsyncClient(
-            timeout=60.0,
+            timeout=LLM_HTTP_TIMEOUT,
+            http2=HTTP2_AVAILABLE,
+            limits=LLM_HTTP_LIMITS,
             headers={
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json"
@@ -385,6 +484,65 @@ class OpenAIProvider(LLMProvider):
             logger.error(f"Unexpected error in OpenAI raw JSON generation: {e}")
             raise
 
+    async def generate_story_continuation_stream(
+        self,
+        prompt: str,
+        system_message: Optional[str] = None,
+        max_tokens: int = 500,
+        temperature: float = 0.8
+    ) -> AsyncGenerator[str, None]:
+        """Generate story continuation using OpenAI with streaming."""
+        try:
+            messages = []
+            if system_message:
+                messages.append({"role": "system", "content": system_message})
+            messages.append({"role": "user", "content": prompt})
+
+            payload = {
+                "model": self.model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "response_format": {"type": "json_object"},
+                "stream": True,  # Enable streaming
+            }
+
+            # Call OpenAI API with streaming
+            async with self.client.stream(
+                "POST",
+                "https://api.openai.com/v1/chat/completions",
+                json=payload
+            ) as response:
+                response.raise_for_status()
+
+                # Process SSE stream
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+
+                    data_str = line[6:]  # Remove "data: " prefix
+                    if data_str.strip() == "[DONE]":
+                        break
+
+                    try:
+                        chunk_data = json.loads(data_str)
+                    except json.JSONDecodeError:
+                        # Skip malformed chunks
+                        logger.warning(f"Failed to parse streaming chunk: {data_str}")
+                        continue
+
+                    if chunk_data.get("choices"):
+                        content = chunk_data["choices"][0].get("delta", {}).get("content", "")
+                        if content:
+                            yield content
+
+        except httpx.HTTPError as e:
+            logger.error(f"OpenAI streaming API error: {e}")
+            raise Exception(f"Failed to stream story with OpenAI: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error in OpenAI streaming: {e}")
+            raise
+
     async def close(self):
         """Close the HTTP client."""
         await self.client.aclose()
@@ -408,7 +566,9 @@ class AnthropicProvider(LLMProvider):
         self.api_key = api_key
         self.model = model
         self.client = httpx.AsyncClient(
-            timeout=60.0,
+            timeout=LLM_HTTP_TIMEOUT,
+            http2=HTTP2_AVAILABLE,
+            limits=LLM_HTTP_LIMITS,
             headers={
                 "x-api-key": api_key,
                 "anthropic-version": "2023-06-01",
@@ -435,9 +595,14 @@ class AnthropicProvider(LLMProvider):
                 ]
             }
 
-            # Add system message if provided
+            # Add system message if provided, marked cacheable so repeated
+            # turns for the same age range reuse the provider's prompt cache
             if system_message:
-                payload["system"] = system_message
+                payload["system"] = [{
+                    "type": "text",
+                    "text": system_message,
+                    "cache_control": {"type": "ephemeral"}
+                }]
 
             # Call Anthropic API
             response = await self.client.post(
@@ -508,6 +673,68 @@ class AnthropicProvider(LLMProvider):
             logger.error(f"Unexpected error in Anthropic raw JSON generation: {e}")
             raise
 
+    async def generate_story_continuation_stream(
+        self,
+        prompt: str,
+        system_message: Optional[str] = None,
+        max_tokens: int = 500,
+        temperature: float = 0.8
+    ) -> AsyncGenerator[str, None]:
+        """Generate story continuation using Anthropic Claude with streaming."""
+        try:
+            payload = {
+                "model": self.model,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "messages": [
+                    {"role": "user", "content": prompt}
+                ],
+                "stream": True,  # Enable streaming
+            }
+
+            if system_message:
+                payload["system"] = [{
+                    "type": "text",
+                    "text": system_message,
+                    "cache_control": {"type": "ephemeral"}
+                }]
+
+            # Call Anthropic API with streaming
+            async with self.client.stream(
+                "POST",
+                "https://api.anthropic.com/v1/messages",
+                json=payload
+            ) as response:
+                response.raise_for_status()
+
+                # Process SSE stream; text arrives in content_block_delta events
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+
+                    data_str = line[6:]  # Remove "data: " prefix
+                    try:
+                        event_data = json.loads(data_str)
+                    except json.JSONDecodeError:
+                        # Skip malformed chunks
+                        logger.warning(f"Failed to parse streaming chunk: {data_str}")
+                        continue
+
+                    event_type = event_data.get("type")
+                    if event_type == "content_block_delta":
+                        content = event_data.get("delta", {}).get("text", "")
+                        if content:
+                            yield content
+                    elif event_type == "message_stop":
+                        break
+
+        except httpx.HTTPError as e:
+            logger.error(f"Anthropic streaming API error: {e}")
+            raise Exception(f"Failed to stream story with Anthropic: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error in Anthropic streaming: {e}")
+            raise
+
     async def close(self):
         """Close the HTTP client."""
         await self.client.aclose()
@@ -525,7 +752,7 @@ class GeminiProvider(LLMProvider):
         self.api_key = api_key
         self.model = model
         self.base_url = base_url.rstrip("/")
-        self.client = httpx.AsyncClient(timeout=60.0)
+        self.client = httpx.AsyncClient(timeout=LLM_HTTP_TIMEOUT, http2=HTTP2_AVAILABLE, limits=LLM_HTTP_LIMITS)
 
     async def generate_story_continuation(
         self,
@@ -664,7 +891,9 @@ class OpenRouterProvider(LLMProvider):
         self.site_url = site_url
         self.app_name = app_name
         self.client = httpx.AsyncClient(
-            timeout=60.0,
+            timeout=LLM_HTTP_TIMEOUT,
+            http2=HTTP2_AVAILABLE,
+            limits=LLM_HTTP_LIMITS,
             headers={
                 "Authorization": f"Bearer {api_key}",
                 "HTTP-Referer": site_url,
@@ -851,7 +1080,9 @@ class LMStudioProvider(LLMProvider):
         self.model = model
         self.base_url = base_url.rstrip("/")
         self.client = httpx.AsyncClient(
-            timeout=60.0,
+            timeout=LLM_HTTP_TIMEOUT,
+            http2=HTTP2_AVAILABLE,
+            limits=LLM_HTTP_LIMITS,
             headers={"Content-Type": "application/json"}
         )
 
@@ -380,8 +380,11 @@ Keep the story focused on {theme_readable} elements throughout.
         else:
             storyteller_desc = "a Young Adult novelist creating authentic, unflinching fiction"
 
+        # Everything that is fixed for a session (storyteller, theme, content
+        # rules) comes first so providers can reuse the cached prompt prefix;
+        # the per-turn summary, choice and guidance follow.
         return f"""You are {storyteller_desc} writing for ages {age_range}.
-{theme_text}
+{theme_text}{content_rules}
 STORY SO FAR:
 {story_summary}
 
@@ -392,7 +395,6 @@ THE PLAYER JUST CHOSE THIS ACTION:
 
 EMOTIONAL TONE FOR THIS SCENE:
 The emotional tone for this turn should be: {emotional_tone}
-{content_rules}
 
 CRITICAL INSTRUCTION - STORY CONTINUITY:
 You MUST continue the story directly based on the player's chosen action above. The next scene MUST show what happens as a direct result of "{player_choice}". Do NOT ignore this choice or take the story in a different direction. The player's choice is the foundation for what happens next.
@@ -3,13 +3,26 @@ Rate Limiter for API endpoints.
 Phase 6: Enhanced Safety - Prevents abuse and ensures fair usage
 """
 
+import asyncio
+import logging
+import math
+import os
 import time
-from collections import defaultdict
+from abc import ABC, abstractmethod
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from typing import Dict, NamedTuple, Optional, Tuple
 
 from fastapi import Request, HTTPException, status
 
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Optional dependency, only needed for the Redis backend
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+NS_PER_SECOND = 1_000_000_000
+
 
 class RateLimitExceeded(HTTPException):
     """Exception raised when rate limit is exceeded."""
@@ -22,151 +35,403 @@ class RateLimitExceeded(HTTPException):
         )
 
 
-class RateLimiter:
+class RateLimitRule(NamedTuple):
+    """A limit of max_requests per sliding window of window_seconds."""
+    max_requests: int
+    window_seconds: int
+
+
+class WindowRule(NamedTuple):
+    """A rate limit rule resolved for the in-memory hot path."""
+    name: str
+    max_requests: int
+    window_ns: int
+
+
+class WindowCounter:
     """
-    Token bucket rate limiter for API endpoints.
-    Phase 6: Prevents abuse and ensures fair usage.
+    Request counts for the current and previous fixed window of one limit.
+
+    Uses __slots__ so each counter is a small fixed-layout object with fast
+    attribute access instead of a per-instance dict.
     """
 
-    def __init__(self):
-        """Initialize rate limiter with tracking dictionaries."""
-        # Session-based limits: {session_id: {endpoint: [(timestamp, count), ...]}}
-        self.session_requests: Dict[str, Dict[str, list]] = defaultdict(lambda: defaultdict(list))
+    __slots__ = ("cur_window_start", "cur", "prev")
+
+    def __init__(self, cur_window_start: int, cur: int = 0, prev: int = 0):
+        self.cur_window_start = cur_window_start
+        self.cur = cur
+        self.prev = prev
 
-        # IP-based limits: {ip: {endpoint: [(timestamp, count), ...]}}
-        self.ip_requests: Dict[str, Dict[str, list]] = defaultdict(lambda: defaultdict(list))
 
-        # Custom input tracking: {session_id: [timestamps]}
-        self.custom_input_requests: Dict[str, list] = defaultdict(list)
+class BucketState:
+    """
+    Lazy token bucket for one key: remaining tokens and last refill time.
+
+    Uses __slots__ for the same fixed, compact layout as WindowCounter.
+    """
 
+    __slots__ = ("tokens", "last")
+
+    def __init__(self, tokens: float, last: int):
+        self.tokens = tokens
+        self.last = last
+
+
+class BaseRateLimiter(ABC):
+    """
+    Abstract base class for rate limiter backends.
+    Phase 6: Prevents abuse and ensures fair usage.
+
+    All check methods return a tuple of (is_allowed, retry_after_seconds).
+    """
+
+    def __init__(self):
+        """Initialize the shared rate limit rules."""
         # Rate limit rules
-        self.limits = {
+        self.limits: Dict[str, RateLimitRule] = {
             # Session limits (per session_id)
-            "session_turns_per_hour": {
-                "max_requests": 20,
-                "window_seconds": 3600  # 1 hour
-            },
-            "session_turns_per_day": {
-                "max_requests": 100,
-                "window_seconds": 86400  # 24 hours
-            },
+            "session_turns_per_hour": RateLimitRule(max_requests=20, window_seconds=3600),  # 1 hour
+            "session_turns_per_day": RateLimitRule(max_requests=100, window_seconds=86400),  # 24 hours
 
             # Custom input limits (stricter to prevent abuse)
-            "custom_input_per_10min": {
-                "max_requests": 5,
-                "window_seconds": 600  # 10 minutes
-            },
+            "custom_input_per_10min": RateLimitRule(max_requests=5, window_seconds=600),  # 10 minutes
 
             # IP limits (prevent same IP from creating too many sessions)
-            "ip_per_hour": {
-                "max_requests": 50,
-                "window_seconds": 3600  # 1 hour
-            },
-            "ip_per_day": {
-                "max_requests": 200,
-                "window_seconds": 86400  # 24 hours
-            },
+            "ip_per_hour": RateLimitRule(max_requests=50, window_seconds=3600),  # 1 hour
+            "ip_per_day": RateLimitRule(max_requests=200, window_seconds=86400),  # 24 hours
 
             # Start story limits (prevent session spam)
-            "start_per_ip_per_hour": {
-                "max_requests": 10,
-                "window_seconds": 3600  # 1 hour
-            },
+            "start_per_ip_per_hour": RateLimitRule(max_requests=10, window_seconds=3600),  # 1 hour
         }
 
-    def _cleanup_old_entries(
+    @abstractmethod
+    async def check_session_rate_limit(
+        self,
+        session_id: str,
+        endpoint: str = "continue"
+    ) -> Tuple[bool, Optional[int]]:
+        """Check and record a story turn for a session."""
+        pass
+
+    @abstractmethod
+    async def check_custom_input_rate_limit(
+        self,
+        session_id: str
+    ) -> Tuple[bool, Optional[int]]:
+        """Check and record a custom input for a session."""
+        pass
+
+    @abstractmethod
+    async def check_ip_rate_limit(
         self,
-        entries: list,
-        window_seconds: int
-    ) -> list:
+        ip_address: str,
+        endpoint: str = "general"
+    ) -> Tuple[bool, Optional[int]]:
+        """Check and record a request from an IP address."""
+        pass
+
+    @abstractmethod
+    async def check_start_story_rate_limit(
+        self,
+        ip_address: str
+    ) -> Tuple[bool, Optional[int]]:
+        """Check and record a story start from an IP address."""
+        pass
+
+    @abstractmethod
+    async def check_all(
+        self,
+        session_id: Optional[str],
+        ip_address: str,
+        kind: str,
+        custom_input: bool = False
+    ) -> Tuple[bool, Optional[int]]:
+        """Check and record every limit that applies to a start or continue request."""
+        pass
+
+    @abstractmethod
+    def get_stats(self) -> Dict:
+        """Get rate limiter statistics."""
+        pass
+
+    def get_client_ip(self, request: Request) -> str:
         """
-        Remove entries older than the window.
+        Extract client IP from request.
+
+        The result is cached on request.state, so repeated limit checks for
+        one request parse the proxy headers only once.
 
         Args:
-            entries: List of (timestamp, count) tuples
-            window_seconds: Window size in seconds
+            request: FastAPI request object
 
         Returns:
-            Cleaned list
+            Client IP address
         """
-        now = time.time()
-        cutoff = now - window_seconds
-        return [(ts, count) for ts, count in entries if ts > cutoff]
+        ip = getattr(request.state, "client_ip", None)
+        if ip is not None:
+            return ip
+
+        # Check for forwarded IP (behind proxy)
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            ip = forwarded.partition(",")[0].strip()
+        else:
+            # Check for real IP header, then fall back to direct client
+            ip = request.headers.get("X-Real-IP") or (
+                request.client.host if request.client else "unknown"
+            )
+
+        request.state.client_ip = ip
+        return ip
+
+
+class RateLimiter(BaseRateLimiter):
+    """
+    In-memory rate limiter for a single worker process.
+    Phase 6: Prevents abuse and ensures fair usage.
+
+    The check methods never await between reading a key's state and
+    recording the request, so each check runs atomically on the event loop
+    and concurrent requests can't both slip under a limit. Keep it that way:
+    adding an await inside a check would need a per-key lock.
+    """
+
+    def __init__(self):
+        """Initialize rate limiter with tracking dictionaries."""
+        super().__init__()
+
+        # Timestamps are integer nanoseconds from time.monotonic_ns(), which
+        # is cheaper to compare than floats and immune to wall-clock jumps.
+        self.window_ns: Dict[str, int] = {
+            name: limit.window_seconds * NS_PER_SECOND
+            for name, limit in self.limits.items()
+        }
+
+        # Hot-path rules resolved once as WindowRule(name, max_requests, window_ns)
+        # so checks don't index into self.limits on every request
+        self._session_rules = self._resolve_rules("session_turns_per_hour", "session_turns_per_day")
+        self._ip_rules = self._resolve_rules("ip_per_hour", "ip_per_day")
+        self._custom_input_rule = self._resolve_rules("custom_input_per_10min")[0]
+        self._start_story_rule = self._resolve_rules("start_per_ip_per_hour")[0]
+
+        # Session-based limits: {(session_id, endpoint): {limit_name: WindowCounter}}
+        # Each counter holds the current and previous window counts,
+        # so memory stays constant per key regardless of request rate.
+        # Flat dicts keyed by tuple cost one hash and probe per check; they're
+        # filled via dict.get() on a miss rather than a defaultdict factory.
+        self.session_requests: Dict[Tuple[str, str], Dict[str, WindowCounter]] = {}
+
+        # IP-based limits: {(ip, endpoint): {limit_name: WindowCounter}}
+        self.ip_requests: Dict[Tuple[str, str], Dict[str, WindowCounter]] = {}
+
+        # Single-window limits use token buckets: burst of max_requests,
+        # refilled at max_requests per window.
+
+        # Custom input tracking: {session_id: BucketState}
+        self.custom_input_requests: Dict[str, BucketState] = {}
 
-    def check_session_rate_limit(
+        # Story start tracking: {ip: BucketState}
+        # Kept separate from ip_requests so a start isn't counted twice.
+        self.start_story_requests: Dict[str, BucketState] = {}
+
+    def _resolve_rules(self, *limit_names: str) -> Tuple[WindowRule, ...]:
+        """
+        Resolve limit names into WindowRules.
+
+        Args:
+            *limit_names: Names of the limits (in self.limits)
+
+        Returns:
+            Tuple of rules, in the given order
+        """
+        return tuple(
+            WindowRule(name, self.limits[name].max_requests, self.window_ns[name])
+            for name in limit_names
+        )
+
+    def _bucket_retry_after(
         self,
-        session_id: str,
-        endpoint: str = "continue"
-    ) -> Tuple[bool, Optional[int]]:
+        bucket: BucketState,
+        rule: WindowRule,
+        now: int
+    ) -> Optional[int]:
         """
-        Check if session has exceeded rate limit.
+        Refill a lazy token bucket and check it without consuming a token.
+
+        The bucket holds up to max_requests tokens and refills at
+        max_requests per window, so the configured limit is kept while
+        storing only two numbers per key.
 
         Args:
-            session_id: Session UUID
-            endpoint: Endpoint name
+            bucket: Bucket state for one key
+            rule: Rule to enforce
+            now: Current monotonic timestamp (ns)
 
         Returns:
-            Tuple of (is_allowed, retry_after_seconds)
+            Seconds until a token is available, or None if one is available now
         """
-        now = time.time()
+        _, max_requests, window_ns = rule
 
-        # Check hourly limit
-        hourly_limit = self.limits["session_turns_per_hour"]
-        entries = self.session_requests[session_id][endpoint]
-        entries = self._cleanup_old_entries(entries, hourly_limit["window_seconds"])
+        tokens = bucket.tokens + (now - bucket.last) * max_requests / window_ns
+        if tokens > max_requests:
+            tokens = max_requests
+        bucket.tokens = tokens
+        bucket.last = now
 
-        if len(entries) >= hourly_limit["max_requests"]:
-            oldest_timestamp = min(ts for ts, _ in entries)
-            retry_after = int(oldest_timestamp + hourly_limit["window_seconds"] - now)
-            return False, retry_after
+        if tokens < 1:
+            return math.ceil((1 - tokens) * window_ns / max_requests / NS_PER_SECOND)
+        return None
 
-        # Check daily limit
-        daily_limit = self.limits["session_turns_per_day"]
-        daily_entries = self._cleanup_old_entries(entries, daily_limit["window_seconds"])
+    def _windows_retry_after(
+        self,
+        windows: Dict[str, WindowCounter],
+        rules: Tuple[WindowRule, ...],
+        now: int
+    ) -> Optional[int]:
+        """
+        Roll approximate sliding windows forward and check them without recording.
+
+        Each window keeps only the count for the current fixed window and the
+        previous one; the previous count is weighted by how much of it still
+        overlaps the sliding window.
+
+        Args:
+            windows: Window counters for one key, by limit name
+            rules: Rules to enforce
+            now: Current monotonic timestamp (ns)
+
+        Returns:
+            Seconds until every window has room, or None if they all do now
+        """
+        for name, max_requests, window_ns in rules:
+            counter = windows.get(name)
+            if counter is None:
+                counter = windows[name] = WindowCounter(now)
+
+            elapsed = now - counter.cur_window_start
+            if elapsed >= window_ns:
+                # Roll forward; anything older than one window is forgotten
+                windows_passed = elapsed // window_ns
+                counter.prev = counter.cur if windows_passed == 1 else 0
+                counter.cur = 0
+                counter.cur_window_start += windows_passed * window_ns
+                elapsed = now - counter.cur_window_start
+
+            weight = 1 - elapsed / window_ns
+            prev, cur = counter.prev, counter.cur
+            estimate = prev * weight + cur
+
+            if estimate >= max_requests:
+                if cur < max_requests:
+                    # Wait for the previous window's share to decay enough
+                    wait = (estimate - max_requests) * window_ns / prev
+                else:
+                    # Wait for the roll, then for the rolled count to decay
+                    wait = weight * window_ns + window_ns * (1 - max_requests / cur)
+                return max(1, math.ceil(wait / NS_PER_SECOND))
+
+        return None
+
+    def _get_windows(
+        self,
+        requests: Dict[Tuple[str, str], Dict[str, WindowCounter]],
+        key: Tuple[str, str]
+    ) -> Dict[str, WindowCounter]:
+        """Get the window counters for a key, creating them on first use."""
+        windows = requests.get(key)
+        if windows is None:
+            windows = requests[key] = {}
+        return windows
+
+    def _get_bucket(
+        self,
+        requests: Dict[str, BucketState],
+        key: str,
+        rule: WindowRule,
+        now: int
+    ) -> BucketState:
+        """Get the token bucket for a key, creating a full one on first use."""
+        bucket = requests.get(key)
+        if bucket is None:
+            bucket = requests[key] = BucketState(rule.max_requests, now)
+        return bucket
+
+    def _check_windows(
+        self,
+        requests: Dict[Tuple[str, str], Dict[str, WindowCounter]],
+        key: Tuple[str, str],
+        rules: Tuple[WindowRule, ...]
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Check and record a request against the window counters for one key.
 
-        if len(daily_entries) >= daily_limit["max_requests"]:
-            oldest_timestamp = min(ts for ts, _ in daily_entries)
-            retry_after = int(oldest_timestamp + daily_limit["window_seconds"] - now)
+        Returns:
+            Tuple of (is_allowed, retry_after_seconds)
+        """
+        windows = self._get_windows(requests, key)
+        retry_after = self._windows_retry_after(windows, rules, time.monotonic_ns())
+        if retry_after is not None:
             return False, retry_after
 
-        # Add new entry
-        entries.append((now, 1))
-        self.session_requests[session_id][endpoint] = entries
+        for rule in rules:
+            windows[rule.name].cur += 1
+        return True, None
+
+    def _check_bucket(
+        self,
+        requests: Dict[str, BucketState],
+        key: str,
+        rule: WindowRule
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Check and record a request against the token bucket for one key.
 
+        Returns:
+            Tuple of (is_allowed, retry_after_seconds)
+        """
+        now = time.monotonic_ns()
+        bucket = self._get_bucket(requests, key, rule, now)
+        retry_after = self._bucket_retry_after(bucket, rule, now)
+        if retry_after is not None:
+            return False, retry_after
+
+        bucket.tokens -= 1
         return True, None
 
-    def check_custom_input_rate_limit(
+    async def check_session_rate_limit(
         self,
-        session_id: str
+        session_id: str,
+        endpoint: str = "continue"
     ) -> Tuple[bool, Optional[int]]:
         """
-        Check rate limit for custom input (stricter).
+        Check if session has exceeded rate limit.
 
         Args:
             session_id: Session UUID
+            endpoint: Endpoint name
 
         Returns:
             Tuple of (is_allowed, retry_after_seconds)
         """
-        now = time.time()
-        limit = self.limits["custom_input_per_10min"]
+        return self._check_windows(self.session_requests, (session_id, endpoint), self._session_rules)
 
-        # Get and clean entries
-        entries = self.custom_input_requests[session_id]
-        entries = [ts for ts in entries if ts > now - limit["window_seconds"]]
-
-        if len(entries) >= limit["max_requests"]:
-            oldest_timestamp = min(entries)
-            retry_after = int(oldest_timestamp + limit["window_seconds"] - now)
-            return False, retry_after
+    async def check_custom_input_rate_limit(
+        self,
+        session_id: str
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Check rate limit for custom input (stricter).
 
-        # Add new entry
-        entries.append(now)
-        self.custom_input_requests[session_id] = entries
+        Args:
+            session_id: Session UUID
 
-        return True, None
+        Returns:
+            Tuple of (is_allowed, retry_after_seconds)
+        """
+        return self._check_bucket(self.custom_input_requests, session_id, self._custom_input_rule)
 
-    def check_ip_rate_limit(
+    async def check_ip_rate_limit(
         self,
         ip_address: str,
         endpoint: str = "general"
@@ -181,119 +446,496 @@ class RateLimiter:
         Returns:
             Tuple of (is_allowed, retry_after_seconds)
         """
-        now = time.time()
+        return self._check_windows(self.ip_requests, (ip_address, endpoint), self._ip_rules)
 
-        # Check hourly limit
-        hourly_limit = self.limits["ip_per_hour"]
-        entries = self.ip_requests[ip_address][endpoint]
-        entries = self._cleanup_old_entries(entries, hourly_limit["window_seconds"])
+    async def check_start_story_rate_limit(
+        self,
+        ip_address: str
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Check rate limit for starting new stories (prevent session spam).
 
-        if len(entries) >= hourly_limit["max_requests"]:
-            oldest_timestamp = min(ts for ts, _ in entries)
-            retry_after = int(oldest_timestamp + hourly_limit["window_seconds"] - now)
-            return False, retry_after
+        Args:
+            ip_address: Client IP address
+
+        Returns:
+            Tuple of (is_allowed, retry_after_seconds)
+        """
+        return self._check_bucket(self.start_story_requests, ip_address, self._start_story_rule)
 
-        # Check daily limit
-        daily_limit = self.limits["ip_per_day"]
-        daily_entries = self._cleanup_old_entries(entries, daily_limit["window_seconds"])
+    async def check_all(
+        self,
+        session_id: Optional[str],
+        ip_address: str,
+        kind: str,
+        custom_input: bool = False
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Check and record every limit that applies to one request.
 
-        if len(daily_entries) >= daily_limit["max_requests"]:
-            oldest_timestamp = min(ts for ts, _ in daily_entries)
-            retry_after = int(oldest_timestamp + daily_limit["window_seconds"] - now)
-            return False, retry_after
+        Reads the clock once and checks all applicable limits before
+        recording anything, so a request rejected by one limit doesn't use
+        up the others.
 
-        # Add new entry
-        entries.append((now, 1))
-        self.ip_requests[ip_address][endpoint] = entries
+        Args:
+            session_id: Session UUID (for "continue")
+            ip_address: Client IP address
+            kind: "start_story" or "continue"
+            custom_input: Whether the request carries custom input
 
+        Returns:
+            Tuple of (is_allowed, retry_after_seconds)
+        """
+        now = time.monotonic_ns()
+
+        if kind == "start_story":
+            start_bucket = self._get_bucket(
+                self.start_story_requests, ip_address, self._start_story_rule, now
+            )
+            ip_windows = self._get_windows(self.ip_requests, (ip_address, kind))
+
+            retry_after = self._bucket_retry_after(start_bucket, self._start_story_rule, now)
+            if retry_after is None:
+                retry_after = self._windows_retry_after(ip_windows, self._ip_rules, now)
+            if retry_after is not None:
+                return False, retry_after
+
+            start_bucket.tokens -= 1
+        else:
+            session_windows = self._get_windows(self.session_requests, (session_id, kind))
+            ip_windows = self._get_windows(self.ip_requests, (ip_address, kind))
+            custom_bucket = None
+            if custom_input:
+                custom_bucket = self._get_bucket(
+                    self.custom_input_requests, session_id, self._custom_input_rule, now
+                )
+
+            retry_after = self._windows_retry_after(session_windows, self._session_rules, now)
+            if retry_after is None and custom_bucket is not None:
+                retry_after = self._bucket_retry_after(custom_bucket, self._custom_input_rule, now)
+            if retry_after is None:
+                retry_after = self._windows_retry_after(ip_windows, self._ip_rules, now)
+            if retry_after is not None:
+                return False, retry_after
+
+            for rule in self._session_rules:
+                session_windows[rule.name].cur += 1
+            if custom_bucket is not None:
+                custom_bucket.tokens -= 1
+
+        for rule in self._ip_rules:
+            ip_windows[rule.name].cur += 1
         return True, None
 
-    def check_start_story_rate_limit(
+    def get_stats(self) -> Dict:
+        """
+        Get rate limiter statistics.
+
+        Returns:
+            Dictionary with statistics
+        """
+        return {
+            "active_sessions": len({session_id for session_id, _ in self.session_requests}),
+            "active_ips": len({ip_address for ip_address, _ in self.ip_requests}),
+            "custom_input_tracked": len(self.custom_input_requests),
+            "backend": "memory",
+            "limits": {name: limit._asdict() for name, limit in self.limits.items()}
+        }
+
+    def clear(self) -> None:
+        """Drop all tracked counts, keeping the configured limits."""
+        self.session_requests.clear()
+        self.ip_requests.clear()
+        self.custom_input_requests.clear()
+        self.start_story_requests.clear()
+
+    def sweep(self, now: Optional[int] = None) -> int:
+        """
+        Drop tracking entries that can no longer affect any limit.
+
+        Window counters are idle once two full windows have passed since the
+        current window started (both counts have aged out); token buckets are
+        idle once a full window has passed since their last check, since they
+        have refilled completely by then.
+
+        Args:
+            now: Current monotonic timestamp in ns (defaults to time.monotonic_ns())
+
+        Returns:
+            Number of keys removed
+        """
+        if now is None:
+            now = time.monotonic_ns()
+        removed = 0
+
+        for requests in (self.session_requests, self.ip_requests):
+            # Snapshot items so keys can be deleted while iterating
+            for key, windows in list(requests.items()):
+                if all(
+                    now - counter.cur_window_start >= 2 * self.window_ns[name]
+                    for name, counter in windows.items()
+                ):
+                    del requests[key]
+                    removed += 1
+
+        for requests, limit_name in (
+            (self.custom_input_requests, "custom_input_per_10min"),
+            (self.start_story_requests, "start_per_ip_per_hour"),
+        ):
+            cutoff = now - self.window_ns[limit_name]
+            for key, bucket in list(requests.items()):
+                if bucket.last <= cutoff:
+                    del requests[key]
+                    removed += 1
+
+        return removed
+
+
+# Per-bucket counters: each limit keeps a hash of request counts per time
+# bucket (60 buckets per window, 24 hourly ones for a day), so memory per key
+# is fixed by the bucket count instead of growing with the request count.
+# Every window is summed before anything is written, so a rejected request
+# writes nothing; buckets that have left their window are dropped on the next
+# allowed request.
+# KEYS[i]: hash of {bucket_number: count} for limit i
+# ARGV[1]: now (ms); ARGV[2..]: triples of (window_ms, max_requests, bucket_ms)
+# Returns -1 if allowed, otherwise milliseconds until the oldest counted
+# bucket leaves the window.
+_BUCKET_COUNTER_SCRIPT = """
+local now = tonumber(ARGV[1])
+local current = {}
+local stale = {}
+for i = 1, #KEYS do
+    local window = tonumber(ARGV[3 * i - 1])
+    local bucket = tonumber(ARGV[3 * i + 1])
+    local buckets_per_window = window / bucket
+    current[i] = math.floor(now / bucket)
+    local first_live = current[i] - buckets_per_window + 1
+
+    local total = 0
+    local oldest = nil
+    stale[i] = {}
+    local fields = redis.call('HGETALL', KEYS[i])
+    for j = 1, #fields, 2 do
+        local b = tonumber(fields[j])
+        if b < first_live then
+            table.insert(stale[i], fields[j])
+        else
+            total = total + tonumber(fields[j + 1])
+            if oldest == nil or b < oldest then
+                oldest = b
+            end
+        end
+    end
+
+    if total >= tonumber(ARGV[3 * i]) then
+        return (oldest + buckets_per_window) * bucket - now
+    end
+end
+for i = 1, #KEYS do
+    if #stale[i] > 0 then
+        redis.call('HDEL', KEYS[i], unpack(stale[i]))
+    end
+    redis.call('HINCRBY', KEYS[i], current[i], 1)
+    redis.call('PEXPIRE', KEYS[i], ARGV[3 * i - 1])
+end
+return -1
+"""
+
+
+class RedisRateLimiter(BaseRateLimiter):
+    """
+    Redis-backed rate limiter shared by all workers.
+
+    Each check is a single EVALSHA of a Lua script, so it is atomic and costs
+    one round-trip. Counts survive restarts and are shared across workers.
+    Limits are enforced over time buckets, so a window is accurate to one
+    bucket (1/60 of the window, or one hour for daily limits).
+    """
+
+    def __init__(self, redis_url: str):
+        """
+        Initialize the Redis rate limiter.
+
+        Args:
+            redis_url: Redis connection URL (e.g. redis://localhost:6379/0)
+
+        Raises:
+            RuntimeError: If the redis package is not installed
+        """
+        if aioredis is None:
+            raise RuntimeError("redis package is not installed. Install with: pip install redis")
+
+        super().__init__()
+        self.redis = aioredis.from_url(redis_url)
+        # register_script calls EVALSHA and reloads the script on NOSCRIPT
+        self._bucket_counter = self.redis.register_script(_BUCKET_COUNTER_SCRIPT)
+
+        # Script arguments for each check, resolved once
+        self._session_args = self._window_args("session_turns_per_hour", "session_turns_per_day")
+        self._ip_args = self._window_args("ip_per_hour", "ip_per_day")
+        self._custom_input_args = self._window_args("custom_input_per_10min")
+        self._start_story_args = self._window_args("start_per_ip_per_hour")
+
+    def _window_args(self, *limit_names: str) -> Tuple[Tuple[str, ...], Tuple[int, ...]]:
+        """
+        Build the key suffixes and window arguments for the bucket script.
+
+        Windows of a day or longer use 24 buckets; shorter ones use 60.
+
+        Args:
+            *limit_names: Names of the limits (in self.limits) to enforce
+
+        Returns:
+            Tuple of (key suffixes, flattened (window_ms, max_requests, bucket_ms))
+        """
+        args = []
+        for name in limit_names:
+            limit = self.limits[name]
+            window_ms = limit.window_seconds * 1000
+            buckets = 24 if limit.window_seconds >= 86400 else 60
+            args.extend((window_ms, limit.max_requests, window_ms // buckets))
+        return limit_names, tuple(args)
+
+    async def load_scripts(self) -> None:
+        """Load the Lua script into Redis ahead of the first request."""
+        self._bucket_counter.sha = await self.redis.script_load(_BUCKET_COUNTER_SCRIPT)
+
+    async def _check(
         self,
-        ip_address: str
+        *limits: Tuple[str, Tuple[Tuple[str, ...], Tuple[int, ...]]]
     ) -> Tuple[bool, Optional[int]]:
         """
-        Check rate limit for starting new stories (prevent session spam).
+        Check and record a request against the limits on one or more keys.
+
+        All limits go to Redis in a single script call, so they are checked
+        together and a rejected request records nothing. Redis errors fail
+        open so an outage doesn't take the story API down.
 
         Args:
-            ip_address: Client IP address
+            *limits: (key prefix, window_args) pairs, where the key prefix
+                identifies the (kind, id, endpoint) and window_args come
+                from _window_args()
 
         Returns:
             Tuple of (is_allowed, retry_after_seconds)
         """
-        now = time.time()
-        limit = self.limits["start_per_ip_per_hour"]
+        # Wall-clock time: monotonic clocks aren't comparable across workers
+        now_ms = int(time.time() * 1000)
+        keys = []
+        args = [now_ms]
+        for key, (suffixes, window_args) in limits:
+            keys.extend(f"{key}:{suffix}" for suffix in suffixes)
+            args.extend(window_args)
+
+        try:
+            retry_ms = await self._bucket_counter(keys=keys, args=args)
+        except Exception as e:
+            logger.error(f"Redis rate limit check failed for {keys}: {e}")
+            return True, None
+
+        if retry_ms < 0:
+            return True, None
+        return False, max(1, math.ceil(retry_ms / 1000))
+
+    async def check_session_rate_limit(
+        self,
+        session_id: str,
+        endpoint: str = "continue"
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Check if session has exceeded rate limit.
 
-        entries = self.ip_requests[ip_address]["start_story"]
-        entries = self._cleanup_old_entries(entries, limit["window_seconds"])
+        Args:
+            session_id: Session UUID
+            endpoint: Endpoint name
 
-        if len(entries) >= limit["max_requests"]:
-            oldest_timestamp = min(ts for ts, _ in entries)
-            retry_after = int(oldest_timestamp + limit["window_seconds"] - now)
-            return False, retry_after
+        Returns:
+            Tuple of (is_allowed, retry_after_seconds)
+        """
+        return await self._check(
+            (f"rl:session:{session_id}:{endpoint}", self._session_args)
+        )
 
-        # Add new entry
-        entries.append((now, 1))
-        self.ip_requests[ip_address]["start_story"] = entries
+    async def check_custom_input_rate_limit(
+        self,
+        session_id: str
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Check rate limit for custom input (stricter).
 
-        return True, None
+        Args:
+            session_id: Session UUID
 
-    def get_client_ip(self, request: Request) -> str:
+        Returns:
+            Tuple of (is_allowed, retry_after_seconds)
         """
-        Extract client IP from request.
+        return await self._check(
+            (f"rl:session:{session_id}:custom_input", self._custom_input_args)
+        )
+
+    async def check_ip_rate_limit(
+        self,
+        ip_address: str,
+        endpoint: str = "general"
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Check if IP has exceeded rate limit.
 
         Args:
-            request: FastAPI request object
+            ip_address: Client IP address
+            endpoint: Endpoint name
 
         Returns:
-            Client IP address
+            Tuple of (is_allowed, retry_after_seconds)
         """
-        # Check for forwarded IP (behind proxy)
-        forwarded = request.headers.get("X-Forwarded-For")
-        if forwarded:
-            return forwarded.split(",")[0].strip()
+        return await self._check(
+            (f"rl:ip:{ip_address}:{endpoint}", self._ip_args)
+        )
+
+    async def check_start_story_rate_limit(
+        self,
+        ip_address: str
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Check rate limit for starting new stories (prevent session spam).
+
+        Args:
+            ip_address: Client IP address
+
+        Returns:
+            Tuple of (is_allowed, retry_after_seconds)
+        """
+        return await self._check(
+            (f"rl:ip:{ip_address}:start_story", self._start_story_args)
+        )
+
+    async def check_all(
+        self,
+        session_id: Optional[str],
+        ip_address: str,
+        kind: str,
+        custom_input: bool = False
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Check and record every limit that applies to one request.
 
-        # Check for real IP header
-        real_ip = request.headers.get("X-Real-IP")
-        if real_ip:
-            return real_ip
+        Args:
+            session_id: Session UUID (for "continue")
+            ip_address: Client IP address
+            kind: "start_story" or "continue"
+            custom_input: Whether the request carries custom input
 
-        # Fallback to direct client
-        return request.client.host if request.client else "unknown"
+        Returns:
+            Tuple of (is_allowed, retry_after_seconds)
+        """
+        if kind == "start_story":
+            return await self._check(
+                (f"rl:ip:{ip_address}:start_story", self._start_story_args),
+                (f"rl:ip:{ip_address}:{kind}", self._ip_args)
+            )
+
+        limits = [(f"rl:session:{session_id}:{kind}", self._session_args)]
+        if custom_input:
+            limits.append((f"rl:session:{session_id}:custom_input", self._custom_input_args))
+        limits.append((f"rl:ip:{ip_address}:{kind}", self._ip_args))
+        return await self._check(*limits)
 
     def get_stats(self) -> Dict:
         """
         Get rate limiter statistics.
 
+        Per-key counts live in Redis and are not scanned here.
+
         Returns:
             Dictionary with statistics
         """
         return {
-            "active_sessions": len(self.session_requests),
-            "active_ips": len(self.ip_requests),
-            "custom_input_tracked": len(self.custom_input_requests),
-            "limits": self.limits
+            "backend": "redis",
+            "limits": {name: limit._asdict() for name, limit in self.limits.items()}
         }
 
+    async def close(self):
+        """Close the Redis connection."""
+        await self.redis.aclose()
+
 
 # Global rate limiter instance
-_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter: Optional[BaseRateLimiter] = None
+
+
+def _create_rate_limiter() -> BaseRateLimiter:
+    """
+    Create a rate limiter for the configured backend.
+
+    Uses Redis when safety.rate_limit_redis_url is set, so limits hold across
+    workers and restarts; otherwise falls back to the in-memory limiter.
+
+    Returns:
+        Rate limiter instance
+    """
+    from app.config import get_config
+
+    redis_url = get_config().safety.rate_limit_redis_url
+    if redis_url:
+        try:
+            return RedisRateLimiter(redis_url)
+        except RuntimeError as e:
+            logger.warning(f"{e}; falling back to in-memory rate limiting")
+
+    # uvicorn and gunicorn both take their worker count from WEB_CONCURRENCY
+    workers = os.environ.get("WEB_CONCURRENCY", "1")
+    if workers.isdigit() and int(workers) > 1:
+        logger.warning(
+            f"In-memory rate limiting with {workers} workers: each worker keeps its "
+            f"own counts, so effective limits are {workers}x the configured values. "
+            f"Set safety.rate_limit_redis_url to share limits across workers."
+        )
+    return RateLimiter()
 
 
-def get_rate_limiter() -> RateLimiter:
+def get_rate_limiter() -> BaseRateLimiter:
     """
     Get the global rate limiter instance.
 
     Returns:
-        RateLimiter instance
+        Rate limiter instance
     """
     global _rate_limiter
     if _rate_limiter is None:
-        _rate_limiter = RateLimiter()
+        _rate_limiter = _create_rate_limiter()
     return _rate_limiter
 
 
+async def run_rate_limiter_sweeper(interval: int = 300):
+    """
+    Periodically sweep idle keys from the in-memory rate limiter.
+
+    Looks up the global limiter on every pass so it keeps working after
+    reset_rate_limiter(). Runs until cancelled.
+
+    Args:
+        interval: Seconds between sweeps
+    """
+    while True:
+        await asyncio.sleep(interval)
+        rate_limiter = get_rate_limiter()
+        if isinstance(rate_limiter, RateLimiter):
+            removed = rate_limiter.sweep()
+            if removed:
+                logger.info(f"Rate limiter sweep removed {removed} idle keys")
+
+
 def reset_rate_limiter():
-    """Reset the rate limiter (useful for testing)."""
+    """
+    Reset the rate limiter (useful for testing).
+
+    An existing in-memory limiter is cleared in place rather than replaced.
+    With the Redis backend only the client is recreated; stored counts
+    expire on their own.
+    """
     global _rate_limiter
-    _rate_limiter = RateLimiter()
+    if isinstance(_rate_limiter, RateLimiter):
+        _rate_limiter.clear()
+    else:
+        _rate_limiter = _create_rate_limiter()
@@ -3,80 +3,134 @@ Safety filter for content moderation.
 Phase 3: Core Story Engine Backend
 """
 
+import functools
 import logging
 import re
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    from app.services.safety_filter_enhanced import SafetyViolation
 
 logger = logging.getLogger(__name__)
 
 
+class FilterResult(NamedTuple):
+    """Outcome of filtering user input, shared by the basic and enhanced filters."""
+    is_safe: bool
+    text: str  # Sanitized input if safe, rejection reason otherwise
+    violation: Optional["SafetyViolation"] = None
+
+
+class ValidationResult(NamedTuple):
+    """Outcome of validating LLM output, shared by the basic and enhanced filters."""
+    is_valid: bool
+    violation: Optional["SafetyViolation"] = None
+
+# Word tokens for set lookups against the banned words
+_WORD_RE = re.compile(r"\w+")
+
+# Basic list of inappropriate words for kids, built once at import and
+# shared by every filter instance.
+# In production, this would be loaded from a file or database
+_BANNED_WORDS: FrozenSet[str] = frozenset([
+    "kill",
+    "murder",
+    "death",
+    "die",
+    "blood",
+    "gore",
+    "weapon",
+    "gun",
+    "knife",
+    "sword",
+    "fight",
+    "attack",
+    "hurt",
+    "pain",
+    "scary",
+    "horror",
+    "monster",
+    "ghost",
+    "zombie",
+    "demon",
+    "hell",
+    "damn",
+    "stupid",
+    "idiot",
+    "hate",
+])
+
+# Banned words at the start of any word in LLM output, so inflected forms
+# ("monsters", "killed", "fighting") are caught but "skill" is not
+_BANNED_WORD_RE = re.compile(r"\b(?:" + "|".join(map(re.escape, sorted(_BANNED_WORDS))) + ")")
+
+# Negative emotion indicators for the basic sentiment check
+_NEGATIVE_INDICATORS = ("sad", "cry", "afraid", "scared", "worried", "lonely", "lost")
+
+# Regex patterns for inappropriate content, by name
+_INAPPROPRIATE_PATTERNS: Dict[str, str] = {
+    # URLs
+    "url": r"https?://\S+",
+    "www_url": r"www\.\S+",
+    # Email addresses
+    "email": r"\S+@\S+\.\S+",
+    # Phone numbers
+    "phone": r"\b\d{3}[-.]?\d{3}[-.]?\d{4}\b",
+    # Addresses (basic pattern)
+    "address": r"\b\d+\s+\w+\s+(?:street|st|avenue|ave|road|rd|boulevard|blvd)\b",
+}
+
+# One alternation so each input is scanned once; lastgroup names the match
+_INAPPROPRIATE_RE = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, pattern in _INAPPROPRIATE_PATTERNS.items()),
+    re.IGNORECASE
+)
+
+
+@functools.lru_cache(maxsize=32)
+def _fallback_response(theme: str) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Build the fallback scene and choices for a theme.
+
+    Cached because the same few themes recur.
+
+    Args:
+        theme: Story theme
+
+    Returns:
+        Tuple of (scene_text, choices)
+    """
+    # Generic fallback that works for any theme
+    # Convert theme ID to readable format (e.g., "space_adventure" -> "Space Adventure")
+    theme_readable = theme.replace("_", " ").title()
+
+    scene = (
+        f"You find yourself in a wonderful place on your {theme_readable} adventure. "
+        "Everything around you is peaceful, inviting, and full of exciting possibilities!"
+    )
+
+    choices = (
+        "Look around carefully and observe",
+        "Take a deep breath and think about what to do",
+        "Choose a direction to explore"
+    )
+
+    return scene, choices
+
+
 class SafetyFilter:
     """Content safety filter for kid-friendly story generation."""
 
+    # Shared, read-only word list and patterns
+    banned_words = _BANNED_WORDS
+    inappropriate_patterns = _INAPPROPRIATE_PATTERNS
+    _combined_pattern = _INAPPROPRIATE_RE
+
     def __init__(self):
-        """Initialize safety filter with banned words and patterns."""
-        self.banned_words = self._load_banned_words()
-        self.inappropriate_patterns = self._load_inappropriate_patterns()
+        """Initialize safety filter."""
         self.max_input_length = 200
 
-    def _load_banned_words(self) -> List[str]:
-        """
-        Load list of banned words.
-
-        Returns:
-            List of banned words (lowercase)
-        """
-        # Basic list of inappropriate words for kids
-        # In production, this would be loaded from a file or database
-        return [
-            "kill",
-            "murder",
-            "death",
-            "die",
-            "blood",
-            "gore",
-            "weapon",
-            "gun",
-            "knife",
-            "sword",
-            "fight",
-            "attack",
-            "hurt",
-            "pain",
-            "scary",
-            "horror",
-            "monster",
-            "ghost",
-            "zombie",
-            "demon",
-            "hell",
-            "damn",
-            "stupid",
-            "idiot",
-            "hate",
-        ]
-
-    def _load_inappropriate_patterns(self) -> List[re.Pattern]:
-        """
-        Load regex patterns for inappropriate content.
-
-        Returns:
-            List of compiled regex patterns
-        """
-        patterns = [
-            # URLs
-            r"https?://\S+",
-            r"www\.\S+",
-            # Email addresses
-            r"\S+@\S+\.\S+",
-            # Phone numbers
-            r"\b\d{3}[-.]?\d{3}[-.]?\d{4}\b",
-            # Addresses (basic pattern)
-            r"\b\d+\s+\w+\s+(street|st|avenue|ave|road|rd|boulevard|blvd)\b",
-        ]
-        return [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
-
-    async def filter_user_input(self, text: str) -> Tuple[bool, str]:
+    async def filter_user_input(self, text: str) -> FilterResult:
         """
         Filter and validate user input.
 
@@ -84,38 +138,38 @@ class SafetyFilter:
             text: User input text to filter
 
         Returns:
-            Tuple of (is_safe: bool, sanitized_text_or_reason: str)
-                - If safe: (True, sanitized_text)
-                - If unsafe: (False, rejection_reason)
+            FilterResult with the sanitized text if safe, or the rejection
+            reason if not
         """
         if not text or not text.strip():
-            return False, "Input cannot be empty"
+            return FilterResult(False, "Input cannot be empty")
 
         # Check length
         if len(text) > self.max_input_length:
-            return False, f"Input too long (max {self.max_input_length} characters)"
+            return FilterResult(False, f"Input too long (max {self.max_input_length} characters)")
 
         # Sanitize text
         sanitized = text.strip()
 
         # Check for inappropriate patterns
-        for pattern in self.inappropriate_patterns:
-            if pattern.search(sanitized):
-                logger.warning(f"Input rejected - matched pattern: {pattern.pattern}")
-                return False, "Input contains inappropriate content (URLs, emails, or personal information)"
+        match = self._combined_pattern.search(sanitized)
+        if match:
+            logger.warning(
+                f"Input rejected - matched pattern {match.lastgroup}: "
+                f"{self.inappropriate_patterns[match.lastgroup]}"
+            )
+            return FilterResult(False, "Input contains inappropriate content (URLs, emails, or personal information)")
 
         # Check for banned words
-        words = sanitized.lower().split()
+        words = _WORD_RE.findall(sanitized.lower())
         for word in words:
-            # Remove punctuation for checking
-            clean_word = re.sub(r'[^\w\s]', '', word)
-            if clean_word in self.banned_words:
-                logger.warning(f"Input rejected - banned word: {clean_word}")
-                return False, f"Input contains inappropriate word: '{clean_word}'"
+            if word in self.banned_words:
+                logger.warning(f"Input rejected - banned word: {word}")
+                return FilterResult(False, f"Input contains inappropriate word: '{word}'")
 
-        return True, sanitized
+        return FilterResult(True, sanitized)
 
-    async def validate_llm_output(self, scene_text: str, choices: Optional[List[str]]) -> bool:
+    async def validate_llm_output(self, scene_text: str, choices: Optional[List[str]]) -> ValidationResult:
         """
         Validate LLM output for appropriateness.
 
@@ -124,35 +178,28 @@ class SafetyFilter:
             choices: List of choice options generated by LLM (optional for final turn)
 
         Returns:
-            True if content is appropriate, False otherwise
+            ValidationResult whose is_valid is True if content is appropriate
         """
-        # Check scene text
         scene_lower = scene_text.lower()
-        for word in self.banned_words:
-            if word in scene_lower:
-                logger.warning(f"LLM output rejected - banned word in scene: {word}")
-                return False
-
-        # Check choices (if provided)
-        if choices:
-            for choice in choices:
-                choice_lower = choice.lower()
-                for word in self.banned_words:
-                    if word in choice_lower:
-                        logger.warning(f"LLM output rejected - banned word in choice: {word}")
-                        return False
-
-        # Check for negative sentiment (basic check)
-        negative_indicators = ["sad", "cry", "afraid", "scared", "worried", "lonely", "lost"]
-        negative_count = sum(1 for indicator in negative_indicators if indicator in scene_lower)
+
+        # Check scene text and choices (if provided) in one scan; words
+        # never span the newline separators
+        text = "\n".join([scene_text, *choices]).lower() if choices else scene_lower
+        match = _BANNED_WORD_RE.search(text)
+        if match:
+            logger.warning(f"LLM output rejected - banned word: {match.group()}")
+            return ValidationResult(False)
+
+        # Check for negative sentiment (basic check; substring match so "cry" counts "crying")
+        negative_count = sum(1 for indicator in _NEGATIVE_INDICATORS if indicator in scene_lower)
 
         # Allow some mild negative emotions (it's part of storytelling),
         # but reject if too many negative indicators
         if negative_count > 3:
             logger.warning(f"LLM output rejected - too negative ({negative_count} negative indicators)")
-            return False
+            return ValidationResult(False)
 
-        return True
+        return ValidationResult(True)
 
     def get_fallback_response(self, theme: str) -> Tuple[str, List[str]]:
         """
@@ -164,20 +211,6 @@ class SafetyFilter:
         Returns:
             Tuple of (scene_text, choices)
         """
-        # Generic fallback that works for any theme
-        # Convert theme ID to readable format (e.g., "space_adventure" -> "Space Adventure")
-        theme_readable = theme.replace("_", " ").title()
-
-        scene = (
-            f"You find yourself in a wonderful place on your {theme_readable} adventure. "
-            "Everything around you is peaceful, inviting, and full of exciting possibilities!"
-        )
-
-        choices = [
-            "Look around carefully and observe",
-            "Take a deep breath and think about what to do",
-            "Choose a direction to explore"
-        ]
-
+        scene, choices = _fallback_response(theme)
         logger.info(f"Using fallback response for theme: {theme}")
-        return scene, choices
+        return scene, list(choices)
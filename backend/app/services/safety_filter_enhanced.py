@@ -3,16 +3,54 @@ Enhanced Safety Filter for content moderation.
 Phase 6: Enhanced Safety, Guardrails & Kid-Friendly Constraints
 """
 
+import asyncio
+import hashlib
+import functools
+import json
 import logging
 import re
+import time
+from collections import Counter, OrderedDict, deque
+from itertools import islice
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Deque, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
 from enum import Enum
 
 import httpx
 
+from app.services.safety_filter import FilterResult, ValidationResult
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+try:
+    import h2  # noqa: F401 - lets httpx speak HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Word tokens for set lookups against the word lists
+_WORD_RE = re.compile(r"\w+")
+
+# LRU cache of word-check verdicts for LLM output, shared by all filter
+# instances (the word lists are fixed, so a verdict depends only on the text)
+VERDICT_CACHE_SIZE = 2048
+_VERDICT_CACHE: "OrderedDict[bytes, Optional[SafetyViolation]]" = OrderedDict()
+
+# LRU cache of moderation API results by text digest, shared by all filter
+# instances; children's inputs repeat a lot and a text's result doesn't
+# change, so repeats skip the network. Failed checks are not cached.
+MODERATION_CACHE_SIZE = 4096
+_MODERATION_CACHE: "OrderedDict[bytes, Dict]" = OrderedDict()
+
+# Most recent violations kept per filter for the admin summary
+VIOLATIONS_LOG_SIZE = 1000
+
 
 class ViolationType(Enum):
     """Types of content violations."""
@@ -38,7 +76,390 @@ class SafetyViolation:
         self.severity = severity
         self.reason = reason
         self.details = details or {}
-        self.timestamp = datetime.utcnow()
+        # Integer wall-clock time; converted to a datetime only when read
+        self.timestamp_ns = time.time_ns()
+
+    @property
+    def timestamp(self) -> datetime:
+        """When the violation happened (naive UTC)."""
+        return datetime.utcfromtimestamp(self.timestamp_ns / 1_000_000_000)
+
+
+def _verdict_key(scene_text: str, choices: Optional[List[str]], age_range: Optional[str]) -> bytes:
+    """
+    Build the verdict cache key for a piece of LLM output.
+
+    Args:
+        scene_text: The scene text generated by LLM
+        choices: List of choice options generated by LLM
+        age_range: Age range of the player
+
+    Returns:
+        Digest of the age range, scene and choices
+    """
+    parts = [age_range or "", scene_text, *(choices or ())]
+    return hashlib.blake2b("\x00".join(parts).encode(), digest_size=16).digest()
+
+
+class LexiconEntry(NamedTuple):
+    """Everything the filter knows about one word."""
+    banned: bool
+    age_ranges: FrozenSet[str]  # Age ranges the word is inappropriate for
+    sentiment: float  # Sentiment weight, 0.0 if neutral
+
+
+class WordScan(NamedTuple):
+    """Result of one pass over a text's words."""
+    banned_word: Optional[str]  # First banned word, if any
+    age_word: Optional[str]  # First word inappropriate for the age range, if any
+    sentiment_score: float  # Between -1.0 and 1.0
+
+
+# Word lists and patterns are fixed, so they are built once at import and
+# shared by every filter instance (the story endpoints build one per request)
+
+# Banned words (lowercase)
+_BANNED_WORDS: FrozenSet[str] = frozenset([
+    # Violence & aggression
+    "kill", "murder", "death", "die", "dead", "dying", "killed",
+    "blood", "gore", "wound", "injury", "hurt", "pain", "suffer",
+    "weapon", "gun", "rifle", "pistol", "shoot", "shot",
+    "knife", "stab", "blade", "dagger",
+    "sword", "axe", "spear",
+    "bomb", "explode", "explosion",
+    "fight", "attack", "punch", "kick", "hit", "strike",
+    "war", "battle", "combat", "destroy", "destruction",
+
+    # Fear & horror
+    "terrify", "terror", "fear", "afraid", "frightening",
+    "horror", "horrify", "nightmare", "dread",
+    "monster", "demon", "devil","evil", "wicked", "sinister",
+
+    # Negative & harmful
+    "hate", "hatred", "despise", "loathe",
+    "stupid", "idiot", "dumb", "moron", "fool",
+    "ugly", "hideous", "disgusting", "gross",
+    "bad", "terrible", "awful", "horrible",
+    "steal", "thief", "rob", "robbery",
+    "lie", "liar", "cheat", "deceive",
+    "bully", "mean", "cruel", "nasty",
+
+    # Mild profanity (even mild)
+    "hell", "damn", "dammit", "crap", "suck",
+
+    # Danger & risk
+    "poison", "toxic", "venom", "trapped", "capture", "caught",
+    "lost", "alone", "abandoned", "stranded",
+
+    # Sadness (excessive)
+    "depressed", "depression", "miserable", "hopeless",
+    "despair", "anguish", "agony", "torment",
+])
+
+# Age-inappropriate words by age group
+_AGE_INAPPROPRIATE_WORDS: Dict[str, FrozenSet[str]] = {
+    "6-8": frozenset([
+        # Complex or scary concepts for young kids
+        "sacrifice", "betrayal", "revenge", "conspiracy",
+        "politics", "war", "battle", "conflict",
+        "complex", "complicated", "sophisticated",
+        "abstract", "theoretical", "philosophical",
+    ]),
+    "9-12": frozenset([
+        # Still age-inappropriate but less restrictive
+        "suicide", "depression", "mental", "therapy",
+        "romantic", "love", "dating", "relationship",
+    ])
+}
+
+# Overly complex vocabulary inappropriate for young children
+_COMPLEX_WORDS: FrozenSet[str] = frozenset([
+    "enigmatic", "perplexing", "bewildering", "confounding",
+    "esoteric", "abstruse", "recondite", "arcane",
+    "convoluted", "labyrinthine", "byzantine",
+    "juxtaposition", "dichotomy", "paradigm",
+])
+
+# Regex patterns for inappropriate content, by name
+_INAPPROPRIATE_PATTERNS: Dict[str, str] = {
+    # Personal information
+    "url": r"https?://\S+",
+    "www_url": r"www\.\S+",
+    "email": r"\S+@\S+\.\S+",
+    "phone": r"\b\d{3}[-.]?\d{3}[-.]?\d{4}\b",
+    "zip_code": r"\b\d{5}(?:-\d{4})?\b",
+    "address": r"\b\d+\s+\w+\s+(?:street|st|avenue|ave|road|rd|boulevard|blvd|lane|ln|drive|dr)\b",
+
+    # Social media handles
+    "handle": r"@\w+",  # Twitter-style handles
+    "hashtag": r"#\w+",  # Hashtags (could be used for coordination)
+
+    # Credit card patterns (basic)
+    "credit_card": r"\b\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b",
+
+    # Repeated characters (spam-like)
+    "repeated_chars": r"(?P<repeated_char>.)(?P=repeated_char){4,}",  # Same character 5+ times (aaaaa, 11111)
+
+    # ALL CAPS (shouting - three or more words); case-sensitive even
+    # though the combined pattern ignores case
+    "all_caps": r"(?-i:\b[A-Z]{5,}\b.*\b[A-Z]{5,}\b.*\b[A-Z]{5,}\b)",
+}
+
+# Positive words that should appear in good stories
+_POSITIVE_WORDS: FrozenSet[str] = frozenset([
+    "happy", "joy", "fun", "exciting", "wonderful", "amazing",
+    "beautiful", "kind", "friendly", "helpful", "brave", "clever",
+    "curious", "discover", "explore", "learn", "create", "build",
+    "friend", "together", "share", "help", "care", "love",
+    "smile", "laugh", "giggle", "play", "adventure", "magic",
+])
+
+# Sentiment weights for the keyword-based sentiment analysis
+_SENTIMENT_WEIGHTS: Dict[str, float] = {
+    # Negative indicators
+    "sad": -0.3, "cry": -0.3, "crying": -0.3, "tears": -0.2,
+    "afraid": -0.4, "scared": -0.4, "fear": -0.4, "frightened": -0.4,
+    "worried": -0.2, "anxious": -0.2, "nervous": -0.2,
+    "lonely": -0.4, "alone": -0.3, "lost": -0.4,
+    "angry": -0.3, "mad": -0.3, "upset": -0.2,
+    "fail": -0.3, "failed": -0.3, "failure": -0.3,
+    "wrong": -0.2, "mistake": -0.2, "error": -0.2,
+    "dark": -0.2, "darkness": -0.3, "shadow": -0.2,
+    "cold": -0.1, "rain": -0.1, "storm": -0.2,
+
+    # Positive indicators
+    "happy": 0.4, "joy": 0.4, "joyful": 0.4, "cheerful": 0.4,
+    "fun": 0.3, "exciting": 0.4, "excited": 0.4,
+    "wonderful": 0.4, "amazing": 0.4, "awesome": 0.4,
+    "beautiful": 0.3, "pretty": 0.3, "lovely": 0.3,
+    "kind": 0.3, "friendly": 0.3, "helpful": 0.3,
+    "brave": 0.4, "courageous": 0.4, "strong": 0.3,
+    "clever": 0.3, "smart": 0.3, "wise": 0.3,
+    "discover": 0.3, "explore": 0.3, "adventure": 0.4,
+    "friend": 0.3, "together": 0.2, "help": 0.2,
+    "smile": 0.3, "laugh": 0.4, "giggle": 0.4,
+    "bright": 0.2, "sunshine": 0.3, "rainbow": 0.3,
+}
+
+
+def _build_lexicon() -> Dict[str, LexiconEntry]:
+    """
+    Merge the word lists into one lexicon so each text is scanned once.
+
+    Returns:
+        Dictionary mapping words to their LexiconEntry
+    """
+    words = set(_BANNED_WORDS) | set(_SENTIMENT_WEIGHTS)
+    for age_words in _AGE_INAPPROPRIATE_WORDS.values():
+        words |= age_words
+
+    return {
+        word: LexiconEntry(
+            banned=word in _BANNED_WORDS,
+            age_ranges=frozenset(
+                age_range
+                for age_range, age_words in _AGE_INAPPROPRIATE_WORDS.items()
+                if word in age_words
+            ),
+            sentiment=_SENTIMENT_WEIGHTS.get(word, 0.0)
+        )
+        for word in words
+    }
+
+
+_LEXICON = _build_lexicon()
+
+# One alternation so each input is scanned once; lastgroup names the match
+_INAPPROPRIATE_RE = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, pattern in _INAPPROPRIATE_PATTERNS.items()),
+    re.IGNORECASE
+)
+
+
+MODERATION_API_URL = "https://api.openai.com/v1/moderations"
+
+
+class ModerationBatcher:
+    """
+    Coalesces concurrent moderation checks into batched API calls.
+
+    The moderations endpoint accepts a list of inputs, so texts submitted
+    within max_wait of each other (up to max_batch_size) share one request
+    and its round-trip.
+    """
+
+    def __init__(self, api_key: Optional[str], max_batch_size: int = 16, max_wait: float = 0.02):
+        """
+        Initialize moderation batcher.
+
+        Args:
+            api_key: OpenAI API key
+            max_batch_size: Most texts sent in one request
+            max_wait: Longest a text waits for others to join its batch (seconds)
+        """
+        self.api_key = api_key
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._send_tasks: Set[asyncio.Task] = set()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """HTTP client for the moderation API, reopened if it was closed."""
+        if self._client is None or self._client.is_closed:
+            # Keep connections warm so batches skip the TLS handshake; with
+            # HTTP/2 concurrent batches share one connection
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+                timeout=10.0,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                }
+            )
+        return self._client
+
+    async def check(self, text: str) -> Dict:
+        """
+        Moderate one text as part of the next batch.
+
+        Args:
+            text: Text to check
+
+        Returns:
+            The moderation result for this text (empty if none was returned)
+
+        Raises:
+            Exception: If the batch request failed
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """Send the oldest pending texts as one batch."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch = [item for item in self._pending[:self.max_batch_size] if not item[1].done()]
+        self._pending = self._pending[self.max_batch_size:]
+        if self._pending:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._send_tasks.add(task)
+            task.add_done_callback(self._send_tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """
+        Post a batch and hand each caller its result.
+
+        Args:
+            batch: (text, future) pairs in request order
+        """
+        try:
+            response = await self.client.post(
+                MODERATION_API_URL,
+                json={"input": [text for text, _ in batch]}
+            )
+            response.raise_for_status()
+            results = _json_loads(response.content).get("results", [])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(results[i] if i < len(results) else {})
+
+    async def close(self) -> None:
+        """Wait for batches in flight, then close the HTTP client."""
+        if self._send_tasks:
+            await asyncio.gather(*self._send_tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Global batchers by API key
+_moderation_batchers: Dict[Optional[str], ModerationBatcher] = {}
+
+
+def get_moderation_batcher(api_key: Optional[str]) -> ModerationBatcher:
+    """
+    Get the shared moderation batcher for an API key.
+
+    Args:
+        api_key: OpenAI API key
+
+    Returns:
+        ModerationBatcher instance
+    """
+    batcher = _moderation_batchers.get(api_key)
+    if batcher is None:
+        batcher = _moderation_batchers[api_key] = ModerationBatcher(api_key)
+    return batcher
+
+
+async def close_moderation_batchers() -> None:
+    """
+    Close every shared moderation batcher's HTTP client.
+
+    Called on application shutdown.
+    """
+    batchers = list(_moderation_batchers.values())
+    _moderation_batchers.clear()
+    for batcher in batchers:
+        await batcher.close()
+
+
+def _discard_violation(violation: SafetyViolation) -> None:
+    """Violation sink for filters that don't log violations."""
+
+
+@functools.lru_cache(maxsize=32)
+def _fallback_response(theme: str) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Build the fallback scene and choices for a theme.
+
+    Cached because the same few themes recur.
+
+    Args:
+        theme: Story theme
+
+    Returns:
+        Tuple of (scene_text, choices)
+    """
+    # Generic fallback that works for any theme
+    # Convert theme ID to readable format (e.g., "space_adventure" -> "Space Adventure")
+    theme_readable = theme.replace("_", " ").title()
+
+    scene = (
+        f"You find yourself in a wonderful, magical place on your {theme_readable} adventure. "
+        "Everything around you is peaceful, colorful, inviting, and filled with amazing possibilities!"
+    )
+
+    choices = (
+        "Look around at the beautiful scenery",
+        "Take a happy deep breath and think",
+        "Choose a fun direction to explore"
+    )
+
+    return scene, choices
 
 
 class EnhancedSafetyFilter:
@@ -47,6 +468,16 @@ class EnhancedSafetyFilter:
     Phase 6: Comprehensive safety and age-appropriate content filtering.
     """
 
+    # Shared, read-only word lists and patterns
+    banned_words = _BANNED_WORDS
+    age_inappropriate_words = _AGE_INAPPROPRIATE_WORDS
+    complex_words = _COMPLEX_WORDS
+    inappropriate_patterns = _INAPPROPRIATE_PATTERNS
+    positive_words = _POSITIVE_WORDS
+    sentiment_weights = _SENTIMENT_WEIGHTS
+    _lexicon = _LEXICON
+    _combined_pattern = _INAPPROPRIATE_RE
+
     def __init__(
         self,
         use_moderation_api: bool = False,
@@ -61,158 +492,29 @@ class EnhancedSafetyFilter:
             openai_api_key: OpenAI API key (required if use_moderation_api=True)
             log_violations: Whether to log violations to file
         """
-        self.banned_words = self._load_banned_words()
-        self.inappropriate_patterns = self._load_inappropriate_patterns()
-        self.age_inappropriate_words = self._load_age_inappropriate_words()
-        self.complex_words = self._load_complex_words()
-        self.positive_words = self._load_positive_words()
         self.max_input_length = 200
 
         self.use_moderation_api = use_moderation_api
         self.openai_api_key = openai_api_key
         self.log_violations = log_violations
-        self.violations_log: List[SafetyViolation] = []
+        # Recent violations only; the summary's counts cover every violation
+        self.violations_log: Deque[SafetyViolation] = deque(maxlen=VIOLATIONS_LOG_SIZE)
+        self._violation_total = 0
+        self._violations_by_type: Counter = Counter()
+        self._violations_by_severity: Counter = Counter()
+        # Pick the sink once instead of checking log_violations per violation
+        self._record_violation = self._log_violation if log_violations else _discard_violation
 
         if use_moderation_api:
-            self.moderation_client = httpx.AsyncClient(
-                timeout=10.0,
-                headers={
-                    "Authorization": f"Bearer {openai_api_key}",
-                    "Content-Type": "application/json"
-                }
-            )
-
-    def _load_banned_words(self) -> List[str]:
-        """
-        Load comprehensive list of banned words.
-
-        Returns:
-            List of banned words (lowercase)
-        """
-        return [
-            # Violence & aggression
-            "kill", "murder", "death", "die", "dead", "dying", "killed",
-            "blood", "gore", "wound", "injury", "hurt", "pain", "suffer",
-            "weapon", "gun", "rifle", "pistol", "shoot", "shot",
-            "knife", "stab", "blade", "dagger",
-            "sword", "axe", "spear",
-            "bomb", "explode", "explosion",
-            "fight", "attack", "punch", "kick", "hit", "strike",
-            "war", "battle", "combat", "destroy", "destruction",
-
-            # Fear & horror
-            "terrify", "terror", "fear", "afraid", "frightening",
-            "horror", "horrify", "nightmare", "dread",
-            "monster", "demon", "devil","evil", "wicked", "sinister",
-
-            # Negative & harmful
-            "hate", "hatred", "despise", "loathe",
-            "stupid", "idiot", "dumb", "moron", "fool",
-            "ugly", "hideous", "disgusting", "gross",
-            "bad", "terrible", "awful", "horrible",
-            "steal", "thief", "rob", "robbery",
-            "lie", "liar", "cheat", "deceive",
-            "bully", "mean", "cruel", "nasty",
-
-            # Mild profanity (even mild)
-            "hell", "damn", "dammit", "crap", "suck",
-
-            # Danger & risk
-            "poison", "toxic", "venom", "trapped", "capture", "caught",
-            "lost", "alone", "abandoned", "stranded",
-
-            # Sadness (excessive)
-            "depressed", "depression", "miserable", "hopeless",
-            "despair", "anguish", "agony", "torment",
-        ]
-
-    def _load_age_inappropriate_words(self) -> Dict[str, List[str]]:
-        """
-        Load age-inappropriate words by age group.
-
-        Returns:
-            Dictionary mapping age groups to inappropriate words
-        """
-        return {
-            "6-8": [
-                # Complex or scary concepts for young kids
-                "sacrifice", "betrayal", "revenge", "conspiracy",
-                "politics", "war", "battle", "conflict",
-                "complex", "complicated", "sophisticated",
-                "abstract", "theoretical", "philosophical",
-            ],
-            "9-12": [
-                # Still age-inappropriate but less restrictive
-                "suicide", "depression", "mental", "therapy",
-                "romantic", "love", "dating", "relationship",
-            ]
-        }
-
-    def _load_complex_words(self) -> List[str]:
-        """
-        Load overly complex vocabulary inappropriate for young children.
-
-        Returns:
-            List of complex words
-        """
-        return [
-            "enigmatic", "perplexing", "bewildering", "confounding",
-            "esoteric", "abstruse", "recondite", "arcane",
-            "convoluted", "labyrinthine", "byzantine",
-            "juxtaposition", "dichotomy", "paradigm",
-        ]
-
-    def _load_inappropriate_patterns(self) -> List[re.Pattern]:
-        """
-        Load regex patterns for inappropriate content.
-
-        Returns:
-            List of compiled regex patterns
-        """
-        patterns = [
-            # Personal information
-            r"https?://\S+",  # URLs
-            r"www\.\S+",  # URLs
-            r"\S+@\S+\.\S+",  # Email addresses
-            r"\b\d{3}[-.]?\d{3}[-.]?\d{4}\b",  # Phone numbers
-            r"\b\d{5}(?:-\d{4})?\b",  # ZIP codes
-            r"\b\d+\s+\w+\s+(street|st|avenue|ave|road|rd|boulevard|blvd|lane|ln|drive|dr)\b",  # Addresses
-
-            # Social media handles
-            r"@\w+",  # Twitter-style handles
-            r"#\w+",  # Hashtags (could be used for coordination)
-
-            # Credit card patterns (basic)
-            r"\b\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b",
-
-            # Repeated characters (spam-like)
-            r"(.)\1{4,}",  # Same character 5+ times (aaaaa, 11111)
-
-            # ALL CAPS (shouting - more than 5 words)
-            r"\b[A-Z]{5,}\b.*\b[A-Z]{5,}\b.*\b[A-Z]{5,}\b",
-        ]
-        return [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
-
-    def _load_positive_words(self) -> List[str]:
-        """
-        Load positive words that should appear in good stories.
-
-        Returns:
-            List of positive words
-        """
-        return [
-            "happy", "joy", "fun", "exciting", "wonderful", "amazing",
-            "beautiful", "kind", "friendly", "helpful", "brave", "clever",
-            "curious", "discover", "explore", "learn", "create", "build",
-            "friend", "together", "share", "help", "care", "love",
-            "smile", "laugh", "giggle", "play", "adventure", "magic",
-        ]
+            # Shared per API key so concurrent requests' checks can be batched
+            self._moderation_batcher = get_moderation_batcher(openai_api_key)
+            self.moderation_client = self._moderation_batcher.client
 
     async def filter_user_input(
         self,
         text: str,
         age_range: Optional[str] = None
-    ) -> Tuple[bool, str, Optional[SafetyViolation]]:
+    ) -> FilterResult:
         """
         Filter and validate user input with enhanced checks.
 
@@ -221,7 +523,7 @@ class EnhancedSafetyFilter:
             age_range: Age range of the player (e.g., "6-8", "9-12")
 
         Returns:
-            Tuple of (is_safe, sanitized_text_or_reason, violation)
+            FilterResult of (is_safe, sanitized_text_or_reason, violation)
         """
         if not text or not text.strip():
             violation = SafetyViolation(
@@ -229,7 +531,7 @@ class EnhancedSafetyFilter:
                 "low",
                 "Input cannot be empty"
             )
-            return False, "Input cannot be empty", violation
+            return FilterResult(False, "Input cannot be empty", violation)
 
         # Check length
         if len(text) > self.max_input_length:
@@ -239,57 +541,52 @@ class EnhancedSafetyFilter:
                 f"Input too long (max {self.max_input_length} characters)",
                 {"length": len(text), "max": self.max_input_length}
             )
-            return False, f"Input too long (max {self.max_input_length} characters)", violation
+            return FilterResult(False, f"Input too long (max {self.max_input_length} characters)", violation)
 
         # Sanitize text
         sanitized = text.strip()
 
         # Check for inappropriate patterns
-        for pattern in self.inappropriate_patterns:
-            if pattern.search(sanitized):
-                logger.warning(f"Input rejected - matched pattern: {pattern.pattern}")
-                violation = SafetyViolation(
-                    ViolationType.INAPPROPRIATE_PATTERN,
-                    "high",
-                    "Input contains inappropriate content (URLs, emails, or personal information)",
-                    {"pattern": pattern.pattern}
-                )
-                if self.log_violations:
-                    self.violations_log.append(violation)
-                return False, "Please don't include personal information, links, or contact details", violation
+        match = self._combined_pattern.search(sanitized)
+        if match:
+            pattern = self.inappropriate_patterns[match.lastgroup]
+            logger.warning(f"Input rejected - matched pattern {match.lastgroup}: {pattern}")
+            violation = SafetyViolation(
+                ViolationType.INAPPROPRIATE_PATTERN,
+                "high",
+                "Input contains inappropriate content (URLs, emails, or personal information)",
+                {"pattern": pattern, "pattern_name": match.lastgroup}
+            )
+            self._record_violation(violation)
+            return FilterResult(False, "Please don't include personal information, links, or contact details", violation)
+
+        scan = self._scan_words(_WORD_RE.findall(sanitized.lower()), age_range)
 
         # Check for banned words
-        words = sanitized.lower().split()
-        for word in words:
-            clean_word = re.sub(r'[^\w\s]', '', word)
-            if clean_word in self.banned_words:
-                logger.warning(f"Input rejected - banned word: {clean_word}")
-                violation = SafetyViolation(
-                    ViolationType.BANNED_WORD,
-                    "high",
-                    f"Input contains inappropriate word: '{clean_word}'",
-                    {"word": clean_word}
-                )
-                if self.log_violations:
-                    self.violations_log.append(violation)
-                return False, f"Let's use kinder words in our story", violation
+        if scan.banned_word is not None:
+            word = scan.banned_word
+            logger.warning(f"Input rejected - banned word: {word}")
+            violation = SafetyViolation(
+                ViolationType.BANNED_WORD,
+                "high",
+                f"Input contains inappropriate word: '{word}'",
+                {"word": word}
+            )
+            self._record_violation(violation)
+            return FilterResult(False, f"Let's use kinder words in our story", violation)
 
         # Check age-inappropriate words
-        if age_range and age_range in self.age_inappropriate_words:
-            age_banned = self.age_inappropriate_words[age_range]
-            for word in words:
-                clean_word = re.sub(r'[^\w\s]', '', word)
-                if clean_word in age_banned:
-                    logger.warning(f"Input rejected - age-inappropriate for {age_range}: {clean_word}")
-                    violation = SafetyViolation(
-                        ViolationType.AGE_INAPPROPRIATE,
-                        "medium",
-                        f"Word too complex or inappropriate for age {age_range}",
-                        {"word": clean_word, "age_range": age_range}
-                    )
-                    if self.log_violations:
-                        self.violations_log.append(violation)
-                    return False, "Let's use simpler, more fun ideas for our story!", violation
+        if scan.age_word is not None:
+            word = scan.age_word
+            logger.warning(f"Input rejected - age-inappropriate for {age_range}: {word}")
+            violation = SafetyViolation(
+                ViolationType.AGE_INAPPROPRIATE,
+                "medium",
+                f"Word too complex or inappropriate for age {age_range}",
+                {"word": word, "age_range": age_range}
+            )
+            self._record_violation(violation)
+            return FilterResult(False, "Let's use simpler, more fun ideas for our story!", violation)
 
         # Optional: Use OpenAI Moderation API
         if self.use_moderation_api:
@@ -301,63 +598,116 @@ class EnhancedSafetyFilter:
                     moderation_reason or "Content flagged by moderation API",
                     {"text": sanitized}
                 )
-                if self.log_violations:
-                    self.violations_log.append(violation)
-                return False, "Let's try a different idea for our adventure!", violation
+                self._record_violation(violation)
+                return FilterResult(False, "Let's try a different idea for our adventure!", violation)
 
-        return True, sanitized, None
+        return FilterResult(True, sanitized, None)
 
     async def validate_llm_output(
         self,
         scene_text: str,
         choices: Optional[List[str]],
         age_range: Optional[str] = None
-    ) -> Tuple[bool, Optional[SafetyViolation]]:
+    ) -> ValidationResult:
         """
         Validate LLM output for appropriateness with enhanced checks.
 
+        Verdicts of the word-based checks are cached across filter instances,
+        so retried or recurring text isn't scanned again.
+
         Args:
             scene_text: The scene text generated by LLM
             choices: List of choice options generated by LLM (optional for final turn)
             age_range: Age range of the player
 
         Returns:
-            Tuple of (is_valid, violation)
+            ValidationResult of (is_valid, violation)
         """
-        # Check scene text for banned words
-        scene_lower = scene_text.lower()
-        for word in self.banned_words:
-            if f" {word} " in f" {scene_lower} " or scene_lower.startswith(word) or scene_lower.endswith(word):
-                logger.warning(f"LLM output rejected - banned word in scene: {word}")
+        key = _verdict_key(scene_text, choices, age_range)
+        if key in _VERDICT_CACHE:
+            _VERDICT_CACHE.move_to_end(key)
+            violation = _VERDICT_CACHE[key]
+            if violation is not None:
+                logger.warning(f"LLM output rejected (cached verdict) - {violation.reason}")
+                violation = SafetyViolation(
+                    violation.violation_type,
+                    violation.severity,
+                    violation.reason,
+                    violation.details
+                )
+        else:
+            violation = self._check_output_words(scene_text, choices, age_range)
+            _VERDICT_CACHE[key] = violation
+            if len(_VERDICT_CACHE) > VERDICT_CACHE_SIZE:
+                _VERDICT_CACHE.popitem(last=False)
+
+        if violation is not None:
+            self._record_violation(violation)
+            return ValidationResult(False, violation)
+
+        # Optional: Use moderation API for LLM output
+        if self.use_moderation_api:
+            is_safe_moderation, _ = await self._check_moderation_api(scene_text)
+            if not is_safe_moderation:
                 violation = SafetyViolation(
-                    ViolationType.BANNED_WORD,
+                    ViolationType.MODERATION_API,
                     "high",
-                    f"LLM output contains banned word: {word}",
-                    {"word": word, "context": "scene"}
+                    "LLM output flagged by moderation API"
                 )
-                if self.log_violations:
-                    self.violations_log.append(violation)
-                return False, violation
+                self._record_violation(violation)
+                return ValidationResult(False, violation)
+
+        return ValidationResult(True, None)
+
+    def _check_output_words(
+        self,
+        scene_text: str,
+        choices: Optional[List[str]],
+        age_range: Optional[str]
+    ) -> Optional[SafetyViolation]:
+        """
+        Run the word-based checks on LLM output.
+
+        Args:
+            scene_text: The scene text generated by LLM
+            choices: List of choice options generated by LLM (optional for final turn)
+            age_range: Age range of the player
+
+        Returns:
+            The first violation found, or None if the output passes
+        """
+        # One pass over the scene covers banned words, sentiment and age
+        scan = self._scan_words(_WORD_RE.findall(scene_text.lower()), age_range)
+
+        # Check scene text for banned words
+        word = scan.banned_word
+        if word is not None:
+            logger.warning(f"LLM output rejected - banned word in scene: {word}")
+            violation = SafetyViolation(
+                ViolationType.BANNED_WORD,
+                "high",
+                f"LLM output contains banned word: {word}",
+                {"word": word, "context": "scene"}
+            )
+            return violation
 
         # Check choices for banned words (if provided)
         if choices:
             for i, choice in enumerate(choices):
-                choice_lower = choice.lower()
-                for word in self.banned_words:
-                    if f" {word} " in f" {choice_lower} " or choice_lower.startswith(word) or choice_lower.endswith(word):
-                        logger.warning(f"LLM output rejected - banned word in choice {i}: {word}")
-                        violation = SafetyViolation(
-                            ViolationType.BANNED_WORD,
-                            "high",
-                            f"LLM choice contains banned word: {word}",
-                            {"word": word, "context": f"choice_{i}"}
-                        )
-                        if self.log_violations:
-                            self.violations_log.append(violation)
-                        return False, violation
+                found = self.banned_words.intersection(_WORD_RE.findall(choice.lower()))
+                if found:
+                    word = min(found)
+                    logger.warning(f"LLM output rejected - banned word in choice {i}: {word}")
+                    violation = SafetyViolation(
+                        ViolationType.BANNED_WORD,
+                        "high",
+                        f"LLM choice contains banned word: {word}",
+                        {"word": word, "context": f"choice_{i}"}
+                    )
+                    return violation
 
         # Enhanced sentiment analysis
-        sentiment_score = self._analyze_sentiment(scene_text)
+        sentiment_score = scan.sentiment_score
         if sentiment_score < -0.3:  # Too negative
             logger.warning(f"LLM output rejected - too negative (score: {sentiment_score})")
             violation = SafetyViolation(
@@ -366,102 +716,66 @@ class EnhancedSafetyFilter:
                 "LLM output is too negative",
                 {"sentiment_score": sentiment_score}
             )
-            if self.log_violations:
-                self.violations_log.append(violation)
-            return False, violation
+            return violation
 
         # Check for age-appropriate vocabulary
-        if age_range and age_range in self.age_inappropriate_words:
-            age_banned = self.age_inappropriate_words[age_range]
-            words = scene_text.lower().split()
-            for word in words:
-                clean_word = re.sub(r'[^\w\s]', '', word)
-                if clean_word in age_banned:
-                    logger.warning(f"LLM output rejected - age-inappropriate word: {clean_word}")
-                    violation = SafetyViolation(
-                        ViolationType.AGE_INAPPROPRIATE,
-                        "medium",
-                        f"LLM output contains age-inappropriate word for {age_range}",
-                        {"word": clean_word, "age_range": age_range}
-                    )
-                    if self.log_violations:
-                        self.violations_log.append(violation)
-                    return False, violation
-
-        # Optional: Use moderation API for LLM output
-        if self.use_moderation_api:
-            is_safe_moderation, _ = await self._check_moderation_api(scene_text)
-            if not is_safe_moderation:
-                violation = SafetyViolation(
-                    ViolationType.MODERATION_API,
-                    "high",
-                    "LLM output flagged by moderation API"
-                )
-                if self.log_violations:
-                    self.violations_log.append(violation)
-                return False, violation
+        if scan.age_word is not None:
+            word = scan.age_word
+            logger.warning(f"LLM output rejected - age-inappropriate word: {word}")
+            violation = SafetyViolation(
+                ViolationType.AGE_INAPPROPRIATE,
+                "medium",
+                f"LLM output contains age-inappropriate word for {age_range}",
+                {"word": word, "age_range": age_range}
+            )
+            return violation
 
-        return True, None
+        return None
 
-    def _analyze_sentiment(self, text: str) -> float:
+    def _scan_words(self, words: List[str], age_range: Optional[str] = None) -> WordScan:
         """
-        Analyze sentiment of text (simple keyword-based approach).
+        Look every word up in the lexicon in a single pass.
 
         Args:
-            text: Text to analyze
+            words: Lowercase word tokens
+            age_range: Age range of the player (e.g., "6-8", "9-12")
 
         Returns:
-            Sentiment score between -1.0 (very negative) and 1.0 (very positive)
+            WordScan with the first banned and age-inappropriate words and the sentiment score
         """
-        text_lower = text.lower()
-
-        # Negative indicators with weights
-        negative_indicators = {
-            "sad": -0.3, "cry": -0.3, "crying": -0.3, "tears": -0.2,
-            "afraid": -0.4, "scared": -0.4, "fear": -0.4, "frightened": -0.4,
-            "worried": -0.2, "anxious": -0.2, "nervous": -0.2,
-            "lonely": -0.4, "alone": -0.3, "lost": -0.4,
-            "angry": -0.3, "mad": -0.3, "upset": -0.2,
-            "fail": -0.3, "failed": -0.3, "failure": -0.3,
-            "wrong": -0.2, "mistake": -0.2, "error": -0.2,
-            "dark": -0.2, "darkness": -0.3, "shadow": -0.2,
-            "cold": -0.1, "rain": -0.1, "storm": -0.2,
-        }
-
-        # Positive indicators with weights
-        positive_indicators = {
-            "happy": 0.4, "joy": 0.4, "joyful": 0.4, "cheerful": 0.4,
-            "fun": 0.3, "exciting": 0.4, "excited": 0.4,
-            "wonderful": 0.4, "amazing": 0.4, "awesome": 0.4,
-            "beautiful": 0.3, "pretty": 0.3, "lovely": 0.3,
-            "kind": 0.3, "friendly": 0.3, "helpful": 0.3,
-            "brave": 0.4, "courageous": 0.4, "strong": 0.3,
-            "clever": 0.3, "smart": 0.3, "wise": 0.3,
-            "discover": 0.3, "explore": 0.3, "adventure": 0.4,
-            "friend": 0.3, "together": 0.2, "help": 0.2,
-            "smile": 0.3, "laugh": 0.4, "giggle": 0.4,
-            "bright": 0.2, "sunshine": 0.3, "rainbow": 0.3,
-        }
-
+        lexicon = self._lexicon
+        banned_word = None
+        age_word = None
         score = 0.0
         word_count = 0
 
-        words = text_lower.split()
         for word in words:
-            clean_word = re.sub(r'[^\w\s]', '', word)
-            if clean_word in negative_indicators:
-                score += negative_indicators[clean_word]
-                word_count += 1
-            elif clean_word in positive_indicators:
-                score += positive_indicators[clean_word]
+            entry = lexicon.get(word)
+            if entry is None:
+                continue
+            if entry.banned and banned_word is None:
+                banned_word = word
+            if age_word is None and age_range in entry.age_ranges:
+                age_word = word
+            if entry.sentiment:
+                score += entry.sentiment
                 word_count += 1
 
-        # Normalize by word count if we found sentiment words
-        if word_count > 0:
-            return max(min(score / word_count, 1.0), -1.0)
+        # Normalize by word count if we found sentiment words, else neutral
+        sentiment_score = max(min(score / word_count, 1.0), -1.0) if word_count else 0.0
+        return WordScan(banned_word, age_word, sentiment_score)
 
-        # Default to neutral
-        return 0.0
+    def _analyze_sentiment(self, text: str) -> float:
+        """
+        Analyze sentiment of text (simple keyword-based approach).
+
+        Args:
+            text: Text to analyze
+
+        Returns:
+            Sentiment score between -1.0 (very negative) and 1.0 (very positive)
+        """
+        return self._scan_words(_WORD_RE.findall(text.lower())).sentiment_score
 
     async def _check_moderation_api(self, text: str) -> Tuple[bool, Optional[str]]:
         """
@@ -477,19 +791,20 @@ class EnhancedSafetyFilter:
             return True, None
 
         try:
-            response = await self.moderation_client.post(
-                "https://api.openai.com/v1/moderations",
-                json={"input": text}
-            )
-            response.raise_for_status()
-
-            result = response.json()
-            results = result.get("results", [])
-
-            if results:
-                flagged = results[0].get("flagged", False)
+            key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+            result = _MODERATION_CACHE.get(key)
+            if result is None:
+                result = await self._moderation_batcher.check(text)
+                _MODERATION_CACHE[key] = result
+                if len(_MODERATION_CACHE) > MODERATION_CACHE_SIZE:
+                    _MODERATION_CACHE.popitem(last=False)
+            else:
+                _MODERATION_CACHE.move_to_end(key)
+
+            if result:
+                flagged = result.get("flagged", False)
                 if flagged:
-                    categories = results[0].get("categories", {})
+                    categories = result.get("categories", {})
                     flagged_categories = [cat for cat, val in categories.items() if val]
                     reason = f"Flagged categories: {', '.join(flagged_categories)}"
                     return False, reason
@@ -511,23 +826,21 @@ class EnhancedSafetyFilter:
         Returns:
             Tuple of (scene_text, choices)
         """
-        # Generic fallback that works for any theme
-        # Convert theme ID to readable format (e.g., "space_adventure" -> "Space Adventure")
-        theme_readable = theme.replace("_", " ").title()
-
-        scene = (
-            f"You find yourself in a wonderful, magical place on your {theme_readable} adventure. "
-            "Everything around you is peaceful, colorful, inviting, and filled with amazing possibilities!"
-        )
+        scene, choices = _fallback_response(theme)
+        logger.info(f"Using positive fallback response for theme: {theme}")
+        return scene, list(choices)
 
-        choices = [
-            "Look around at the beautiful scenery",
-            "Take a happy deep breath and think",
-            "Choose a fun direction to explore"
-        ]
+    def _log_violation(self, violation: SafetyViolation) -> None:
+        """
+        Add a violation to the log and the summary counts.
 
-        logger.info(f"Using positive fallback response for theme: {theme}")
-        return scene, choices
+        Args:
+            violation: Violation to record
+        """
+        self.violations_log.append(violation)
+        self._violation_total += 1
+        self._violations_by_type[violation.violation_type.value] += 1
+        self._violations_by_severity[violation.severity] += 1
 
     def get_violation_summary(self) -> Dict:
         """
@@ -536,23 +849,16 @@ class EnhancedSafetyFilter:
         Returns:
             Dictionary with violation statistics
         """
-        if not self.violations_log:
+        if not self._violation_total:
             return {"total": 0, "by_type": {}, "by_severity": {}}
 
-        by_type = {}
-        by_severity = {}
-
-        for violation in self.violations_log:
-            vtype = violation.violation_type.value
-            by_type[vtype] = by_type.get(vtype, 0) + 1
-
-            severity = violation.severity
-            by_severity[severity] = by_severity.get(severity, 0) + 1
+        recent = list(islice(reversed(self.violations_log), 10))  # Last 10
+        recent.reverse()
 
         return {
-            "total": len(self.violations_log),
-            "by_type": by_type,
-            "by_severity": by_severity,
+            "total": self._violation_total,
+            "by_type": dict(self._violations_by_type),
+            "by_severity": dict(self._violations_by_severity),
             "recent": [
                 {
                     "type": v.violation_type.value,
@@ -560,11 +866,15 @@ class EnhancedSafetyFilter:
                     "reason": v.reason,
                     "timestamp": v.timestamp.isoformat()
                 }
-                for v in self.violations_log[-10:]  # Last 10
+                for v in recent
             ]
         }
 
     async def close(self):
-        """Close HTTP client if using moderation API."""
-        if self.use_moderation_api and hasattr(self, 'moderation_client'):
-            await self.moderation_client.aclose()
+        """
+        Release this filter's resources.
+
+        The moderation HTTP client belongs to the shared batcher, which other
+        filters may be using, so it is left open here and closed on
+        application shutdown by close_moderation_batchers().
+        """
@@ -5,15 +5,19 @@ Phase 3: Core Story Engine Backend
 
 import asyncio
 import logging
+import random
+import time
+from collections import deque
 from datetime import datetime
 from typing import List, Optional, Tuple
-from uuid import UUID, uuid4
+from uuid import UUID
 
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, bindparam, select, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.models import Session as SessionModel
-from app.db.models import StoryTurn
+from app.db.models import StoryTurn, uuid7
 from app.models.story import (
     Choice,
     LLMStoryResponse,
@@ -27,12 +31,106 @@ from app.services.safety_filter import SafetyFilter
 
 logger = logging.getLogger(__name__)
 
+# On PostgreSQL the session history is assembled by the database as a single
+# JSON document, avoiding ORM materialization of every turn row.
+_SESSION_HISTORY_SQL = text("""
+    SELECT jsonb_build_object(
+        'session_id', s.id::text,
+        'player_name', s.player_name,
+        'age_range', s.age_range,
+        'theme', s.theme,
+        'created_at', s.created_at,
+        'last_activity', s.last_activity,
+        'total_turns', s.turns,
+        'is_active', s.is_active,
+        'turns', COALESCE(
+            jsonb_agg(
+                jsonb_build_object(
+                    'turn_number', t.turn_number,
+                    'scene_text', t.scene_text,
+                    'scene_id', t.scene_id,
+                    'player_choice', t.player_choice,
+                    'custom_input', t.custom_input,
+                    'story_summary', t.story_summary,
+                    'created_at', t.created_at
+                )
+                ORDER BY t.turn_number
+            ) FILTER (WHERE t.id IS NOT NULL),
+            '[]'::jsonb
+        )
+    ) AS history
+    FROM sessions s
+    LEFT JOIN story_turns t ON t.session_id = s.id
+    WHERE s.id = :session_id
+    GROUP BY s.id
+""").bindparams(
+    bindparam("session_id", type_=SessionModel.__table__.c.id.type)
+).columns(history=JSONB)
+
+
+# Choice ids handed out in order; the LLM response has already been parsed
+# into LLMStoryResponse, so Scene and Choice are built without revalidation
+CHOICE_IDS = tuple(f"c{i}" for i in range(1, 11))
+
+# Full-jitter retry backoff: sleep a random time up to min(cap, base * 2**attempt)
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_CAP = 8.0
+
+# Recent successful LLM call latencies (seconds), shared by all engines. Once
+# enough samples exist, a call still running after the P95 latency gets a
+# hedged duplicate and whichever finishes first wins.
+HEDGE_MIN_SAMPLES = 20
+_llm_latencies: deque = deque(maxlen=256)
+
+
+def _hedge_delay() -> Optional[float]:
+    """Return the P95 of recent LLM latencies, or None if too few samples."""
+    if len(_llm_latencies) < HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(_llm_latencies)
+    return ordered[int(len(ordered) * 0.95) - 1]
+
 
 def compute_max_turns(session_id: UUID) -> int:
     """Deterministically pick a max turn count between 8 and 15 for a session."""
     return 8 + (session_id.int % 8)
 
 
+async def load_session_with_summary(
+    db_session: AsyncSession,
+    session_id: UUID,
+    for_update: bool = False
+) -> Tuple[Optional[SessionModel], Optional[str]]:
+    """
+    Load a session and the summary stored with its latest turn in one query.
+
+    Args:
+        db_session: Database session
+        session_id: Session UUID
+        for_update: Lock the session row until the transaction ends, so
+            concurrent continuations of one session run one at a time
+            (ignored by SQLite)
+
+    Returns:
+        Tuple of (session or None if not found, latest turn's story summary)
+    """
+    # turn_number isn't unique per session, so take the newest row if an
+    # earlier race stored the same turn twice
+    stmt = select(SessionModel, StoryTurn.story_summary).outerjoin(
+        StoryTurn,
+        and_(
+            StoryTurn.session_id == SessionModel.id,
+            StoryTurn.turn_number == SessionModel.turns
+        )
+    ).where(SessionModel.id == session_id).order_by(StoryTurn.created_at.desc()).limit(1)
+    if for_update:
+        stmt = stmt.with_for_update(of=SessionModel)
+    row = (await db_session.execute(stmt)).first()
+    if row is None:
+        return None, None
+    return row[0], row[1]
+
+
 class StoryEngine:
     """
     Core story engine that orchestrates LLM calls and story logic.
@@ -65,7 +163,7 @@ class StoryEngine:
         player_name: str,
         age_range: str,
         theme: str,
-        db_session: Session
+        db_session: AsyncSession
     ) -> StoryResponse:
         """
         Start a new story session.
@@ -84,19 +182,8 @@ class StoryEngine:
         """
         logger.info(f"Starting new story: player={player_name}, theme={theme}, age_range={age_range}")
 
-        # Create session in database
-        session_id = uuid4()
+        session_id = uuid7()
         max_turns = compute_max_turns(session_id)
-        db_session_model = SessionModel(
-            id=session_id,
-            player_name=player_name,
-            age_range=age_range,
-            theme=theme,
-            turns=0,
-            is_active=True
-        )
-        db_session.add(db_session_model)
-        db_session.flush()
 
         # Generate initial story
         prompt = self.prompts.get_story_start_prompt(player_name, age_range, theme)
@@ -109,20 +196,34 @@ class StoryEngine:
             theme=theme
         )
 
+        # One timestamp for the scene and every row written this turn
+        now = datetime.utcnow()
+
         # Create scene and choices
         scene_id = f"scene_{session_id}_0"
-        scene = Scene(
+        scene = Scene.model_construct(
             scene_id=scene_id,
             text=llm_response.scene_text,
-            timestamp=datetime.utcnow()
+            timestamp=now
         )
 
         choices = [
-            Choice(choice_id=f"c{i+1}", text=choice_text)
-            for i, choice_text in enumerate(llm_response.choices or [])
+            Choice.model_construct(choice_id=choice_id, text=choice_text)
+            for choice_id, choice_text in zip(CHOICE_IDS, llm_response.choices or [])
         ]
 
-        # Save first turn to database
+        # Save the session and its first turn in one transaction; nothing is
+        # written before the LLM call, so no write lock is held while it runs
+        db_session_model = SessionModel(
+            id=session_id,
+            player_name=player_name,
+            age_range=age_range,
+            theme=theme,
+            created_at=now,
+            last_activity=now,
+            turns=0,
+            is_active=True
+        )
         story_turn = StoryTurn(
             session_id=session_id,
             turn_number=0,
@@ -130,10 +231,11 @@ class StoryEngine:
             scene_id=scene_id,
             player_choice=None,  # First turn has no player choice
             custom_input=None,
-            story_summary=llm_response.story_summary_update
+            story_summary=llm_response.story_summary_update,
+            created_at=now
         )
-        db_session.add(story_turn)
-        db_session.commit()
+        db_session.add_all([db_session_model, story_turn])
+        await db_session.commit()
 
         # Create metadata
         metadata = StoryMetadata(
@@ -161,7 +263,7 @@ class StoryEngine:
         choice_text: Optional[str],
         custom_input: Optional[str],
         story_summary: str,
-        db_session: Session
+        db_session: AsyncSession
     ) -> StoryResponse:
         """
         Continue an existing story with a player's choice.
@@ -171,7 +273,7 @@ class StoryEngine:
             choice_id: Selected choice ID (if using suggested choice)
             choice_text: Text of the selected choice (if using suggested choice)
             custom_input: Custom player input (if not using suggested choice)
-            story_summary: Current story summary
+            story_summary: Current story summary (the stored summary is used if empty)
             db_session: Database session
 
         Returns:
@@ -184,31 +286,38 @@ class StoryEngine:
         logger.info(f"Continuing story: session_id={session_id}")
 
         # Load session from database
-        db_session_model = db_session.get(SessionModel, session_id)
-        if not db_session_model:
-            raise ValueError(f"Session not found: {session_id}")
-
-        if not db_session_model.is_active:
-            raise ValueError(f"Session is no longer active: {session_id}")
-
-        max_turns = compute_max_turns(session_id)
-
-        # Check turn limit
-        if db_session_model.turns >= max_turns:
-            raise ValueError(f"Session has reached maximum turns ({max_turns})")
+        # Screen custom input (possibly a moderation API call) while the
+        # session loads; both are needed before the prompt can be built
+        filter_task = asyncio.create_task(self.safety.filter_user_input(custom_input)) if custom_input else None
+        try:
+            db_session_model, stored_summary = await load_session_with_summary(db_session, session_id, for_update=True)
+            if not db_session_model:
+                raise ValueError(f"Session not found: {session_id}")
+
+            # Clients may omit the summary; continue from the stored one
+            if not story_summary:
+                story_summary = stored_summary or ""
+
+            if not db_session_model.is_active:
+                raise ValueError(f"Session is no longer active: {session_id}")
+
+            max_turns = compute_max_turns(session_id)
+
+            # Check turn limit
+            if db_session_model.turns >= max_turns:
+                raise ValueError(f"Session has reached maximum turns ({max_turns})")
+        except BaseException:
+            if filter_task:
+                filter_task.cancel()
+            raise
 
         # Determine player action
-        if custom_input:
+        if filter_task:
             # Validate custom input
-            filter_result = await self.safety.filter_user_input(custom_input)
-            # Handle both basic (2 values) and enhanced (3 values) safety filter
-            if len(filter_result) == 3:
-                is_safe, result, violation = filter_result
-            else:
-                is_safe, result = filter_result
-            if not is_safe:
-                raise ValueError(f"Input rejected: {result}")
-            player_action = result
+            filter_result = await filter_task
+            if not filter_result.is_safe:
+                raise ValueError(f"Input rejected: {filter_result.text}")
+            player_action = filter_result.text
         elif choice_id:
             # Use the actual choice text if provided, otherwise fall back to choice_id
             if choice_text:
@@ -244,24 +353,28 @@ class StoryEngine:
             turns_remaining=turns_remaining
         )
 
-        # Update turn count
+        # Read what the response needs before commit expires the row
+        theme = db_session_model.theme
+        age_range = db_session_model.age_range
         new_turn_number = db_session_model.turns + 1
-        db_session_model.turns = new_turn_number
-        db_session_model.last_activity = datetime.utcnow()
+        is_finished = new_turn_number >= max_turns
+
+        # One timestamp for the scene and every row written this turn
+        now = datetime.utcnow()
 
         # Create scene and choices
         scene_id = f"scene_{session_id}_{new_turn_number}"
-        scene = Scene(
+        scene = Scene.model_construct(
             scene_id=scene_id,
             text=llm_response.scene_text,
-            timestamp=datetime.utcnow()
+            timestamp=now
         )
 
         # Create choices only if not at max turns and LLM provided choices
         if new_turn_number < max_turns and llm_response.choices:
             choices = [
-                Choice(choice_id=f"c{i+1}", text=choice_text)
-                for i, choice_text in enumerate(llm_response.choices)
+                Choice.model_construct(choice_id=choice_id, text=choice_text)
+                for choice_id, choice_text in zip(CHOICE_IDS, llm_response.choices)
             ]
         else:
             choices = []
@@ -269,7 +382,11 @@ class StoryEngine:
         # Update story summary
         updated_summary = llm_response.story_summary_update
 
-        # Save turn to database
+        # Save the turn and the session update in one transaction
+        db_session_model.turns = new_turn_number
+        db_session_model.last_activity = now
+        if is_finished:
+            db_session_model.is_active = False
         story_turn = StoryTurn(
             session_id=session_id,
             turn_number=new_turn_number,
@@ -277,22 +394,17 @@ class StoryEngine:
             scene_id=scene_id,
             player_choice=choice_id,
             custom_input=custom_input,
-            story_summary=updated_summary
+            story_summary=updated_summary,
+            created_at=now
         )
         db_session.add(story_turn)
-        db_session.commit()
-        db_session.refresh(db_session_model)
-
-        is_finished = new_turn_number >= max_turns
-        if is_finished:
-            db_session_model.is_active = False
-            db_session.commit()
+        await db_session.commit()
 
         # Create metadata
         metadata = StoryMetadata(
             turns=new_turn_number,
-            theme=db_session_model.theme,
-            age_range=db_session_model.age_range,
+            theme=theme,
+            age_range=age_range,
             max_turns=max_turns,
             is_finished=is_finished
         )
@@ -310,7 +422,7 @@ class StoryEngine:
     async def get_session_history(
         self,
         session_id: UUID,
-        db_session: Session
+        db_session: AsyncSession
     ) -> dict:
         """
         Get full session history.
@@ -325,17 +437,34 @@ class StoryEngine:
         Raises:
             ValueError: If session not found
         """
+        if db_session.bind.dialect.name == "postgresql":
+            history = (
+                await db_session.execute(_SESSION_HISTORY_SQL, {"session_id": session_id})
+            ).scalar_one_or_none()
+            if history is None:
+                raise ValueError(f"Session not found: {session_id}")
+            return history
+
         # Load session
-        db_session_model = db_session.get(SessionModel, session_id)
+        db_session_model = await db_session.get(SessionModel, session_id)
         if not db_session_model:
             raise ValueError(f"Session not found: {session_id}")
 
-        # Load all turns
-        stmt = select(StoryTurn).where(
+        # Load all turns as plain column rows, skipping ORM instance hydration
+        stmt = select(
+            StoryTurn.turn_number,
+            StoryTurn.scene_text,
+            StoryTurn.scene_id,
+            StoryTurn.player_choice,
+            StoryTurn.custom_input,
+            StoryTurn.story_summary,
+            StoryTurn.created_at
+        ).where(
             StoryTurn.session_id == session_id
         ).order_by(StoryTurn.turn_number)
-        turns = db_session.execute(stmt).scalars().all()
+        rows = (await db_session.execute(stmt)).all()
 
+        isoformat = datetime.isoformat
         return {
             "session_id": str(session_id),
             "player_name": db_session_model.player_name,
@@ -347,22 +476,22 @@ class StoryEngine:
             "is_active": db_session_model.is_active,
             "turns": [
                 {
-                    "turn_number": turn.turn_number,
-                    "scene_text": turn.scene_text,
-                    "scene_id": turn.scene_id,
-                    "player_choice": turn.player_choice,
-                    "custom_input": turn.custom_input,
-                    "story_summary": turn.story_summary,
-                    "created_at": turn.created_at.isoformat()
+                    "turn_number": turn_number,
+                    "scene_text": scene_text,
+                    "scene_id": scene_id,
+                    "player_choice": player_choice,
+                    "custom_input": custom_input,
+                    "story_summary": summary,
+                    "created_at": isoformat(created_at)
                 }
-                for turn in turns
+                for turn_number, scene_text, scene_id, player_choice, custom_input, summary, created_at in rows
             ]
         }
 
     async def reset_session(
         self,
         session_id: UUID,
-        db_session: Session
+        db_session: AsyncSession
     ) -> None:
         """
         Reset/deactivate a session.
@@ -374,13 +503,13 @@ class StoryEngine:
         Raises:
             ValueError: If session not found
         """
-        db_session_model = db_session.get(SessionModel, session_id)
+        db_session_model = await db_session.get(SessionModel, session_id)
         if not db_session_model:
             raise ValueError(f"Session not found: {session_id}")
 
         db_session_model.is_active = False
         db_session_model.last_activity = datetime.utcnow()
-        db_session.commit()
+        await db_session.commit()
 
         logger.info(f"Session reset: session_id={session_id}")
 
@@ -411,25 +540,14 @@ class StoryEngine:
         for attempt in range(self.max_retries):
             try:
                 # Call LLM
-                llm_response = await self.llm.generate_story_continuation(
-                    prompt=prompt,
-                    system_message=system_message,
-                    max_tokens=500,
-                    temperature=0.8
-                )
+                llm_response = await self._generate_hedged(prompt, system_message)
 
                 # Validate output
                 validation_result = await self.safety.validate_llm_output(
                     scene_text=llm_response.scene_text,
                     choices=llm_response.choices
                 )
-                # Handle both basic (bool) and enhanced (tuple) safety filter
-                if isinstance(validation_result, tuple):
-                    is_valid, violation = validation_result
-                else:
-                    is_valid = validation_result
-
-                if is_valid:
+                if validation_result.is_valid:
                     return llm_response
                 else:
                     logger.warning(f"LLM output validation failed (attempt {attempt + 1}/{self.max_retries})")
@@ -442,9 +560,9 @@ class StoryEngine:
                 last_exception = e
                 logger.error(f"LLM call failed (attempt {attempt + 1}/{self.max_retries}): {e}")
 
-                # Exponential backoff
+                # Exponential backoff with full jitter
                 if attempt < self.max_retries - 1:
-                    wait_time = 2 ** attempt  # 1s, 2s, 4s
+                    wait_time = random.uniform(0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * 2 ** attempt))
                     await asyncio.sleep(wait_time)
 
         # All retries failed, use fallback
@@ -452,6 +570,56 @@ class StoryEngine:
         is_final_turn = turns_remaining is not None and turns_remaining <= 0
         return self._get_fallback_llm_response(theme, is_final_turn)
 
+    async def _generate_hedged(self, prompt: str, system_message: str) -> LLMStoryResponse:
+        """
+        Call the LLM, issuing a duplicate request if the first one is slow.
+
+        The duplicate is sent once the call has run longer than the recent
+        P95 latency; the first successful response wins and the other
+        request is cancelled.
+
+        Args:
+            prompt: The prompt to send
+            system_message: System message for the LLM
+
+        Returns:
+            LLMStoryResponse
+
+        Raises:
+            Exception: If every issued request fails
+        """
+        def call():
+            return asyncio.ensure_future(self.llm.generate_story_continuation(
+                prompt=prompt,
+                system_message=system_message,
+                max_tokens=500,
+                temperature=0.8
+            ))
+
+        start = time.monotonic()
+        pending = {call()}
+        try:
+            hedge_delay = _hedge_delay()
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done:
+                    logger.info(f"LLM call exceeded P95 latency ({hedge_delay:.2f}s), sending hedged request")
+                    pending.add(call())
+
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                failed = None
+                for task in done:
+                    if task.exception() is None:
+                        _llm_latencies.append(time.monotonic() - start)
+                        return task.result()
+                    failed = task.exception()
+                if not pending:
+                    raise failed
+        finally:
+            for task in pending:
+                task.cancel()
+
     def _get_fallback_llm_response(self, theme: str, is_final_turn: bool = False) -> LLMStoryResponse:
         """
         Get a safe fallback response when LLM fails.
@@ -30,24 +30,13 @@ async def init_database():
 
     try:
         # Create tables
-        if db.is_async:
-            print("Using async database engine...")
-            async with db.engine.begin() as conn:
-                # Drop all tables (for fresh start)
-                await conn.run_sync(Base.metadata.drop_all)
-                print("Dropped existing tables (if any)")
-
-                # Create all tables
-                await conn.run_sync(Base.metadata.create_all)
-                print("Created all tables")
-        else:
-            print("Using sync database engine...")
+        async with db.engine.begin() as conn:
             # Drop all tables (for fresh start)
-            Base.metadata.drop_all(bind=db.engine)
+            await conn.run_sync(Base.metadata.drop_all)
             print("Dropped existing tables (if any)")
 
             # Create all tables
-            Base.metadata.create_all(bind=db.engine)
+            await conn.run_sync(Base.metadata.create_all)
             print("Created all tables")
 
         print("\nDatabase tables:")
@@ -3,10 +3,9 @@
 from __future__ import annotations
 
 import pytest
-from sqlalchemy import create_engine
 from sqlalchemy.dialects.postgresql import UUID as PGUUID
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.compiler import compiles
-from sqlalchemy.orm import Session, sessionmaker
 
 from app.db.models import Base
 
@@ -19,17 +18,19 @@ def _compile_pg_uuid(element, compiler, **kw):
 
 
 @pytest.fixture
-def db_session() -> Session:
+async def db_session() -> AsyncSession:
     """Provide an isolated in-memory SQLite session for tests."""
 
-    engine = create_engine("sqlite:///:memory:", future=True)
-    Base.metadata.create_all(engine)
-    SessionLocal = sessionmaker(bind=engine)
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
     session = SessionLocal()
 
     try:
         yield session
     finally:
-        session.close()
-        Base.metadata.drop_all(engine)
-        engine.dispose()
+        await session.close()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
@@ -63,8 +63,9 @@ class StubStoryEngine:
         )
 
 
-@pytest.fixture
-def api_client():
+@pytest.fixture(scope="module")
+def _app_client():
+    """Run the app lifespan once for the whole module."""
     prev_config = get_config()
     test_config = AppConfig(
         database=DatabaseConfig(url="sqlite:///:memory:"),
@@ -84,12 +85,12 @@ def api_client():
     def override_engine():
         return stub_engine
 
-    def override_db_session():
+    async def override_db_session():
         class DummySession:
-            def commit(self):  # pragma: no cover - no-op
+            async def commit(self):  # pragma: no cover - no-op
                 pass
 
-            def rollback(self):  # pragma: no cover - no-op
+            async def rollback(self):  # pragma: no cover - no-op
                 pass
 
         yield DummySession()
@@ -104,6 +105,15 @@ def api_client():
     set_config(prev_config)
 
 
+@pytest.fixture
+def api_client(_app_client):
+    """Share the module's client, with the stub's recorded calls reset per test."""
+    _, stub_engine = _app_client
+    stub_engine.start_calls.clear()
+    stub_engine.continue_calls.clear()
+    return _app_client
+
+
 def test_start_story_endpoint(api_client):
     client, stub_engine = api_client
 
@@ -149,11 +159,48 @@ def test_continue_story_endpoint(api_client):
 
 
 def test_continue_story_validation_error(api_client):
-    client, stub_engine = api_client
+    client, _ = api_client
 
     response = client.post(
         "/api/v1/story/continue",
-        json={"session_id": str(stub_engine.session_id)},
+        json={"session_id": "not-a-uuid", "choice_id": "c1"},
     )
 
     assert response.status_code == 422
+
+
+def test_oversized_body_rejected(api_client):
+    client, stub_engine = api_client
+    limit = get_config().safety.max_request_bytes
+
+    response = client.post(
+        "/api/v1/story/continue",
+        json={
+            "session_id": str(stub_engine.session_id),
+            "choice_id": "c1",
+            "story_summary": "x" * limit,
+        },
+    )
+
+    assert response.status_code == 413
+    assert not stub_engine.continue_calls
+
+
+def test_oversized_chunked_body_rejected(api_client):
+    client, stub_engine = api_client
+    limit = get_config().safety.max_request_bytes
+
+    def chunks():
+        yield b'{"session_id": "' + str(stub_engine.session_id).encode() + b'", "story_summary": "'
+        for _ in range(limit // 1024 + 1):
+            yield b"x" * 1024
+        yield b'"}'
+
+    response = client.post(
+        "/api/v1/story/continue",
+        content=chunks(),
+        headers={"Content-Type": "application/json"},
+    )
+
+    assert response.status_code == 413
+    assert not stub_engine.continue_calls
@@ -89,10 +89,10 @@ async def test_ollama_provider_generates_and_parses(monkeypatch):
         async def post(
             self,
             url: str,
-            json: Optional[Dict[str, Any]] = None,
-            params=None,
+            content: bytes = b"",
+            headers: Optional[Dict[str, str]] = None,
         ):
-            sent_requests.append({"url": url, "json": json})
+            sent_requests.append({"url": url, "json": json_module.loads(content), "headers": headers})
             request = httpx.Request("POST", url)
             return httpx.Response(
                 200,
@@ -125,3 +125,57 @@ async def test_ollama_provider_generates_and_parses(monkeypatch):
     assert request["json"]["stream"] is False
     assert request["json"]["options"]["num_predict"] == 200
     assert request["json"]["system"] == "You are a calm narrator"
+    assert request["headers"]["Content-Type"] == "application/json"
+
+
+@pytest.mark.asyncio
+async def test_ollama_provider_streams_chunks(monkeypatch):
+    """Ensure the Ollama provider yields text from its NDJSON stream."""
+
+    lines = [
+        json_module.dumps({"response": '{"scene_text": ', "done": False}),
+        "",
+        json_module.dumps({"response": '"Hi"}', "done": False}),
+        json_module.dumps({"response": "", "done": True}),
+    ]
+    sent_requests: list[Dict[str, Any]] = []
+
+    class FakeStreamResponse:
+        def raise_for_status(self):
+            return None
+
+        async def aiter_lines(self):
+            for line in lines:
+                yield line
+
+    class FakeStream:
+        async def __aenter__(self):
+            return FakeStreamResponse()
+
+        async def __aexit__(self, *exc):
+            return False
+
+    class FakeAsyncClient:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def stream(
+            self,
+            method: str,
+            url: str,
+            content: bytes = b"",
+            headers: Optional[Dict[str, str]] = None,
+        ):
+            sent_requests.append({"url": url, "json": json_module.loads(content)})
+            return FakeStream()
+
+    monkeypatch.setattr(httpx, "AsyncClient", FakeAsyncClient)
+
+    provider = OllamaProvider(model="llama3.2:3b", base_url="http://localhost:11434")
+    chunks = [
+        chunk async for chunk in provider.generate_story_continuation_stream(prompt="Tell a story")
+    ]
+
+    assert "".join(chunks) == '{"scene_text": "Hi"}'
+    assert sent_requests[0]["url"].endswith("/api/generate")
+    assert sent_requests[0]["json"]["stream"] is True
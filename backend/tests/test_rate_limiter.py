@@ -3,12 +3,32 @@ Tests for the rate limiter functionality.
 Phase 6: Enhanced Safety - Testing rate limiting and abuse prevention
 """
 
+import asyncio
 import time
-from unittest.mock import Mock
+from typing import NamedTuple, Optional
 
 import pytest
+from starlette.datastructures import State
 
-from app.services.rate_limiter import RateLimiter, RateLimitExceeded, reset_rate_limiter
+from app.services.rate_limiter import (
+    RateLimiter,
+    RateLimitExceeded,
+    WindowCounter,
+    get_rate_limiter,
+    reset_rate_limiter,
+)
+
+
+class FakeClient(NamedTuple):
+    """Stand-in for request.client."""
+    host: str
+
+
+class FakeRequest(NamedTuple):
+    """The parts of a FastAPI request that get_client_ip reads."""
+    headers: dict
+    client: Optional[FakeClient]
+    state: State
 
 
 @pytest.fixture
@@ -18,131 +38,204 @@ def rate_limiter():
     return RateLimiter()
 
 
-def test_session_rate_limit_allows_within_limit(rate_limiter):
+async def test_session_rate_limit_allows_within_limit(rate_limiter):
     """Test that requests within rate limit are allowed."""
     session_id = "test-session-123"
 
     # Should allow first 20 requests within an hour
     for i in range(20):
-        is_allowed, retry_after = rate_limiter.check_session_rate_limit(session_id)
+        is_allowed, retry_after = await rate_limiter.check_session_rate_limit(session_id)
         assert is_allowed is True
         assert retry_after is None
 
 
-def test_session_rate_limit_blocks_exceeding_hourly_limit(rate_limiter):
+async def test_session_rate_limit_blocks_exceeding_hourly_limit(rate_limiter):
     """Test that exceeding hourly limit blocks requests."""
     session_id = "test-session-456"
 
     # Consume the hourly limit (20 requests)
     for i in range(20):
-        is_allowed, retry_after = rate_limiter.check_session_rate_limit(session_id)
+        is_allowed, retry_after = await rate_limiter.check_session_rate_limit(session_id)
         assert is_allowed is True
 
     # 21st request should be blocked
-    is_allowed, retry_after = rate_limiter.check_session_rate_limit(session_id)
+    is_allowed, retry_after = await rate_limiter.check_session_rate_limit(session_id)
     assert is_allowed is False
     assert retry_after is not None
     assert retry_after > 0
 
 
-def test_session_rate_limit_cleanup_old_entries(rate_limiter):
+async def test_concurrent_checks_do_not_exceed_limit(rate_limiter):
+    """Test that simultaneous requests can't all slip under the limit."""
+    session_id = "test-session-concurrent"
+
+    results = await asyncio.gather(*[
+        rate_limiter.check_session_rate_limit(session_id) for _ in range(30)
+    ])
+
+    allowed = [is_allowed for is_allowed, _ in results if is_allowed]
+    assert len(allowed) == 20
+
+
+async def test_check_all_rejection_consumes_nothing(rate_limiter):
+    """Test that a request rejected by one limit doesn't use up the others."""
+    session_id = "test-session-check-all"
+    ip = "192.168.1.50"
+
+    # Exhaust the custom input limit (5 per 10 minutes)
+    for _ in range(5):
+        is_allowed, _ = await rate_limiter.check_all(session_id, ip, "continue", custom_input=True)
+        assert is_allowed is True
+
+    is_allowed, retry_after = await rate_limiter.check_all(session_id, ip, "continue", custom_input=True)
+    assert is_allowed is False
+    assert retry_after > 0
+
+    # Only the 5 allowed requests were recorded against the session and IP
+    windows = rate_limiter.session_requests[(session_id, "continue")]
+    assert windows["session_turns_per_hour"].cur == 5
+    windows = rate_limiter.ip_requests[(ip, "continue")]
+    assert windows["ip_per_hour"].cur == 5
+
+    # Plain choices are still allowed
+    is_allowed, _ = await rate_limiter.check_all(session_id, ip, "continue")
+    assert is_allowed is True
+
+
+async def test_session_rate_limit_cleanup_old_entries(rate_limiter):
     """Test that old entries are cleaned up and limit resets."""
     session_id = "test-session-789"
 
-    # Manually add old entries (older than 1 hour)
-    old_time = time.time() - 3700  # 1 hour and 100 seconds ago
-    rate_limiter.session_requests[session_id]["continue"] = [(old_time, 1) for _ in range(20)]
+    # Manually fill a window that started more than 1 hour ago
+    old_time = time.monotonic_ns() - 3700 * 1_000_000_000  # 1 hour and 100 seconds ago
+    rate_limiter.session_requests[(session_id, "continue")] = {
+        "session_turns_per_hour": WindowCounter(old_time, cur=20)
+    }
 
     # New request should be allowed since old entries should be cleaned up
-    is_allowed, retry_after = rate_limiter.check_session_rate_limit(session_id)
+    is_allowed, retry_after = await rate_limiter.check_session_rate_limit(session_id)
     assert is_allowed is True
     assert retry_after is None
 
 
-def test_custom_input_rate_limit_allows_within_limit(rate_limiter):
+async def test_sweep_removes_idle_keys(rate_limiter):
+    """Test that the sweeper drops keys with no activity in their windows."""
+    await rate_limiter.check_session_rate_limit("idle-session")
+    await rate_limiter.check_custom_input_rate_limit("idle-session")
+    await rate_limiter.check_session_rate_limit("active-session")
+
+    # Two days later, only the refreshed session should survive
+    later = time.monotonic_ns() + (2 * 86400 + 1) * 1_000_000_000
+    rate_limiter.session_requests[("active-session", "continue")]["session_turns_per_hour"].cur_window_start = later
+    rate_limiter.session_requests[("active-session", "continue")]["session_turns_per_day"].cur_window_start = later
+
+    removed = rate_limiter.sweep(now=later)
+
+    assert removed == 2
+    assert ("idle-session", "continue") not in rate_limiter.session_requests
+    assert "idle-session" not in rate_limiter.custom_input_requests
+    assert ("active-session", "continue") in rate_limiter.session_requests
+
+
+async def test_reset_clears_global_limiter_in_place(rate_limiter):
+    """Test that reset keeps the in-memory singleton but drops its counts."""
+    limiter = get_rate_limiter()
+    await limiter.check_session_rate_limit("reset-session")
+    await limiter.check_custom_input_rate_limit("reset-session")
+
+    reset_rate_limiter()
+
+    assert get_rate_limiter() is limiter
+    assert limiter.get_stats()["active_sessions"] == 0
+    assert limiter.get_stats()["custom_input_tracked"] == 0
+
+
+async def test_custom_input_rate_limit_allows_within_limit(rate_limiter):
     """Test that custom inputs within limit are allowed."""
     session_id = "test-session-custom-1"
 
     # Should allow first 5 custom inputs within 10 minutes
     for i in range(5):
-        is_allowed, retry_after = rate_limiter.check_custom_input_rate_limit(session_id)
+        is_allowed, retry_after = await rate_limiter.check_custom_input_rate_limit(session_id)
         assert is_allowed is True
         assert retry_after is None
 
 
-def test_custom_input_rate_limit_blocks_exceeding_limit(rate_limiter):
+async def test_custom_input_rate_limit_blocks_exceeding_limit(rate_limiter):
     """Test that exceeding custom input limit blocks requests."""
     session_id = "test-session-custom-2"
 
     # Consume the limit (5 requests)
     for i in range(5):
-        is_allowed, retry_after = rate_limiter.check_custom_input_rate_limit(session_id)
+        is_allowed, retry_after = await rate_limiter.check_custom_input_rate_limit(session_id)
         assert is_allowed is True
 
     # 6th request should be blocked
-    is_allowed, retry_after = rate_limiter.check_custom_input_rate_limit(session_id)
+    is_allowed, retry_after = await rate_limiter.check_custom_input_rate_limit(session_id)
     assert is_allowed is False
     assert retry_after is not None
     assert retry_after > 0
 
 
-def test_ip_rate_limit_allows_within_limit(rate_limiter):
+async def test_ip_rate_limit_allows_within_limit(rate_limiter):
     """Test that IP requests within limit are allowed."""
     ip_address = "192.168.1.1"
 
     # Should allow first 50 requests within an hour
     for i in range(50):
-        is_allowed, retry_after = rate_limiter.check_ip_rate_limit(ip_address)
+        is_allowed, retry_after = await rate_limiter.check_ip_rate_limit(ip_address)
         assert is_allowed is True
         assert retry_after is None
 
 
-def test_ip_rate_limit_blocks_exceeding_hourly_limit(rate_limiter):
+async def test_ip_rate_limit_blocks_exceeding_hourly_limit(rate_limiter):
     """Test that exceeding IP hourly limit blocks requests."""
     ip_address = "192.168.1.2"
 
     # Consume the hourly limit (50 requests)
     for i in range(50):
-        is_allowed, retry_after = rate_limiter.check_ip_rate_limit(ip_address)
+        is_allowed, retry_after = await rate_limiter.check_ip_rate_limit(ip_address)
         assert is_allowed is True
 
     # 51st request should be blocked
-    is_allowed, retry_after = rate_limiter.check_ip_rate_limit(ip_address)
+    is_allowed, retry_after = await rate_limiter.check_ip_rate_limit(ip_address)
     assert is_allowed is False
     assert retry_after is not None
 
 
-def test_start_story_rate_limit_allows_within_limit(rate_limiter):
+async def test_start_story_rate_limit_allows_within_limit(rate_limiter):
     """Test that story starts within limit are allowed."""
     ip_address = "192.168.1.3"
 
     # Should allow first 10 story starts within an hour
     for i in range(10):
-        is_allowed, retry_after = rate_limiter.check_start_story_rate_limit(ip_address)
+        is_allowed, retry_after = await rate_limiter.check_start_story_rate_limit(ip_address)
         assert is_allowed is True
         assert retry_after is None
 
 
-def test_start_story_rate_limit_blocks_exceeding_limit(rate_limiter):
+async def test_start_story_rate_limit_blocks_exceeding_limit(rate_limiter):
     """Test that exceeding story start limit blocks requests."""
     ip_address = "192.168.1.4"
 
     # Consume the limit (10 requests)
     for i in range(10):
-        is_allowed, retry_after = rate_limiter.check_start_story_rate_limit(ip_address)
+        is_allowed, retry_after = await rate_limiter.check_start_story_rate_limit(ip_address)
         assert is_allowed is True
 
     # 11th request should be blocked
-    is_allowed, retry_after = rate_limiter.check_start_story_rate_limit(ip_address)
+    is_allowed, retry_after = await rate_limiter.check_start_story_rate_limit(ip_address)
     assert is_allowed is False
     assert retry_after is not None
 
 
 def test_get_client_ip_from_forwarded_header(rate_limiter):
     """Test extracting IP from X-Forwarded-For header."""
-    request = Mock()
-    request.headers = {"X-Forwarded-For": "203.0.113.1, 198.51.100.1"}
-    request.client = Mock(host="10.0.0.1")
+    request = FakeRequest(
+        headers={"X-Forwarded-For": "203.0.113.1, 198.51.100.1"},
+        client=FakeClient("10.0.0.1"),
+        state=State(),
+    )
 
     ip = rate_limiter.get_client_ip(request)
     assert ip == "203.0.113.1"
@@ -150,9 +243,11 @@ def test_get_client_ip_from_forwarded_header(rate_limiter):
 
 def test_get_client_ip_from_real_ip_header(rate_limiter):
     """Test extracting IP from X-Real-IP header."""
-    request = Mock()
-    request.headers = {"X-Real-IP": "203.0.113.2"}
-    request.client = Mock(host="10.0.0.1")
+    request = FakeRequest(
+        headers={"X-Real-IP": "203.0.113.2"},
+        client=FakeClient("10.0.0.1"),
+        state=State(),
+    )
 
     ip = rate_limiter.get_client_ip(request)
     assert ip == "203.0.113.2"
@@ -160,9 +255,11 @@ def test_get_client_ip_from_real_ip_header(rate_limiter):
 
 def test_get_client_ip_fallback_to_client(rate_limiter):
     """Test falling back to request.client.host."""
-    request = Mock()
-    request.headers = {}
-    request.client = Mock(host="203.0.113.3")
+    request = FakeRequest(
+        headers={},
+        client=FakeClient("203.0.113.3"),
+        state=State(),
+    )
 
     ip = rate_limiter.get_client_ip(request)
     assert ip == "203.0.113.3"
@@ -170,21 +267,38 @@ def test_get_client_ip_fallback_to_client(rate_limiter):
 
 def test_get_client_ip_unknown_fallback(rate_limiter):
     """Test fallback when no client information is available."""
-    request = Mock()
-    request.headers = {}
-    request.client = None
+    request = FakeRequest(
+        headers={},
+        client=None,
+        state=State(),
+    )
 
     ip = rate_limiter.get_client_ip(request)
     assert ip == "unknown"
 
 
-def test_get_stats(rate_limiter):
+def test_get_client_ip_cached_per_request(rate_limiter):
+    """Test that the client IP is parsed once per request."""
+    request = FakeRequest(
+        headers={"X-Forwarded-For": "203.0.113.4, 198.51.100.1"},
+        client=FakeClient("10.0.0.1"),
+        state=State(),
+    )
+
+    assert rate_limiter.get_client_ip(request) == "203.0.113.4"
+
+    # Same request state, headers gone: the cached value is still returned
+    request = request._replace(headers={})
+    assert rate_limiter.get_client_ip(request) == "203.0.113.4"
+
+
+async def test_get_stats(rate_limiter):
     """Test getting rate limiter statistics."""
     # Add some activity
-    rate_limiter.check_session_rate_limit("session-1")
-    rate_limiter.check_session_rate_limit("session-2")
-    rate_limiter.check_ip_rate_limit("192.168.1.1")
-    rate_limiter.check_custom_input_rate_limit("session-1")
+    await rate_limiter.check_session_rate_limit("session-1")
+    await rate_limiter.check_session_rate_limit("session-2")
+    await rate_limiter.check_ip_rate_limit("192.168.1.1")
+    await rate_limiter.check_custom_input_rate_limit("session-1")
 
     stats = rate_limiter.get_stats()
 
@@ -205,68 +319,68 @@ def test_rate_limit_exception_has_retry_after():
     assert exc_info.value.headers["Retry-After"] == "60"
 
 
-def test_different_sessions_have_independent_limits(rate_limiter):
+async def test_different_sessions_have_independent_limits(rate_limiter):
     """Test that different sessions have independent rate limits."""
     session_1 = "session-a"
     session_2 = "session-b"
 
     # Consume limit for session 1
     for i in range(20):
-        is_allowed, _ = rate_limiter.check_session_rate_limit(session_1)
+        is_allowed, _ = await rate_limiter.check_session_rate_limit(session_1)
         assert is_allowed is True
 
     # Session 1 should be blocked
-    is_allowed, _ = rate_limiter.check_session_rate_limit(session_1)
+    is_allowed, _ = await rate_limiter.check_session_rate_limit(session_1)
     assert is_allowed is False
 
     # Session 2 should still be allowed
-    is_allowed, _ = rate_limiter.check_session_rate_limit(session_2)
+    is_allowed, _ = await rate_limiter.check_session_rate_limit(session_2)
     assert is_allowed is True
 
 
-def test_different_ips_have_independent_limits(rate_limiter):
+async def test_different_ips_have_independent_limits(rate_limiter):
     """Test that different IPs have independent rate limits."""
     ip_1 = "192.168.1.10"
     ip_2 = "192.168.1.20"
 
     # Consume limit for IP 1
     for i in range(50):
-        is_allowed, _ = rate_limiter.check_ip_rate_limit(ip_1)
+        is_allowed, _ = await rate_limiter.check_ip_rate_limit(ip_1)
         assert is_allowed is True
 
     # IP 1 should be blocked
-    is_allowed, _ = rate_limiter.check_ip_rate_limit(ip_1)
+    is_allowed, _ = await rate_limiter.check_ip_rate_limit(ip_1)
     assert is_allowed is False
 
     # IP 2 should still be allowed
-    is_allowed, _ = rate_limiter.check_ip_rate_limit(ip_2)
+    is_allowed, _ = await rate_limiter.check_ip_rate_limit(ip_2)
     assert is_allowed is True
 
 
-def test_multiple_sessions_tracked_independently(rate_limiter):
+async def test_multiple_sessions_tracked_independently(rate_limiter):
     """Test that multiple sessions are tracked independently in stats."""
-    rate_limiter.check_session_rate_limit("session-alpha")
-    rate_limiter.check_session_rate_limit("session-beta")
-    rate_limiter.check_session_rate_limit("session-gamma")
+    await rate_limiter.check_session_rate_limit("session-alpha")
+    await rate_limiter.check_session_rate_limit("session-beta")
+    await rate_limiter.check_session_rate_limit("session-gamma")
 
     stats = rate_limiter.get_stats()
     assert stats["active_sessions"] == 3
 
 
-def test_custom_input_limit_is_per_session(rate_limiter):
+async def test_custom_input_limit_is_per_session(rate_limiter):
     """Test that custom input limits are tracked per session."""
     session_1 = "custom-session-1"
     session_2 = "custom-session-2"
 
     # Use up custom input limit for session 1
     for i in range(5):
-        is_allowed, _ = rate_limiter.check_custom_input_rate_limit(session_1)
+        is_allowed, _ = await rate_limiter.check_custom_input_rate_limit(session_1)
         assert is_allowed is True
 
     # Session 1 should be blocked
-    is_allowed, _ = rate_limiter.check_custom_input_rate_limit(session_1)
+    is_allowed, _ = await rate_limiter.check_custom_input_rate_limit(session_1)
     assert is_allowed is False
 
     # Session 2 should still work
-    is_allowed, _ = rate_limiter.check_custom_input_rate_limit(session_2)
+    is_allowed, _ = await rate_limiter.check_custom_input_rate_limit(session_2)
     assert is_allowed is True
@@ -5,52 +5,87 @@ import pytest
 from app.services.safety_filter import SafetyFilter
 
 
-@pytest.mark.asyncio
-async def test_filter_user_input_blocks_banned_words():
-    safety = SafetyFilter()
+@pytest.fixture(scope="module")
+def safety():
+    """Share one filter across this module; SafetyFilter keeps no per-call state."""
+    return SafetyFilter()
+
 
-    is_safe, reason = await safety.filter_user_input("I want to fight the dragon")
+@pytest.mark.asyncio
+async def test_filter_user_input_blocks_banned_words(safety):
+    is_safe, reason, _ = await safety.filter_user_input("I want to fight the dragon")
 
     assert is_safe is False
     assert "inappropriate" in reason
 
 
 @pytest.mark.asyncio
-async def test_filter_user_input_rejects_urls():
-    safety = SafetyFilter()
-
-    is_safe, reason = await safety.filter_user_input("Check out https://example.com")
+async def test_filter_user_input_rejects_urls(safety):
+    is_safe, reason, _ = await safety.filter_user_input("Check out https://example.com")
 
     assert is_safe is False
     assert "URLs" in reason
 
 
 @pytest.mark.asyncio
-async def test_filter_user_input_length_limit():
-    safety = SafetyFilter()
+async def test_filter_user_input_length_limit(safety):
     long_text = "a" * (safety.max_input_length + 1)
 
-    is_safe, reason = await safety.filter_user_input(long_text)
+    is_safe, reason, _ = await safety.filter_user_input(long_text)
 
     assert is_safe is False
     assert "Input too long" in reason
 
 
 @pytest.mark.asyncio
-async def test_validate_llm_output_blocks_banned_words():
-    safety = SafetyFilter()
-
-    is_valid = await safety.validate_llm_output(
+async def test_validate_llm_output_blocks_banned_words(safety):
+    result = await safety.validate_llm_output(
         scene_text="The hero plans a fight",
         choices=["Fight", "Hide", "Talk"],
     )
 
-    assert is_valid is False
+    assert result.is_valid is False
+    assert result.violation is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "scene_text",
+    [
+        "The monsters attacked the village",
+        "He killed the dragon",
+        "There were ghosts everywhere",
+        "They were fighting with weapons",
+    ],
+)
+async def test_validate_llm_output_blocks_inflected_banned_words(safety, scene_text):
+    result = await safety.validate_llm_output(scene_text=scene_text, choices=None)
+
+    assert result.is_valid is False
+
+
+@pytest.mark.asyncio
+async def test_validate_llm_output_blocks_inflected_banned_words_in_choices(safety):
+    result = await safety.validate_llm_output(
+        scene_text="The path splits in two",
+        choices=["Go left", "Go right", "Keep attacking"],
+    )
+
+    assert result.is_valid is False
+
+
+@pytest.mark.asyncio
+async def test_validate_llm_output_allows_banned_word_inside_other_word(safety):
+    result = await safety.validate_llm_output(
+        scene_text="She showed great skill building the raft",
+        choices=["Sail away", "Explore the island", "Build a hut"],
+    )
+
+    assert result.is_valid is True
 
 
-def test_get_fallback_response_is_theme_specific():
-    safety = SafetyFilter()
 
+def test_get_fallback_response_is_theme_specific(safety):
     scene, choices = safety.get_fallback_response("magical_forest")
 
     assert "butterflies" in scene
@@ -3,19 +3,35 @@ Tests for the enhanced safety filter.
 Phase 6: Enhanced Safety, Guardrails & Kid-Friendly Constraints
 """
 
-import pytest
+import asyncio
+import json as json_module
 from unittest.mock import AsyncMock, Mock, patch
 
+import pytest
+
 from app.services.safety_filter_enhanced import (
+    _MODERATION_CACHE,
     EnhancedSafetyFilter,
     SafetyViolation,
     ViolationType,
+    close_moderation_batchers,
 )
 
 
-@pytest.fixture
+@pytest.fixture(autouse=True)
+def clear_moderation_cache():
+    """Make every test hit the (mocked) moderation API afresh."""
+    _MODERATION_CACHE.clear()
+
+
+@pytest.fixture(scope="module")
 def safety_filter():
-    """Create an enhanced safety filter instance."""
+    """
+    Share one enhanced safety filter across this module.
+
+    With log_violations=False and no moderation API it keeps no per-test
+    state; tests that need either build their own filter.
+    """
     return EnhancedSafetyFilter(use_moderation_api=False, log_violations=False)
 
 
@@ -44,6 +60,16 @@ async def test_filter_user_input_blocks_banned_words(safety_filter):
     assert violation.violation_type == ViolationType.BANNED_WORD
 
 
+@pytest.mark.asyncio
+async def test_filter_user_input_blocks_banned_words_next_to_punctuation(safety_filter):
+    """Test that punctuation and apostrophes can't hide a banned word."""
+    for text in ["Let's fight!", "The monster's cave", "kill-proof armor"]:
+        is_safe, reason, violation = await safety_filter.filter_user_input(text, age_range="6-8")
+
+        assert is_safe is False
+        assert violation.violation_type == ViolationType.BANNED_WORD
+
+
 @pytest.mark.asyncio
 async def test_filter_user_input_blocks_urls(safety_filter):
     """Test that URLs are blocked."""
@@ -113,6 +139,18 @@ async def test_filter_user_input_blocks_age_inappropriate_words_6_8(safety_filte
     assert violation.violation_type == ViolationType.AGE_INAPPROPRIATE
 
 
+@pytest.mark.asyncio
+async def test_filter_user_input_reports_banned_word_before_age_word(safety_filter):
+    """Test that a banned word wins over an earlier age-inappropriate word."""
+    is_safe, reason, violation = await safety_filter.filter_user_input(
+        "a betrayal and a fight", age_range="6-8"
+    )
+
+    assert is_safe is False
+    assert violation.violation_type == ViolationType.BANNED_WORD
+    assert violation.details["word"] == "fight"
+
+
 @pytest.mark.asyncio
 async def test_filter_user_input_allows_age_appropriate_for_9_12(safety_filter):
     """Test that words blocked for 6-8 might be OK for 9-12."""
@@ -163,6 +201,25 @@ async def test_validate_llm_output_blocks_banned_words_in_choices(safety_filter)
     assert violation.violation_type == ViolationType.BANNED_WORD
 
 
+@pytest.mark.asyncio
+async def test_validate_llm_output_matches_whole_words(safety_filter):
+    """Test that banned words match whole words, including next to punctuation."""
+    is_valid, violation = await safety_filter.validate_llm_output(
+        scene_text="You practice your skill at the warm, sunny meadow",
+        choices=["Keep practicing", "Rest", "Explore"],
+        age_range="6-8"
+    )
+    assert is_valid is True
+
+    is_valid, violation = await safety_filter.validate_llm_output(
+        scene_text="Behind the tree hides a monster.",
+        choices=["Wave hello", "Rest", "Explore"],
+        age_range="6-8"
+    )
+    assert is_valid is False
+    assert violation.details["word"] == "monster"
+
+
 @pytest.mark.asyncio
 async def test_validate_llm_output_blocks_negative_sentiment(safety_filter):
     """Test that overly negative sentiment is blocked."""
@@ -290,6 +347,41 @@ async def test_get_violation_summary_with_violations():
     assert len(summary["recent"]) == 3
 
 
+@pytest.mark.asyncio
+async def test_validate_llm_output_reuses_cached_verdict():
+    """Test that repeated LLM output is judged once but logged every time."""
+    safety_filter = EnhancedSafetyFilter(use_moderation_api=False, log_violations=True)
+    scene_text = "A cached scene where a monster appears"
+    choices = ["Wave", "Rest", "Explore"]
+
+    with patch.object(safety_filter, "_check_output_words", wraps=safety_filter._check_output_words) as check:
+        first = await safety_filter.validate_llm_output(scene_text, choices, age_range="6-8")
+        second = await safety_filter.validate_llm_output(scene_text, choices, age_range="6-8")
+
+    assert check.call_count == 1
+    assert first[0] is False and second[0] is False
+    assert second[1].details["word"] == "monster"
+    assert len(safety_filter.violations_log) == 2
+
+
+@pytest.mark.asyncio
+async def test_violations_log_is_bounded(monkeypatch):
+    """Test that only recent violations are kept while counts cover all of them."""
+    monkeypatch.setattr("app.services.safety_filter_enhanced.VIOLATIONS_LOG_SIZE", 2)
+    safety_filter = EnhancedSafetyFilter(use_moderation_api=False, log_violations=True)
+
+    await safety_filter.filter_user_input("I want to fight", age_range="6-8")
+    await safety_filter.filter_user_input("Visit https://example.com", age_range="6-8")
+    await safety_filter.filter_user_input("I hate this", age_range="6-8")
+
+    summary = safety_filter.get_violation_summary()
+
+    assert len(safety_filter.violations_log) == 2
+    assert summary["total"] == 3
+    assert summary["by_type"]["banned_word"] == 2
+    assert len(summary["recent"]) == 2
+
+
 @pytest.mark.asyncio
 async def test_moderation_api_integration_flagged_content():
     """Test OpenAI Moderation API integration with flagged content."""
@@ -301,7 +393,7 @@ async def test_moderation_api_integration_flagged_content():
 
     # Mock the HTTP client
     mock_response = Mock()
-    mock_response.json.return_value = {
+    mock_response.content = json_module.dumps({
         "results": [{
             "flagged": True,
             "categories": {
@@ -309,7 +401,7 @@ async def test_moderation_api_integration_flagged_content():
                 "hate": False,
             }
         }]
-    }
+    }).encode()
     mock_response.raise_for_status = Mock()
 
     with patch.object(safety_filter.moderation_client, 'post', new_callable=AsyncMock) as mock_post:
@@ -334,12 +426,12 @@ async def test_moderation_api_integration_safe_content():
 
     # Mock the HTTP client
     mock_response = Mock()
-    mock_response.json.return_value = {
+    mock_response.content = json_module.dumps({
         "results": [{
             "flagged": False,
             "categories": {}
         }]
-    }
+    }).encode()
     mock_response.raise_for_status = Mock()
 
     with patch.object(safety_filter.moderation_client, 'post', new_callable=AsyncMock) as mock_post:
@@ -353,6 +445,62 @@ async def test_moderation_api_integration_safe_content():
         assert violation is None
 
 
+@pytest.mark.asyncio
+async def test_moderation_api_batches_concurrent_checks():
+    """Test that concurrent moderation checks share one API request."""
+    filters = [
+        EnhancedSafetyFilter(use_moderation_api=True, openai_api_key="test-key", log_violations=False)
+        for _ in range(3)
+    ]
+
+    def moderate(url, json):
+        response = Mock()
+        response.raise_for_status = Mock()
+        response.content = json_module.dumps({
+            "results": [
+                {"flagged": "volcano" in text, "categories": {"violence": "volcano" in text}}
+                for text in json["input"]
+            ]
+        }).encode()
+        return response
+
+    with patch.object(filters[0].moderation_client, 'post', new_callable=AsyncMock) as mock_post:
+        mock_post.side_effect = moderate
+
+        results = await asyncio.gather(
+            filters[0].filter_user_input("I want to explore the castle"),
+            filters[1].filter_user_input("I want to visit the volcano"),
+            filters[2].filter_user_input("I want to meet a unicorn"),
+        )
+
+    assert mock_post.call_count == 1
+    assert len(mock_post.call_args.kwargs["json"]["input"]) == 3
+    assert [is_safe for is_safe, _, _ in results] == [True, False, True]
+
+
+@pytest.mark.asyncio
+async def test_moderation_api_results_are_cached():
+    """Test that a repeated text is only sent to the moderation API once."""
+    safety_filter = EnhancedSafetyFilter(
+        use_moderation_api=True,
+        openai_api_key="test-key",
+        log_violations=False
+    )
+
+    mock_response = Mock()
+    mock_response.content = json_module.dumps({"results": [{"flagged": False, "categories": {}}]}).encode()
+    mock_response.raise_for_status = Mock()
+
+    with patch.object(safety_filter.moderation_client, 'post', new_callable=AsyncMock) as mock_post:
+        mock_post.return_value = mock_response
+
+        for _ in range(3):
+            is_safe, _, _ = await safety_filter.filter_user_input("Let's look around")
+            assert is_safe is True
+
+    assert mock_post.call_count == 1
+
+
 @pytest.mark.asyncio
 async def test_moderation_api_fails_open_on_error():
     """Test that moderation API failures don't block content (fail open)."""
@@ -397,19 +545,56 @@ async def test_filter_blocks_social_media_handles(safety_filter):
 
 
 @pytest.mark.asyncio
-async def test_close_moderation_client():
-    """Test that moderation client is properly closed."""
+async def test_filter_blocks_all_caps_shouting(safety_filter):
+    """Test that shouting is blocked but ordinary long words are not."""
+    is_safe, reason, violation = await safety_filter.filter_user_input(
+        "LOOK THERE! HELLO FRIENDS! AMAZING!"
+    )
+    assert is_safe is False
+    assert violation.details["pattern_name"] == "all_caps"
+
+    is_safe, sanitized, violation = await safety_filter.filter_user_input(
+        "Let's explore the beautiful garden together"
+    )
+    assert is_safe is True
+
+
+@pytest.mark.asyncio
+async def test_close_leaves_shared_moderation_client_open():
+    """Closing one filter must not close the client other filters share."""
     safety_filter = EnhancedSafetyFilter(
         use_moderation_api=True,
         openai_api_key="test-key"
     )
+    other_filter = EnhancedSafetyFilter(
+        use_moderation_api=True,
+        openai_api_key="test-key"
+    )
+    assert other_filter.moderation_client is safety_filter.moderation_client
 
     # Mock the aclose method
     safety_filter.moderation_client.aclose = AsyncMock()
 
     await safety_filter.close()
 
-    safety_filter.moderation_client.aclose.assert_called_once()
+    safety_filter.moderation_client.aclose.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_close_moderation_batchers_closes_client():
+    """Test that the shared moderation client is closed on shutdown."""
+    safety_filter = EnhancedSafetyFilter(
+        use_moderation_api=True,
+        openai_api_key="test-key"
+    )
+
+    # Mock the aclose method
+    client = safety_filter.moderation_client
+    client.aclose = AsyncMock()
+
+    await close_moderation_batchers()
+
+    client.aclose.assert_called_once()
 
 
 @pytest.mark.asyncio
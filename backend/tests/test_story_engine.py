@@ -2,14 +2,21 @@
 
 from __future__ import annotations
 
+import asyncio
+from collections import deque
 from dataclasses import dataclass
+from datetime import timedelta
 from typing import List, Optional
+from uuid import uuid4
 
 import pytest
+from sqlalchemy import func, select
 
 from app.db import models as db_models
 from app.models.story import LLMStoryResponse, StoryResponse
+from app.services import story_engine as story_engine_module
 from app.services.llm_provider import LLMProvider
+from app.services.safety_filter import FilterResult, ValidationResult
 from app.services.story_engine import StoryEngine
 
 
@@ -26,23 +33,33 @@ class FakeSafetyFilter:
             self.fallback_choices = ["Explore", "Wait", "Sing"]
         self.filtered_inputs: List[str] = []
 
-    async def filter_user_input(self, text: str):
+    async def filter_user_input(self, text: str) -> FilterResult:
         self.filtered_inputs.append(text)
-        return True, text.strip()
+        return FilterResult(True, text.strip())
 
-    async def validate_llm_output(self, scene_text: str, choices: List[str]) -> bool:
-        return self.valid_output
+    async def validate_llm_output(self, scene_text: str, choices: List[str]) -> ValidationResult:
+        return ValidationResult(self.valid_output)
 
     def get_fallback_response(self, theme: str):
         return self.fallback_scene, self.fallback_choices
 
 
+@dataclass(slots=True)
+class LLMCall:
+    """Arguments of one recorded LLM call."""
+
+    prompt: str
+    system_message: Optional[str]
+    max_tokens: int
+    temperature: float
+
+
 class FakeLLMProvider(LLMProvider):
     """LLM provider that replays a queue of canned responses."""
 
     def __init__(self, responses: List[LLMStoryResponse]):
         self.responses = responses
-        self.calls: List[dict] = []
+        self.calls: List[LLMCall] = []
 
     async def generate_story_continuation(
         self,
@@ -51,12 +68,7 @@ class FakeLLMProvider(LLMProvider):
         max_tokens: int = 500,
         temperature: float = 0.8,
     ) -> LLMStoryResponse:
-        self.calls.append({
-            "prompt": prompt,
-            "system_message": system_message,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-        })
+        self.calls.append(LLMCall(prompt, system_message, max_tokens, temperature))
         return self.responses.pop(0)
 
     async def is_healthy(self) -> bool:  # pragma: no cover - not used
@@ -88,9 +100,10 @@ async def test_start_story_persists_initial_turn(db_session):
     assert response.current_scene.text == "Scene 1"
     assert len(response.choices) == 3
 
-    stored_session = db_session.query(db_models.Session).one()
+    stored_session = (await db_session.execute(select(db_models.Session))).scalar_one()
     assert stored_session.player_name == "Alex"
-    turns = db_session.query(db_models.StoryTurn).all()
+    assert stored_session.id.version == 7
+    turns = (await db_session.execute(select(db_models.StoryTurn))).scalars().all()
     assert len(turns) == 1
     assert turns[0].scene_text == "Scene 1"
 
@@ -116,7 +129,8 @@ async def test_continue_story_updates_turns_and_summary(db_session):
 
     assert continue_response.metadata.turns == 1
     assert safety.filtered_inputs == ["I open the door"]
-    assert db_session.query(db_models.StoryTurn).count() == 2
+    turn_count = await db_session.scalar(select(func.count()).select_from(db_models.StoryTurn))
+    assert turn_count == 2
 
 
 @pytest.mark.asyncio
@@ -184,5 +198,117 @@ async def test_session_history_and_reset(db_session):
     assert len(history["turns"]) == 2
 
     await engine.reset_session(start_response.session_id, db_session)
-    session_row = db_session.get(db_models.Session, start_response.session_id)
+    session_row = await db_session.get(db_models.Session, start_response.session_id)
     assert session_row.is_active is False
+
+
+@pytest.mark.asyncio
+async def test_slow_llm_call_is_hedged(db_session, monkeypatch):
+    class SlowFirstProvider(FakeLLMProvider):
+        async def generate_story_continuation(self, prompt, system_message=None, max_tokens=500, temperature=0.8):
+            self.calls.append(LLMCall(prompt, system_message, max_tokens, temperature))
+            if len(self.calls) == 1:
+                await asyncio.sleep(5)
+            return _make_llm_response("Hedged scene")
+
+    monkeypatch.setattr(story_engine_module, "_llm_latencies", deque([0.01] * 20, maxlen=256))
+    llm = SlowFirstProvider([])
+    engine = StoryEngine(llm_provider=llm, safety_filter=FakeSafetyFilter())
+
+    response = await asyncio.wait_for(
+        engine.start_story("Lee", "6-8", "space_adventure", db_session), timeout=1
+    )
+
+    assert response.current_scene.text == "Hedged scene"
+    assert len(llm.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_continue_story_uses_stored_summary_when_omitted(db_session):
+    llm = FakeLLMProvider([
+        _make_llm_response("Scene 1"),
+        _make_llm_response("Scene 2"),
+    ])
+    engine = StoryEngine(llm_provider=llm, safety_filter=FakeSafetyFilter())
+
+    start_response = await engine.start_story("Ivy", "6-8", "space_adventure", db_session)
+    await engine.continue_story(
+        session_id=start_response.session_id,
+        choice_id="c1",
+        choice_text="Go left",
+        custom_input=None,
+        story_summary="",
+        db_session=db_session,
+    )
+
+    assert "Summary of Scene 1" in llm.calls[1].prompt
+
+
+@pytest.mark.asyncio
+async def test_session_with_duplicate_turn_number_still_loads(db_session):
+    llm = FakeLLMProvider([
+        _make_llm_response("Scene 1"),
+        _make_llm_response("Scene 2"),
+    ])
+    engine = StoryEngine(llm_provider=llm, safety_filter=FakeSafetyFilter())
+
+    start_response = await engine.start_story("Ada", "6-8", "space_adventure", db_session)
+    first_turn = (await db_session.execute(select(db_models.StoryTurn))).scalar_one()
+    # A racing continuation stored the same turn number again
+    db_session.add(db_models.StoryTurn(
+        session_id=start_response.session_id,
+        turn_number=first_turn.turn_number,
+        scene_text="Duplicate scene",
+        scene_id="duplicate",
+        story_summary="Newer summary",
+        created_at=first_turn.created_at + timedelta(seconds=1),
+    ))
+    await db_session.commit()
+
+    session, summary = await story_engine_module.load_session_with_summary(
+        db_session, start_response.session_id
+    )
+    assert session.id == start_response.session_id
+    assert summary == "Newer summary"
+
+    continue_response = await engine.continue_story(
+        session_id=start_response.session_id,
+        choice_id="c1",
+        choice_text="Go left",
+        custom_input=None,
+        story_summary="",
+        db_session=db_session,
+    )
+    assert continue_response.metadata.turns == 1
+
+
+@pytest.mark.asyncio
+async def test_continue_story_unknown_session_cancels_input_check(db_session):
+    cancelled = []
+
+    class SlowSafetyFilter(FakeSafetyFilter):
+        async def filter_user_input(self, text: str) -> FilterResult:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(text)
+                raise
+            return FilterResult(True, text)
+
+    engine = StoryEngine(llm_provider=FakeLLMProvider([]), safety_filter=SlowSafetyFilter())
+
+    with pytest.raises(ValueError, match="Session not found"):
+        await asyncio.wait_for(
+            engine.continue_story(
+                session_id=uuid4(),
+                choice_id=None,
+                choice_text=None,
+                custom_input="I open the door",
+                story_summary="",
+                db_session=db_session,
+            ),
+            timeout=1,
+        )
+
+    await asyncio.sleep(0)
+    assert cancelled == ["I open the door"]
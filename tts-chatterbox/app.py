@@ -2,19 +2,22 @@
 Chatterbox TTS Service - FastAPI wrapper for Resemble AI's Chatterbox TTS.
 """
 
+import asyncio
 import io
 import os
 import hashlib
 import logging
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from contextlib import asynccontextmanager
+from contextlib import ExitStack, asynccontextmanager
 
 import torch
 import torchaudio as ta
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, ConfigDict, Field
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,7 +28,9 @@ tts_model = None
 
 
 class TTSRequest(BaseModel):
-    """Request model for TTS generation."""
+    """Request model for TTS generation. Immutable once validated."""
+    model_config = ConfigDict(frozen=True)
+
     text: str = Field(..., min_length=1, max_length=5000, description="Text to synthesize")
     exaggeration: float = Field(default=0.5, ge=0.0, le=1.0, description="Emotion exaggeration level")
     cfg_weight: float = Field(default=0.5, ge=0.0, le=1.0, description="CFG weight for generation")
@@ -35,6 +40,45 @@ class TTSRequest(BaseModel):
 # Directory for voice clone audio files
 VOICES_DIR = Path("/app/voices")
 
+# Decoded voice clone audio kept in memory (a few files serve most requests)
+VOICE_CACHE_SIZE = 32
+
+# Headers for every audio response
+AUDIO_HEADERS = {"Content-Disposition": "inline; filename=narration.wav"}
+
+# Audio is identified by its cache key, so clients may keep it this long and
+# revalidate with If-None-Match instead of downloading it again
+AUDIO_CACHE_CONTROL = "public, max-age=86400"
+
+# Autocast dtype for inference on CUDA (bfloat16 falls back to float16 on GPUs
+# without bf16 support); set TTS_DTYPE=float32 to run in full precision if
+# reduced-precision audio doesn't pass QA
+TTS_DTYPE = os.getenv("TTS_DTYPE", "bfloat16")
+
+# Most generations run at once, each in a worker thread so the event loop
+# keeps serving health checks and cache hits meanwhile; extra requests queue
+# here instead of exhausting GPU memory
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "1"))
+_generate_slots = asyncio.Semaphore(TTS_MAX_CONCURRENCY)
+
+# Generations in progress by cache key, so concurrent identical requests
+# wait for the same result instead of queueing duplicate work
+_in_flight: "dict[str, asyncio.Future[bytes]]" = {}
+
+# Directory for synthesized audio, keyed by request hash
+CACHE_DIR = Path("/app/cache")
+
+# The disk cache is trimmed in the background to this many bytes, oldest
+# files first
+CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "2048")) * 1024 * 1024
+CACHE_EVICT_INTERVAL = 60  # seconds
+
+# Recently served audio is also kept in memory, in front of the disk cache,
+# so repeated narration skips the filesystem entirely
+MEMORY_CACHE_MAX_BYTES = int(os.getenv("TTS_MEMORY_CACHE_MB", "64")) * 1024 * 1024
+_memory_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_memory_cache_bytes = 0
+
 
 class HealthResponse(BaseModel):
     """Health check response."""
@@ -43,17 +87,158 @@ class HealthResponse(BaseModel):
     device: str
 
 
+@lru_cache(maxsize=VOICE_CACHE_SIZE)
+def _load_voice(path: str, mtime_ns: int):
+    """Decode a voice clone file once per (path, modification time).
+
+    On CUDA the waveform is pinned so the copy to the GPU during
+    generation can run asynchronously.
+    """
+    waveform, sample_rate = ta.load(path)
+    if torch.cuda.is_available():
+        waveform = waveform.pin_memory()
+    return waveform, sample_rate
+
+
+def load_voice(voice_path: Path):
+    """Load voice clone audio, reusing the decoded tensor until the file changes."""
+    return _load_voice(str(voice_path), voice_path.stat().st_mtime_ns)
+
+
 def get_cache_path(text: str, exaggeration: float, cfg_weight: float, voice_audio: str | None) -> Path:
     """Generate a cache file path based on request parameters."""
-    cache_dir = Path("/app/cache")
-    cache_dir.mkdir(exist_ok=True)
+    # Hash the parameters (including voice_audio) for the cache key; blake2b
+    # is faster than md5 and 8 bytes is plenty for a cache file name. Floats
+    # are formatted canonically so equal settings always share an entry, and
+    # the text is hashed on its own rather than copied into a combined string.
+    hasher = hashlib.blake2b(digest_size=8)
+    hasher.update(f"{exaggeration:.6g}|{cfg_weight:.6g}|{voice_audio or 'default'}|".encode("utf-8", "surrogatepass"))
+    hasher.update(text.encode("utf-8", "surrogatepass"))
+    cache_key = hasher.hexdigest()
+
+    return CACHE_DIR / f"{cache_key}.wav"
+
+
+def read_cache_file(cache_path: Path) -> bytes | None:
+    """Read audio from the disk cache, or None if it isn't there (blocking).
+
+    Eviction and DELETE /cache can remove the file at any moment, so a
+    missing file is a cache miss rather than an error.
+    """
+    try:
+        return cache_path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def write_cache_file(cache_path: Path, audio_bytes: bytes) -> None:
+    """Write audio to the disk cache atomically, so readers never see a partial file."""
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(audio_bytes)
+    os.replace(tmp_path, cache_path)
+
+
+def memory_cache_get(key: str) -> bytes | None:
+    """Return cached audio for a key, marking it most recently used."""
+    audio_bytes = _memory_cache.get(key)
+    if audio_bytes is not None:
+        _memory_cache.move_to_end(key)
+    return audio_bytes
+
 
-    # Create hash of parameters for cache key (include voice_audio in hash)
-    cache_key = hashlib.md5(
-        f"{text}:{exaggeration}:{cfg_weight}:{voice_audio or 'default'}".encode()
-    ).hexdigest()
+def memory_cache_put(key: str, audio_bytes: bytes) -> None:
+    """Cache audio in memory, evicting least recently used entries over the byte budget."""
+    global _memory_cache_bytes
 
-    return cache_dir / f"{cache_key}.wav"
+    if len(audio_bytes) > MEMORY_CACHE_MAX_BYTES or key in _memory_cache:
+        return
+
+    _memory_cache[key] = audio_bytes
+    _memory_cache_bytes += len(audio_bytes)
+    while _memory_cache_bytes > MEMORY_CACHE_MAX_BYTES:
+        _, evicted = _memory_cache.popitem(last=False)
+        _memory_cache_bytes -= len(evicted)
+
+
+def memory_cache_clear() -> None:
+    """Drop all in-memory cached audio."""
+    global _memory_cache_bytes
+    _memory_cache.clear()
+    _memory_cache_bytes = 0
+
+
+def evict_disk_cache() -> int:
+    """Delete the oldest cached files until the cache fits in CACHE_MAX_BYTES (blocking).
+
+    Returns:
+        Number of files deleted
+    """
+    entries = []
+    total_bytes = 0
+    with os.scandir(CACHE_DIR) as it:
+        for entry in it:
+            # Temporary files belong to writes still in progress
+            if not entry.name.endswith(".wav") or not entry.is_file():
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_bytes += stat.st_size
+
+    if total_bytes <= CACHE_MAX_BYTES:
+        return 0
+
+    entries.sort()
+    deleted = 0
+    for _, size, path in entries:
+        if total_bytes <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+        deleted += 1
+    return deleted
+
+
+def clear_disk_cache() -> None:
+    """Delete every cached file (blocking).
+
+    The directory itself is kept, since it is usually a mounted volume.
+    """
+    with os.scandir(CACHE_DIR) as it:
+        for entry in it:
+            if entry.is_file():
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+async def _evictor() -> None:
+    """Periodically trim the disk cache in a worker thread."""
+    while True:
+        await asyncio.sleep(CACHE_EVICT_INTERVAL)
+        try:
+            deleted = await asyncio.to_thread(evict_disk_cache)
+        except OSError as e:
+            logger.warning(f"Cache eviction failed: {e}")
+            continue
+        if deleted:
+            logger.info(f"Evicted {deleted} files from the TTS cache")
+
+
+def inference_context() -> ExitStack:
+    """Context for model inference: no autograd, and autocast to TTS_DTYPE on CUDA."""
+    stack = ExitStack()
+    stack.enter_context(torch.inference_mode())
+    if torch.cuda.is_available() and TTS_DTYPE != "float32":
+        dtype = getattr(torch, TTS_DTYPE)
+        # Pre-Ampere GPUs have no bfloat16 tensor cores; float16 is the fast path there
+        if dtype is torch.bfloat16 and not torch.cuda.is_bf16_supported():
+            dtype = torch.float16
+        stack.enter_context(torch.autocast(device_type="cuda", dtype=dtype))
+    return stack
 
 
 @asynccontextmanager
@@ -70,19 +255,30 @@ async def lifespan(app: FastAPI):
     if device == "cpu":
         logger.warning("GPU not available - TTS will be slower on CPU")
 
+    CACHE_DIR.mkdir(exist_ok=True)
+
     try:
         # Import and load the model
         from chatterbox.tts import ChatterboxTTS
         tts_model = ChatterboxTTS.from_pretrained(device=device)
         logger.info("Chatterbox TTS model loaded successfully")
+
+        # Pay CUDA kernel selection and allocator warmup before the first request
+        if device == "cuda":
+            with inference_context():
+                tts_model.generate("Hello there.")
+            logger.info(f"TTS model warmed up (dtype: {TTS_DTYPE})")
     except Exception as e:
         logger.error(f"Failed to load TTS model: {e}")
         raise
 
+    evictor = asyncio.create_task(_evictor())
+
     yield
 
     # Cleanup
     logger.info("Shutting down TTS service")
+    evictor.cancel()
     tts_model = None
 
 
@@ -90,16 +286,25 @@ app = FastAPI(
     title="StoryQuest TTS Service",
     description="Text-to-Speech service using Chatterbox TTS for story narration",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan,
 )
 
-# Configure CORS for frontend access
+# Configure CORS for frontend access. A fixed origin list without credentials
+# lets the middleware answer simple requests without echoing the origin.
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, restrict to specific origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=CORS_ORIGINS,
+    allow_credentials=False,
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Content-Type", "If-None-Match"],
+    expose_headers=["ETag"],
 )
 
 
@@ -114,8 +319,53 @@ async def health_check():
     )
 
 
+async def _run_generation(request: TTSRequest, audio_prompt, cache_key: str, cache_path: Path) -> bytes:
+    """Generate audio in a worker thread, within the concurrency limit, and cache it.
+
+    Runs as its own task so the audio is cached even if every client waiting
+    for it goes away.
+    """
+    async with _generate_slots:
+        audio_bytes = await asyncio.to_thread(_generate_wav_bytes, request, audio_prompt)
+    memory_cache_put(cache_key, audio_bytes)
+    logger.info("Speech synthesis complete")
+    await asyncio.to_thread(write_cache_file, cache_path, audio_bytes)
+    return audio_bytes
+
+
+def _generate_wav_bytes(request: TTSRequest, audio_prompt) -> bytes:
+    """Run the model and encode the result as WAV (blocking)."""
+    # Generate audio (with optional voice cloning)
+    with inference_context():
+        if audio_prompt is not None:
+            wav = tts_model.generate(
+                request.text,
+                audio_prompt=audio_prompt,
+                exaggeration=request.exaggeration,
+                cfg_weight=request.cfg_weight,
+            )
+        else:
+            wav = tts_model.generate(
+                request.text,
+                exaggeration=request.exaggeration,
+                cfg_weight=request.cfg_weight,
+            )
+
+    # generate() already returns a CPU tensor (built from the watermarked
+    # NumPy array); quantize it to 16-bit PCM for the encoder, scaling in
+    # float32 in case autocast left reduced-precision output
+    wav = (wav.float().clamp(-1.0, 1.0) * 32767).to(torch.int16).cpu()
+
+    # Encode once; the same bytes are served, cached in memory and
+    # written to disk. 16-bit PCM is all browsers play back and half the
+    # size of the float32 default.
+    buffer = io.BytesIO()
+    ta.save(buffer, wav, tts_model.sr, format="wav", encoding="PCM_S", bits_per_sample=16)
+    return buffer.getvalue()
+
+
 @app.post("/synthesize")
-async def synthesize_speech(request: TTSRequest):
+async def synthesize_speech(request: TTSRequest, http_request: Request):
     """
     Synthesize speech from text.
 
@@ -127,18 +377,25 @@ async def synthesize_speech(request: TTSRequest):
     if tts_model is None:
         raise HTTPException(status_code=503, detail="TTS model not loaded")
 
-    # Check cache first
+    # Check cache first: memory, then disk
     cache_path = get_cache_path(request.text, request.exaggeration, request.cfg_weight, request.voice_audio)
+    cache_key = cache_path.stem
 
-    if cache_path.exists():
+    # The client already has this audio
+    etag = f'"{cache_key}"'
+    if http_request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": AUDIO_CACHE_CONTROL})
+    headers = {**AUDIO_HEADERS, "ETag": etag, "Cache-Control": AUDIO_CACHE_CONTROL}
+
+    audio_bytes = memory_cache_get(cache_key)
+    if audio_bytes is None:
+        audio_bytes = await asyncio.to_thread(read_cache_file, cache_path)
+        if audio_bytes is not None:
+            memory_cache_put(cache_key, audio_bytes)
+
+    if audio_bytes is not None:
         logger.info(f"Cache hit for text: {request.text[:50]}...")
-        with open(cache_path, "rb") as f:
-            audio_bytes = f.read()
-        return StreamingResponse(
-            io.BytesIO(audio_bytes),
-            media_type="audio/wav",
-            headers={"Content-Disposition": "inline; filename=narration.wav"}
-        )
+        return Response(audio_bytes, media_type="audio/wav", headers=headers)
 
     # Load voice clone audio if specified
     audio_prompt = None
@@ -151,59 +408,43 @@ async def synthesize_speech(request: TTSRequest):
             )
         logger.info(f"Using voice clone from: {request.voice_audio}")
         try:
-            audio_prompt = ta.load(str(voice_path))
+            audio_prompt = load_voice(voice_path)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to load voice audio: {str(e)}")
 
     logger.info(f"Generating speech for: {request.text[:50]}..." + (f" (voice: {request.voice_audio})" if request.voice_audio else ""))
 
-    try:
-        # Generate audio (with optional voice cloning)
-        if audio_prompt is not None:
-            wav = tts_model.generate(
-                request.text,
-                audio_prompt=audio_prompt,
-                exaggeration=request.exaggeration,
-                cfg_weight=request.cfg_weight,
-            )
-        else:
-            wav = tts_model.generate(
-                request.text,
-                exaggeration=request.exaggeration,
-                cfg_weight=request.cfg_weight,
-            )
-
-        # Save to buffer
-        buffer = io.BytesIO()
-        ta.save(buffer, wav, tts_model.sr, format="wav")
-        buffer.seek(0)
-
-        # Cache the result
-        audio_bytes = buffer.read()
-        with open(cache_path, "wb") as f:
-            f.write(audio_bytes)
+    # Identical requests already being synthesized share that result
+    generation = _in_flight.get(cache_key)
+    if generation is None:
+        generation = asyncio.ensure_future(_run_generation(request, audio_prompt, cache_key, cache_path))
+        _in_flight[cache_key] = generation
 
-        logger.info("Speech synthesis complete")
+        def _finished(task: "asyncio.Task[bytes]") -> None:
+            _in_flight.pop(cache_key, None)
+            # Failures are reported by the requests awaiting it; mark them
+            # retrieved even when nobody is left waiting
+            if not task.cancelled():
+                task.exception()
 
-        return StreamingResponse(
-            io.BytesIO(audio_bytes),
-            media_type="audio/wav",
-            headers={"Content-Disposition": "inline; filename=narration.wav"}
-        )
+        generation.add_done_callback(_finished)
 
+    try:
+        # Shielded so one client disconnecting doesn't cancel it for the others
+        audio_bytes = await asyncio.shield(generation)
     except Exception as e:
         logger.error(f"TTS generation failed: {e}")
         raise HTTPException(status_code=500, detail=f"TTS generation failed: {str(e)}")
 
+    return Response(audio_bytes, media_type="audio/wav", headers=headers)
+
 
 @app.delete("/cache")
 async def clear_cache():
     """Clear the TTS cache."""
-    cache_dir = Path("/app/cache")
-    if cache_dir.exists():
-        import shutil
-        shutil.rmtree(cache_dir)
-        cache_dir.mkdir(exist_ok=True)
+    memory_cache_clear()
+    CACHE_DIR.mkdir(exist_ok=True)
+    await asyncio.to_thread(clear_disk_cache)
     return {"status": "cache cleared"}
 
 
@@ -3,19 +3,21 @@ Kokoro TTS Service - FastAPI wrapper for Kokoro TTS.
 Optimized for CPU and Apple Silicon (MPS) - fast and lightweight.
 """
 
-import io
+import asyncio
 import os
 import hashlib
 import logging
+import struct
+from collections import OrderedDict
 from pathlib import Path
 from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterator
 
 import numpy as np
-import soundfile as sf
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,9 +27,46 @@ logger = logging.getLogger(__name__)
 tts_pipeline = None
 SAMPLE_RATE = 24000  # Kokoro outputs at 24kHz
 
+# Length field for a WAV streamed before its size is known; players read
+# until the connection closes
+WAV_UNKNOWN_SIZE = 0xFFFFFFFF
+
+# Headers for every audio response
+AUDIO_HEADERS = {"Content-Disposition": "inline; filename=narration.wav"}
+
+# Audio is identified by its cache key, so clients may keep it this long and
+# revalidate with If-None-Match instead of downloading it again
+AUDIO_CACHE_CONTROL = "public, max-age=86400"
+
+# Most generations run at once, each in a worker thread so the event loop
+# keeps serving health checks and cache hits meanwhile; extra requests queue
+# here instead of exhausting CPU/MPS memory
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "1"))
+_generate_slots = asyncio.Semaphore(TTS_MAX_CONCURRENCY)
+
+# Generations in progress by cache key, so concurrent identical requests
+# wait for the finished audio instead of running the pipeline again
+_in_flight: "dict[str, asyncio.Future[bytes]]" = {}
+
+# Directory for synthesized audio, keyed by request hash
+CACHE_DIR = Path("/app/cache")
+
+# The disk cache is trimmed in the background to this many bytes, oldest
+# files first
+CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "2048")) * 1024 * 1024
+CACHE_EVICT_INTERVAL = 60  # seconds
+
+# Recently served audio is also kept in memory, in front of the disk cache,
+# so repeated narration skips the filesystem entirely
+MEMORY_CACHE_MAX_BYTES = int(os.getenv("TTS_MEMORY_CACHE_MB", "64")) * 1024 * 1024
+_memory_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_memory_cache_bytes = 0
+
 
 class TTSRequest(BaseModel):
-    """Request model for TTS generation."""
+    """Request model for TTS generation. Immutable once validated."""
+    model_config = ConfigDict(frozen=True)
+
     text: str = Field(..., min_length=1, max_length=5000, description="Text to synthesize")
     voice: str = Field(default="af_heart", description="Voice to use for synthesis")
     speed: float = Field(default=1.0, ge=0.5, le=2.0, description="Speech speed multiplier")
@@ -42,15 +81,140 @@ class HealthResponse(BaseModel):
 
 def get_cache_path(text: str, voice: str, speed: float) -> Path:
     """Generate a cache file path based on request parameters."""
-    cache_dir = Path("/app/cache")
-    cache_dir.mkdir(exist_ok=True)
+    # Hash the parameters for the cache key; blake2b is faster than md5 and
+    # 8 bytes is plenty for a cache file name. Speed is formatted canonically
+    # so equal settings always share an entry, and the text is hashed on its
+    # own rather than copied into a combined string.
+    hasher = hashlib.blake2b(digest_size=8)
+    hasher.update(f"{speed:.6g}|{voice}|".encode("utf-8", "surrogatepass"))
+    hasher.update(text.encode("utf-8", "surrogatepass"))
+    cache_key = hasher.hexdigest()
+
+    return CACHE_DIR / f"{cache_key}.wav"
+
+
+def wav_header(data_size: int = WAV_UNKNOWN_SIZE) -> bytes:
+    """Build the 44-byte header of a mono 16-bit PCM WAV at SAMPLE_RATE."""
+    riff_size = WAV_UNKNOWN_SIZE if data_size == WAV_UNKNOWN_SIZE else 36 + data_size
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", riff_size, b"WAVE",
+        b"fmt ", 16, 1, 1, SAMPLE_RATE, SAMPLE_RATE * 2, 2, 16,
+        b"data", data_size,
+    )
+
+
+# Header sent at the start of every stream, before the length is known
+STREAM_WAV_HEADER = wav_header()
+
+
+def read_cache_file(cache_path: Path) -> bytes | None:
+    """Read audio from the disk cache, or None if it isn't there (blocking).
+
+    Eviction and DELETE /cache can remove the file at any moment, so a
+    missing file is a cache miss rather than an error.
+    """
+    try:
+        return cache_path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def write_cache_file(cache_path: Path, audio_bytes: bytes) -> None:
+    """Write audio to the disk cache atomically, so readers never see a partial file."""
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(audio_bytes)
+    os.replace(tmp_path, cache_path)
+
+
+def memory_cache_get(key: str) -> bytes | None:
+    """Return cached audio for a key, marking it most recently used."""
+    audio_bytes = _memory_cache.get(key)
+    if audio_bytes is not None:
+        _memory_cache.move_to_end(key)
+    return audio_bytes
+
+
+def memory_cache_put(key: str, audio_bytes: bytes) -> None:
+    """Cache audio in memory, evicting least recently used entries over the byte budget."""
+    global _memory_cache_bytes
+
+    if len(audio_bytes) > MEMORY_CACHE_MAX_BYTES or key in _memory_cache:
+        return
 
-    # Create hash of parameters for cache key
-    cache_key = hashlib.md5(
-        f"{text}:{voice}:{speed}".encode()
-    ).hexdigest()
+    _memory_cache[key] = audio_bytes
+    _memory_cache_bytes += len(audio_bytes)
+    while _memory_cache_bytes > MEMORY_CACHE_MAX_BYTES:
+        _, evicted = _memory_cache.popitem(last=False)
+        _memory_cache_bytes -= len(evicted)
 
-    return cache_dir / f"{cache_key}.wav"
+
+def memory_cache_clear() -> None:
+    """Drop all in-memory cached audio."""
+    global _memory_cache_bytes
+    _memory_cache.clear()
+    _memory_cache_bytes = 0
+
+
+def evict_disk_cache() -> int:
+    """Delete the oldest cached files until the cache fits in CACHE_MAX_BYTES (blocking).
+
+    Returns:
+        Number of files deleted
+    """
+    entries = []
+    total_bytes = 0
+    with os.scandir(CACHE_DIR) as it:
+        for entry in it:
+            # Temporary files belong to writes still in progress
+            if not entry.name.endswith(".wav") or not entry.is_file():
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_bytes += stat.st_size
+
+    if total_bytes <= CACHE_MAX_BYTES:
+        return 0
+
+    entries.sort()
+    deleted = 0
+    for _, size, path in entries:
+        if total_bytes <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+        deleted += 1
+    return deleted
+
+
+def clear_disk_cache() -> None:
+    """Delete every cached file (blocking).
+
+    The directory itself is kept, since it is usually a mounted volume.
+    """
+    with os.scandir(CACHE_DIR) as it:
+        for entry in it:
+            if entry.is_file():
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+async def _evictor() -> None:
+    """Periodically trim the disk cache in a worker thread."""
+    while True:
+        await asyncio.sleep(CACHE_EVICT_INTERVAL)
+        try:
+            deleted = await asyncio.to_thread(evict_disk_cache)
+        except OSError as e:
+            logger.warning(f"Cache eviction failed: {e}")
+            continue
+        if deleted:
+            logger.info(f"Evicted {deleted} files from the TTS cache")
 
 
 def get_device() -> str:
@@ -73,19 +237,29 @@ async def lifespan(app: FastAPI):
     device = get_device()
     logger.info(f"Using device: {device}")
 
+    CACHE_DIR.mkdir(exist_ok=True)
+
     try:
         from kokoro import KPipeline
         # Use American English by default, explicitly set repo_id to suppress warning
         tts_pipeline = KPipeline(lang_code='a', repo_id='hexgrad/Kokoro-82M')
         logger.info("Kokoro TTS pipeline loaded successfully")
+
+        # Load the phonemizer and default voice before the first request
+        for _ in tts_pipeline("Hello there.", voice="af_heart", speed=1.0):
+            pass
+        logger.info("TTS pipeline warmed up")
     except Exception as e:
         logger.error(f"Failed to load TTS pipeline: {e}")
         raise
 
+    evictor = asyncio.create_task(_evictor())
+
     yield
 
     # Cleanup
     logger.info("Shutting down TTS service")
+    evictor.cancel()
     tts_pipeline = None
 
 
@@ -93,16 +267,25 @@ app = FastAPI(
     title="StoryQuest TTS Service (Kokoro)",
     description="Text-to-Speech service using Kokoro TTS for story narration - optimized for CPU/MPS",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan,
 )
 
-# Configure CORS for frontend access
+# Configure CORS for frontend access. A fixed origin list without credentials
+# lets the middleware answer simple requests without echoing the origin.
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, restrict to specific origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=CORS_ORIGINS,
+    allow_credentials=False,
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Content-Type", "If-None-Match"],
+    expose_headers=["ETag"],
 )
 
 
@@ -117,8 +300,85 @@ async def health_check():
     )
 
 
+def _next_pcm(chunks: Iterator) -> bytes | None:
+    """Run the pipeline to its next audio chunk and encode it as 16-bit PCM (blocking)."""
+    for gs, ps, audio in chunks:
+        if audio is not None:
+            samples = np.clip(np.asarray(audio, dtype=np.float32), -1.0, 1.0)
+            return (samples * 32767).astype("<i2").tobytes()
+    return None
+
+
+async def _generate_pcm(request: TTSRequest) -> AsyncIterator[bytes]:
+    """Yield PCM chunks as the pipeline produces them, within the concurrency limit."""
+    async with _generate_slots:
+        # The pipeline returns a generator of (graphemes, phonemes, audio) tuples
+        chunks = iter(tts_pipeline(
+            request.text,
+            voice=request.voice,
+            speed=request.speed,
+        ))
+        while (pcm := await asyncio.to_thread(_next_pcm, chunks)) is not None:
+            yield pcm
+
+
+async def _run_generation(
+    request: TTSRequest, cache_key: str, cache_path: Path, pcm: list[bytes], chunk_ready: asyncio.Event
+) -> bytes:
+    """Generate the complete WAV, publishing PCM chunks as they arrive, and cache it.
+
+    Runs as its own task so it finishes (and resolves waiting requests) even
+    if the streaming client goes away.
+    """
+    pcm_chunks = _generate_pcm(request)
+    try:
+        async for chunk in pcm_chunks:
+            pcm.append(chunk)
+            chunk_ready.set()
+    finally:
+        await pcm_chunks.aclose()
+
+    if not pcm:
+        raise RuntimeError("No audio generated")
+
+    data = b"".join(pcm)
+    audio_bytes = wav_header(len(data)) + data
+    memory_cache_put(cache_key, audio_bytes)
+    logger.info("Speech synthesis complete")
+    await asyncio.to_thread(write_cache_file, cache_path, audio_bytes)
+    return audio_bytes
+
+
+async def _wait_for_chunk(generation: "asyncio.Task[bytes]", chunk_ready: asyncio.Event) -> None:
+    """Wait until another PCM chunk is published or the generation ends."""
+    waiter = asyncio.ensure_future(chunk_ready.wait())
+    try:
+        await asyncio.wait((generation, waiter), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        waiter.cancel()
+    chunk_ready.clear()
+
+
+async def _stream_wav(
+    generation: "asyncio.Task[bytes]", pcm: list[bytes], chunk_ready: asyncio.Event
+) -> AsyncIterator[bytes]:
+    """Stream a WAV from the chunks of a generation as they are published."""
+    yield STREAM_WAV_HEADER
+    sent = 0
+    while True:
+        while sent < len(pcm):
+            yield pcm[sent]
+            sent += 1
+        if generation.done():
+            break
+        await _wait_for_chunk(generation, chunk_ready)
+
+    if not generation.cancelled() and generation.exception() is not None:
+        logger.error(f"TTS generation failed mid-stream: {generation.exception()}")
+
+
 @app.post("/synthesize")
-async def synthesize_speech(request: TTSRequest):
+async def synthesize_speech(request: TTSRequest, http_request: Request):
     """
     Synthesize speech from text.
 
@@ -127,72 +387,75 @@ async def synthesize_speech(request: TTSRequest):
     if tts_pipeline is None:
         raise HTTPException(status_code=503, detail="TTS pipeline not loaded")
 
-    # Check cache first
+    # Check cache first: memory, then disk
     cache_path = get_cache_path(request.text, request.voice, request.speed)
+    cache_key = cache_path.stem
 
-    if cache_path.exists():
-        logger.info(f"Cache hit for text: {request.text[:50]}...")
-        with open(cache_path, "rb") as f:
-            audio_bytes = f.read()
-        return StreamingResponse(
-            io.BytesIO(audio_bytes),
-            media_type="audio/wav",
-            headers={"Content-Disposition": "inline; filename=narration.wav"}
-        )
-
-    logger.info(f"Generating speech for: {request.text[:50]}...")
-
-    try:
-        # Generate audio using Kokoro pipeline
-        # The pipeline returns a generator of (graphemes, phonemes, audio) tuples
-        audio_chunks = []
-        generator = tts_pipeline(
-            request.text,
-            voice=request.voice,
-            speed=request.speed,
-        )
-
-        for gs, ps, audio in generator:
-            if audio is not None:
-                audio_chunks.append(audio)
+    # The client already has this audio
+    etag = f'"{cache_key}"'
+    if http_request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": AUDIO_CACHE_CONTROL})
+    headers = {**AUDIO_HEADERS, "ETag": etag, "Cache-Control": AUDIO_CACHE_CONTROL}
 
-        if not audio_chunks:
-            raise HTTPException(status_code=500, detail="No audio generated")
+    audio_bytes = memory_cache_get(cache_key)
+    if audio_bytes is None:
+        audio_bytes = await asyncio.to_thread(read_cache_file, cache_path)
+        if audio_bytes is not None:
+            memory_cache_put(cache_key, audio_bytes)
 
-        # Concatenate all audio chunks
-        full_audio = np.concatenate(audio_chunks)
-
-        # Save to buffer as WAV
-        buffer = io.BytesIO()
-        sf.write(buffer, full_audio, SAMPLE_RATE, format='WAV')
-        buffer.seek(0)
+    if audio_bytes is not None:
+        logger.info(f"Cache hit for text: {request.text[:50]}...")
+        return Response(audio_bytes, media_type="audio/wav", headers=headers)
+
+    # An identical request is already being synthesized; wait for its audio
+    pending = _in_flight.get(cache_key)
+    if pending is not None:
+        try:
+            # Shielded so this client disconnecting doesn't fail it for the others
+            audio_bytes = await asyncio.shield(pending)
+        except Exception as e:
+            logger.error(f"TTS generation failed: {e}")
+            raise HTTPException(status_code=500, detail=f"TTS generation failed: {str(e)}")
+        return Response(audio_bytes, media_type="audio/wav", headers=headers)
 
-        # Cache the result
-        audio_bytes = buffer.read()
-        with open(cache_path, "wb") as f:
-            f.write(audio_bytes)
+    logger.info(f"Generating speech for: {request.text[:50]}...")
+    pcm: list[bytes] = []
+    chunk_ready = asyncio.Event()
+    generation = asyncio.ensure_future(_run_generation(request, cache_key, cache_path, pcm, chunk_ready))
+    _in_flight[cache_key] = generation
 
-        logger.info("Speech synthesis complete")
+    def _finished(task: "asyncio.Task[bytes]") -> None:
+        _in_flight.pop(cache_key, None)
+        # Failures are reported by the requests awaiting it; mark them
+        # retrieved even when nobody is left waiting
+        if not task.cancelled():
+            task.exception()
 
-        return StreamingResponse(
-            io.BytesIO(audio_bytes),
-            media_type="audio/wav",
-            headers={"Content-Disposition": "inline; filename=narration.wav"}
-        )
+    generation.add_done_callback(_finished)
 
+    # Wait for the first chunk so failures still get a proper error response
+    try:
+        await _wait_for_chunk(generation, chunk_ready)
+        if not pcm:
+            generation.result()
     except Exception as e:
         logger.error(f"TTS generation failed: {e}")
         raise HTTPException(status_code=500, detail=f"TTS generation failed: {str(e)}")
 
+    # The rest streams as it is synthesized; the complete file is cached after
+    return StreamingResponse(
+        _stream_wav(generation, pcm, chunk_ready),
+        media_type="audio/wav",
+        headers=headers,
+    )
+
 
 @app.delete("/cache")
 async def clear_cache():
     """Clear the TTS cache."""
-    cache_dir = Path("/app/cache")
-    if cache_dir.exists():
-        import shutil
-        shutil.rmtree(cache_dir)
-        cache_dir.mkdir(exist_ok=True)
+    memory_cache_clear()
+    CACHE_DIR.mkdir(exist_ok=True)
+    await asyncio.to_thread(clear_disk_cache)
     return {"status": "cache cleared"}
 
 
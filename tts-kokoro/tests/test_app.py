@@ -0,0 +1,129 @@
+"""
+Tests for the Kokoro TTS service's synthesis endpoint.
+The pipeline is replaced with a fake that yields silent audio chunks.
+"""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.requests import Request
+
+import app as tts_app
+
+CHUNK_SAMPLES = 240
+WAV_HEADER_SIZE = 44
+
+
+class FakePipeline:
+    """Stand-in for KPipeline that yields silent chunks, optionally pausing after the first."""
+
+    def __init__(self, chunks: int = 3):
+        self.chunks = chunks
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, text, voice, speed):
+        self.calls += 1
+        for i in range(self.chunks):
+            if i == 1:
+                self.release.wait(timeout=5)
+            yield text, "", np.zeros(CHUNK_SAMPLES, dtype=np.float32)
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path):
+    """Install a fake pipeline and an empty cache for each test."""
+    fake = FakePipeline()
+    monkeypatch.setattr(tts_app, "tts_pipeline", fake)
+    monkeypatch.setattr(tts_app, "CACHE_DIR", tmp_path)
+    tts_app.memory_cache_clear()
+    tts_app._in_flight.clear()
+    yield fake
+    tts_app.memory_cache_clear()
+
+
+def http_request() -> Request:
+    """A request without conditional headers."""
+    return Request({"type": "http", "headers": []})
+
+
+async def synthesize(text: str = "Once upon a time"):
+    return await tts_app.synthesize_speech(tts_app.TTSRequest(text=text), http_request())
+
+
+async def test_streams_complete_wav(pipeline):
+    response = await synthesize()
+    assert isinstance(response, StreamingResponse)
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+
+    assert body[:4] == b"RIFF"
+    assert len(body) == WAV_HEADER_SIZE + pipeline.chunks * CHUNK_SAMPLES * 2
+
+
+async def test_unconsumed_stream_still_resolves_waiters(pipeline):
+    """A client that disconnects before the body starts must not strand identical requests."""
+    pipeline.release.clear()
+    first = await synthesize()
+    assert isinstance(first, StreamingResponse)
+    # first.body_iterator is never iterated, as when the client goes away
+
+    second = asyncio.ensure_future(synthesize())
+    await asyncio.sleep(0.05)
+    assert not second.done()
+
+    pipeline.release.set()
+    response = await asyncio.wait_for(second, timeout=5)
+
+    assert response.body[:4] == b"RIFF"
+    assert len(response.body) == WAV_HEADER_SIZE + pipeline.chunks * CHUNK_SAMPLES * 2
+    assert pipeline.calls == 1
+    assert tts_app._in_flight == {}
+
+
+async def test_cached_after_unconsumed_stream(pipeline):
+    await synthesize()
+
+    for _ in range(100):
+        if not tts_app._in_flight:
+            break
+        await asyncio.sleep(0.01)
+
+    response = await synthesize()
+    assert not isinstance(response, StreamingResponse)
+    assert pipeline.calls == 1
+    assert list(tts_app.CACHE_DIR.glob("*.wav"))
+
+
+async def test_no_audio_is_server_error(pipeline):
+    pipeline.chunks = 0
+
+    with pytest.raises(HTTPException) as exc_info:
+        await synthesize()
+
+    assert exc_info.value.status_code == 500
+    assert tts_app._in_flight == {}
+
+
+async def test_evicted_cache_file_is_regenerated(pipeline):
+    response = await synthesize()
+    b"".join([chunk async for chunk in response.body_iterator])
+    while tts_app._in_flight:
+        await asyncio.sleep(0.01)
+
+    # The evictor removed the file and the memory cache no longer has it
+    tts_app.memory_cache_clear()
+    tts_app.clear_disk_cache()
+
+    response = await synthesize()
+    assert isinstance(response, StreamingResponse)
+    assert pipeline.calls == 2
+
+
+def test_read_cache_file_missing_is_miss(tmp_path):
+    assert tts_app.read_cache_file(tmp_path / "gone.wav") is None